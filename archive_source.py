@@ -0,0 +1,160 @@
+import fnmatch
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+
+import exif_segments
+import sort_image_files
+from retry_policy import DESTINATION, SortFailure, classify_error, describe_read_failure
+
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def is_archive(path):
+    """
+    Determines whether the provided path is a ZIP or TAR archive (rather than a folder of files).
+
+    :param path: string
+    :return:
+    """
+
+    return os.path.isfile(path) and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+def iter_archive_members(archive_path, file_match_pattern="*.*"):
+    """
+    Iterates through the regular file members of the provided archive, whose names match the file match pattern (in
+    the same way as build_file_list, the pattern is matched against the member's file name).
+
+    TAR archives (compressed or not) are read strictly in a single forward pass, so each member's stream must be
+    consumed before moving on to the next member.
+
+    :param archive_path: string
+    :param file_match_pattern: string
+    :return: generator of (member_name, mtime, stream) tuples
+    """
+
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                if not member.is_dir() and fnmatch.fnmatchcase(os.path.basename(member.filename), file_match_pattern):
+                    # ZIP archives record the modification time in local time.
+                    mtime = time.mktime(member.date_time + (0, 0, -1))
+                    with archive.open(member) as stream:
+                        yield member.filename, mtime, stream
+
+    else:
+        with tarfile.open(archive_path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and fnmatch.fnmatchcase(os.path.basename(member.name), file_match_pattern):
+                    with archive.extractfile(member) as stream:
+                        yield member.name, member.mtime, stream
+
+
+def write_member(header, stream, destination_path, mtime):
+    """
+    Writes an archive member to the provided destination: first the header (which has already been read from the
+    stream), and then the rest of the stream. The member is written to a temporary file in the destination folder,
+    which is renamed into place once complete, so that a partially written file never appears in the library.
+
+    :param header: bytes
+    :param stream: binary file-like object
+    :param destination_path: string
+    :param mtime: modification time (seconds since the epoch) to give the file
+    :return:
+    """
+
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(destination_path), prefix=".archive-")
+
+    try:
+        with os.fdopen(descriptor, "wb") as destination:
+            destination.write(header)
+            shutil.copyfileobj(stream, destination, COPY_BUFFER_SIZE)
+        os.utime(temporary_path, (mtime, mtime))
+        os.rename(temporary_path, destination_path)
+
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+def sort_archive(archive_path, destination_base_path, file_match_pattern="*.*", index=None, target_timezone=None):
+    """
+    Sorts the members of the provided ZIP or TAR archive straight into the hierarchical folder structure (see
+    sort_hierarchical_by_date), without first extracting the archive to disk.
+
+    Each member is streamed once: the JPEG header is read, and the capture date taken from its EXIF segment, and then
+    the header and the rest of the member are written to the computed destination. Members without a readable date are
+    not extracted.
+
+    Results are keyed by the member's path within the archive, joined onto the archive path (e.g.
+    '/imports/export.zip/DCIM/IMG_0766.jpg').
+
+    :param archive_path: string
+    :param destination_base_path: string
+    :param file_match_pattern: string
+    :param index: optional library index connection, in which each sorted file is recorded
+    :param target_timezone: optional timezone (see sort_hierarchical_by_date)
+    :return: dictionary of the successfully sorted members, and of the failures
+    """
+
+    results = {"success": [], "failure": {}}
+
+    # Sets the destination path to the current working directory, if one hasn't be specified.
+    if not destination_base_path:
+        destination_base_path = os.getcwd()
+        print("No destination path specified. Using current directory as default.")
+
+    for member_name, mtime, stream in iter_archive_members(archive_path, file_match_pattern):
+        member_path = os.path.join(archive_path, member_name)
+        print("Inspecting archive member: {}".format(member_path))
+
+        # Attempts to extract the creation date from the EXIF segment, in the member's header.
+        try:
+            header, exif = exif_segments.read_exif_header(stream)
+            capture_datetime = sort_image_files.read_capture_datetime(exif, target_timezone) if exif else None
+            error = None
+
+        except Exception as e:
+            capture_datetime = None
+            error = e
+
+        if capture_datetime is None:
+            result = describe_read_failure(error)
+            results['failure'][member_path] = result
+            print("\t{}".format(result))
+            continue
+
+        computed_destination_folder = sort_image_files.compute_date_path_components(capture_datetime)
+        filename = os.path.basename(member_name)
+        full_destination_path = os.path.join(destination_base_path, *computed_destination_folder, filename)
+
+        # Attempts to write the member into the appropriate folder.
+        try:
+            print("\tWriting to: {}".format(full_destination_path))
+
+            if sort_image_files.check_or_create_path(destination_base_path, computed_destination_folder):
+                write_member(header, stream, full_destination_path, mtime)
+                results['success'].append(member_path)
+
+                # Records the sorted file in the library index, if one is being maintained.
+                if index is not None:
+                    import library_index
+
+                    library_index.record_sorted_file(index, member_path, full_destination_path, capture_datetime)
+
+            else:
+                result = SortFailure("Unable to create the destination folder", DESTINATION)
+                results['failure'][member_path] = result
+                print("\t{}".format(result))
+
+        except Exception as e:
+            result = SortFailure("Error writing file: {}".format(e), classify_error(e), e)
+            results['failure'][member_path] = result
+            print("\t{}".format(result))
+
+    return results
@@ -0,0 +1,58 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 20
+
+
+def time_interpreter(statement, runs=RUNS):
+    """
+    Measures the wall clock time taken to start a fresh interpreter, and run the provided statement, over several runs.
+
+    :param statement: string
+    :param runs: int
+    :return: list of timings, in milliseconds
+    """
+
+    timings = []
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY_PATH)
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True, env=environment)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return timings
+
+
+def main():
+    """
+    Reports the median time to start an interpreter and import sort_image_files (compared with an empty interpreter),
+    and confirms that the heavy dependencies are not loaded at import time.
+
+    :return:
+    """
+
+    baseline = statistics.median(time_interpreter("pass"))
+    imported = statistics.median(time_interpreter("import sort_image_files"))
+    path_helper = statistics.median(time_interpreter(
+        "import sort_image_files; sort_image_files.compute_hierarchical_path_components('2020:01:22 18:00:00')"))
+
+    print("Interpreter startup:                  {:8.2f} ms".format(baseline))
+    print("import sort_image_files:              {:8.2f} ms (+{:.2f} ms)".format(imported, imported - baseline))
+    print("import + path helper call:            {:8.2f} ms (+{:.2f} ms)".format(path_helper, path_helper - baseline))
+
+    # Lists any heavy dependencies which are loaded eagerly (there should be none).
+    check = "import sys, sort_image_files; print(' '.join(m for m in ('piexif', 'calendar', 'sqlite3', 'glob') " \
+            "if m in sys.modules))"
+    eager = subprocess.run([sys.executable, "-c", check], check=True, capture_output=True, text=True,
+                           env=dict(os.environ, PYTHONPATH=REPOSITORY_PATH)).stdout.strip()
+    print("Eagerly imported heavy dependencies:  {}".format(eager or "none"))
+
+
+if __name__ == '__main__':
+    main()
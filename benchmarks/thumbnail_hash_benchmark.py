@@ -0,0 +1,107 @@
+import glob
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import near_duplicates
+import piexif
+
+
+TEST_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'test_data')
+CALLS = 50
+
+
+class BaselineBitReader:
+    """
+    The reader which the integer bit buffer replaced, kept as a reference for the comparison: the data is expanded to
+    a string of '0' and '1' characters, and each code and coefficient is decoded with a separate call.
+    """
+
+    def __init__(self, data):
+        self.bits = "".join(format(byte, "08b") for byte in data)
+        self.position = 0
+
+    def decode(self, table):
+        length, value = table.lookup[int(self.bits[self.position:self.position + 16].ljust(16, "1"), 2)]
+        if value is None:
+            raise ValueError("Invalid Huffman code")
+
+        self.position += length
+        return value
+
+    def receive_extend(self, size):
+        if size == 0:
+            return 0
+
+        bits = self.bits[self.position:self.position + size].ljust(size, "1")
+        self.position += size
+        value = int(bits, 2)
+
+        return value if bits[0] == "1" else value - (1 << size) + 1
+
+    def decode_block(self, dc_table, ac_table):
+        difference = self.receive_extend(self.decode(dc_table))
+
+        coefficient = 1
+        while coefficient < 64:
+            run_size = self.decode(ac_table)
+            run, size = run_size >> 4, run_size & 0x0F
+            if size:
+                self.position += size
+                coefficient += run + 1
+            elif run == 15:
+                coefficient += 16
+            else:
+                break
+
+        return difference
+
+
+def time_call(function, *args):
+    """
+    Measures the time per call, of the provided function, in milliseconds (the best of several repeats).
+
+    :param function:
+    :param args:
+    :return: float
+    """
+
+    return min(timeit.repeat(lambda: function(*args), number=CALLS, repeat=5)) / CALLS * 1000
+
+
+def main():
+    """
+    Reports the time per file, to read the EXIF metadata (for reference), and to hash its thumbnail (with the baseline
+    string reader, and with the integer bit buffer), for each of the provided JPEG files (by default, the test data).
+
+    :return:
+    """
+
+    file_paths = sys.argv[1:] or sorted(glob.glob(os.path.join(TEST_DATA_PATH, '*.*')))
+
+    for file_path in file_paths:
+        try:
+            thumbnail = piexif.load(file_path)['thumbnail']
+        except Exception:
+            continue
+        if not thumbnail:
+            continue
+
+        load = time_call(piexif.load, file_path)
+        current = time_call(near_duplicates.compute_thumbnail_hash, thumbnail)
+
+        bit_reader = near_duplicates.BitReader
+        near_duplicates.BitReader = BaselineBitReader
+        try:
+            baseline = time_call(near_duplicates.compute_thumbnail_hash, thumbnail)
+        finally:
+            near_duplicates.BitReader = bit_reader
+
+        print("{:24} piexif.load {:6.2f} ms   baseline hash {:6.2f} ms   hash {:6.2f} ms".format(
+            os.path.basename(file_path), load, baseline, current))
+
+
+if __name__ == '__main__':
+    main()
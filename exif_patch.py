@@ -0,0 +1,274 @@
+import os
+import struct
+import tempfile
+
+import exif_segments
+import group_commit
+import sort_image_files
+
+
+EXIF_IFD_POINTER_TAG = 0x8769
+DATE_TIME_ORIGINAL_TAG = 0x9003
+ASCII_TYPE = 2
+
+# The length of an EXIF datetime ('YYYY:MM:DD HH:MM:SS'), including its terminating NUL.
+DATETIME_LENGTH = 20
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def find_ifd_entry(tiff, endian, ifd_offset, tag):
+    """
+    Finds the entry for the provided tag, in the IFD at the provided offset of the TIFF data.
+
+    :param tiff: bytes (the TIFF data, i.e. the APP1 payload after 'Exif\x00\x00')
+    :param endian: '<' or '>'
+    :param ifd_offset: int
+    :param tag: int
+    :return: (entry_offset, type, count, value_or_offset) tuple, or None if the tag is not present
+    """
+
+    entry_count = struct.unpack_from(endian + "H", tiff, ifd_offset)[0]
+
+    for position in range(ifd_offset + 2, ifd_offset + 2 + entry_count * 12, 12):
+        entry_tag, entry_type, count, value = struct.unpack_from(endian + "HHLL", tiff, position)
+        if entry_tag == tag:
+            return position, entry_type, count, value
+
+    return None
+
+
+def find_datetime_original(exif):
+    """
+    Finds where the DateTimeOriginal value is stored, within the provided EXIF APP1 payload.
+
+    :param exif: bytes (the APP1 payload, starting with 'Exif\x00\x00')
+    :return: (offset, count) tuple, where offset is the position of the value within the payload, or None if the tag is
+             not present (or is not a string long enough to hold a datetime, or is not stored within the payload, as
+             in a corrupt file, where overwriting it in place would overwrite other data)
+    """
+
+    tiff = exif[len(exif_segments.EXIF_HEADER):]
+    endian = "<" if tiff[:2] == b"II" else ">"
+
+    try:
+        exif_pointer = find_ifd_entry(tiff, endian, struct.unpack_from(endian + "L", tiff, 4)[0],
+                                      EXIF_IFD_POINTER_TAG)
+        if exif_pointer is None:
+            return None
+
+        entry = find_ifd_entry(tiff, endian, exif_pointer[3], DATE_TIME_ORIGINAL_TAG)
+
+    except struct.error:
+        return None
+
+    if entry is None or entry[1] != ASCII_TYPE or entry[2] < DATETIME_LENGTH:
+        return None
+
+    # The value must lie after the TIFF header, and end within the payload.
+    if entry[3] < 8 or entry[3] + entry[2] > len(tiff):
+        return None
+
+    return len(exif_segments.EXIF_HEADER) + entry[3], entry[2]
+
+
+def build_exif_segment(exif, datetime_bytes):
+    """
+    Builds a complete APP1 segment (marker and length included), from the provided EXIF payload (or none, for a file
+    without EXIF metadata), with its DateTimeOriginal property set to the provided value.
+
+    :param exif: bytes, or None
+    :param datetime_bytes: bytes ('YYYY:MM:DD HH:MM:SS')
+    :return: bytes
+    """
+
+    import piexif
+
+    exif_dict = piexif.load(exif) if exif else {"0th": {}, "Exif": {}, "GPS": {}, "Interop": {}, "1st": {},
+                                                "thumbnail": None}
+    exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = datetime_bytes
+    payload = piexif.dump(exif_dict)
+
+    return struct.pack(">BBH", 0xFF, exif_segments.APP1, len(payload) + 2) + payload
+
+
+def read_range(file, offset, size):
+    """
+    Reads the provided range of bytes from the file.
+
+    :param file: file object
+    :param offset: int
+    :param size: int
+    :return: bytes
+    """
+
+    return os.pread(file.fileno(), size, offset)
+
+
+def copy_file_range(source, destination, offset):
+    """
+    Copies the rest of the source file (from the provided offset) onto the end of the destination file, inside the
+    kernel where possible (os.copy_file_range, which on copy-on-write file systems shares the data blocks rather than
+    copying them), and through a buffer otherwise.
+
+    :param source: file object
+    :param destination: file object
+    :param offset: int
+    :return:
+    """
+
+    destination.flush()
+    remaining = os.fstat(source.fileno()).st_size - offset
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(source.fileno(), destination.fileno(), remaining, offset)
+                if copied == 0:
+                    break
+                offset += copied
+                remaining -= copied
+            return
+        except OSError:
+            destination.seek(0, os.SEEK_END)
+
+    source.seek(offset)
+    for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+        destination.write(chunk)
+
+
+def write_creation_date(file_path, datetime_string, in_place_segment=False, durability=None):
+    """
+    Writes the provided creation date, into the DateTimeOriginal property of the provided JPEG file, rewriting as
+    little of the file as possible:
+
+    1) If the file already has a DateTimeOriginal property, its fixed width value is overwritten in place (a single
+       20 byte write, within one disk sector).
+    2) Otherwise, if in_place_segment is set, and a new EXIF segment, with the property added, fits within the space of
+       the existing one, only the segment is overwritten in place (padded to its original length). This is not crash
+       safe: the segment may be up to 64 KB, and a crash part way through the write leaves a torn EXIF header.
+    3) Otherwise (e.g. a file with no EXIF metadata at all), a new header is written to a temporary file, followed by
+       the image data (copied inside the kernel where possible), and the temporary file is atomically renamed over the
+       original.
+
+    Each write is flushed to disk before returning. The rename in 3 is only durable once the file's folder has been
+    flushed too: if a GroupCommit is provided, the rename is recorded in it (and the folder flushed with its batch),
+    and otherwise the folder is flushed before returning.
+
+    :param file_path: string
+    :param datetime_string: the creation date ('YYYY:MM:DD HH:MM:SS')
+    :param in_place_segment: bool (see 2, above)
+    :param durability: optional group_commit.GroupCommit
+    :return: 'value', 'segment', or 'file', describing which of the above was rewritten
+    """
+
+    capture_datetime = sort_image_files.parse_exif_datetime(datetime_string)
+    if capture_datetime is None:
+        raise ValueError("Invalid creation date: {}".format(datetime_string))
+    datetime_bytes = capture_datetime.strftime("%Y:%m:%d %H:%M:%S").encode("ascii")
+
+    with open(file_path, "r+b") as file:
+
+        # Finds the EXIF segment (if any), and where the image data begins.
+        exif_offset = exif = None
+        for marker, offset, segment in exif_segments.iter_jpeg_segments(file):
+            if marker == exif_segments.APP1 and segment[4:10] == exif_segments.EXIF_HEADER and exif is None:
+                exif_offset, exif = offset, segment[4:]
+
+        if marker != exif_segments.SOS:
+            raise ValueError("Not a JPEG file: {}".format(file_path))
+
+        # Overwrites the existing value in place, if there is one.
+        location = find_datetime_original(exif) if exif else None
+        if location is not None:
+            value_offset, count = location
+            os.pwrite(file.fileno(), datetime_bytes.ljust(count, b"\x00"), exif_offset + 4 + value_offset)
+            os.fsync(file.fileno())
+            return "value"
+
+        new_segment = build_exif_segment(exif, datetime_bytes)
+
+        # Overwrites just the segment in place, if allowed, and the new one fits.
+        if in_place_segment and exif is not None and len(new_segment) <= len(exif) + 4:
+            padding = len(exif) + 4 - len(new_segment)
+            new_segment = struct.pack(">BBH", 0xFF, exif_segments.APP1, len(exif) + 2) + new_segment[4:] + \
+                b"\x00" * padding
+            os.pwrite(file.fileno(), new_segment, exif_offset)
+            os.fsync(file.fileno())
+            return "segment"
+
+        # Otherwise, writes a new file, and renames it over the original.
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)),
+                                                      prefix=".exif-patch-")
+        try:
+            with os.fdopen(descriptor, "wb") as temporary_file:
+                if exif is None:
+                    temporary_file.write(exif_segments.SOI + new_segment)
+                    copy_file_range(file, temporary_file, len(exif_segments.SOI))
+                else:
+                    temporary_file.write(read_range(file, 0, exif_offset) + new_segment)
+                    copy_file_range(file, temporary_file, exif_offset + len(exif) + 4)
+                temporary_file.flush()
+                os.fsync(temporary_file.fileno())
+            os.chmod(temporary_path, os.stat(file_path).st_mode & 0o7777)
+            os.rename(temporary_path, file_path)
+
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    if durability is not None:
+        durability.record_move(temporary_path, file_path)
+    else:
+        group_commit.fsync_folder(os.path.dirname(os.path.abspath(file_path)))
+
+    return "file"
+
+
+def date_from_modification_time(file_path):
+    """
+    A fallback source for creation dates: the file's modification time, in the local timezone.
+
+    :param file_path: string
+    :return: string ('YYYY:MM:DD HH:MM:SS')
+    """
+
+    import time
+
+    return time.strftime("%Y:%m:%d %H:%M:%S", time.localtime(os.stat(file_path).st_mtime))
+
+
+def patch_creation_dates(dates_by_path, in_place_segment=False, durability=None):
+    """
+    Writes creation dates into a set of files (see write_creation_date), e.g. into the files which failed to sort,
+    using dates from a fallback source, so that later runs can sort them directly from their EXIF metadata.
+
+    Files are patched in path order. Each file's own data is flushed as it is written, while the folders of the
+    rewritten files are flushed once per batch of the provided GroupCommit (by default, one batch covering every file),
+    rather than once per file.
+
+    :param dates_by_path: dictionary of file path to creation date ('YYYY:MM:DD HH:MM:SS')
+    :param in_place_segment: bool (see write_creation_date)
+    :param durability: optional group_commit.GroupCommit
+    :return: dictionary of the successfully patched files (with how each was rewritten), and of the failures
+    """
+
+    results = {"success": {}, "failure": {}}
+    batch = durability if durability is not None else group_commit.GroupCommit(batch_size=len(dates_by_path) or 1,
+                                                                               max_delay=float("inf"))
+
+    try:
+        for file_path in sorted(dates_by_path):
+            try:
+                results['success'][file_path] = write_creation_date(file_path, dates_by_path[file_path],
+                                                                     in_place_segment, batch)
+
+            except Exception as e:
+                result = "Error writing creation date: {}".format(e)
+                results['failure'][file_path] = result
+                print("\t{}".format(result))
+
+    finally:
+        batch.commit()
+
+    return results
@@ -0,0 +1,117 @@
+import struct
+
+
+SOI = b"\xff\xd8"
+SOI_MARKER = 0xD8
+APP1 = 0xE1
+SOS = 0xDA
+EOI = 0xD9
+FILL = 0xFF
+EXIF_HEADER = b"Exif\x00\x00"
+
+# Markers which stand alone, without a length (TEM, and the restart markers).
+STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xD8))
+
+
+def read_exact(stream, size):
+    """
+    Reads exactly the provided number of bytes from the stream (which may return short reads, e.g. a decompressing
+    archive member).
+
+    :param stream: binary file-like object
+    :param size: int
+    :return: bytes (shorter than size only at the end of the stream)
+    """
+
+    chunks = []
+
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b"".join(chunks)
+
+
+def iter_jpeg_segments(stream):
+    """
+    Walks the JPEG segments at the start of the stream, up to (but not including) the start of the image data, without
+    reading any further.
+
+    Yields a (marker, offset, segment) tuple for each segment (starting with the SOI marker), where offset is the
+    position of the segment's marker in the stream, and segment is the complete segment (marker and length included).
+    Any fill bytes (0xFF padding before a marker) are yielded as an item of their own, with the FILL marker. The final
+    item has the marker of the segment where the walk stopped (SOS or EOI), or None if the stream ended, or is not a
+    JPEG. Joined together, the segments are every byte that was read from the stream.
+
+    :param stream: binary file-like object, positioned at the start of the file
+    :return: generator
+    """
+
+    start = read_exact(stream, 2)
+    if start != SOI:
+        yield None, 0, start
+        return
+
+    yield SOI_MARKER, 0, start
+    offset = 2
+
+    while True:
+        marker_bytes = read_exact(stream, 2)
+
+        # Skips any fill bytes which precede the marker.
+        fill = b""
+        while marker_bytes[1:2] == b"\xff":
+            fill += marker_bytes[:1]
+            marker_bytes = marker_bytes[1:] + read_exact(stream, 1)
+        if fill:
+            yield FILL, offset, fill
+            offset += len(fill)
+
+        if len(marker_bytes) < 2 or marker_bytes[0] != 0xFF:
+            yield None, offset, marker_bytes
+            return
+
+        marker = marker_bytes[1]
+        if marker in (SOS, EOI):
+            yield marker, offset, marker_bytes
+            return
+
+        if marker in STANDALONE_MARKERS:
+            yield marker, offset, marker_bytes
+            offset += 2
+            continue
+
+        length_bytes = read_exact(stream, 2)
+        if len(length_bytes) < 2:
+            yield None, offset, marker_bytes + length_bytes
+            return
+
+        length = struct.unpack(">H", length_bytes)[0]
+        segment = marker_bytes + length_bytes + read_exact(stream, length - 2)
+        yield marker, offset, segment
+        offset += len(segment)
+
+
+def read_exif_header(stream):
+    """
+    Reads the JPEG header, from the start of the stream, up to the start of the image data. Only the header is read, so
+    that the rest of the stream can then be copied on (after the returned header bytes) without having to seek back,
+    e.g. when streaming a member out of an archive.
+
+    :param stream: binary file-like object, positioned at the start of the file
+    :return: (header, exif) tuple, where header is every byte that was read, and exif is the payload of the EXIF APP1
+             segment (starting with 'Exif\x00\x00', which piexif.load accepts), or None if there is none
+    """
+
+    header = []
+    exif = None
+
+    for marker, offset, segment in iter_jpeg_segments(stream):
+        header.append(segment)
+        if marker == APP1 and segment[4:10] == EXIF_HEADER and exif is None:
+            exif = segment[4:]
+
+    return b"".join(header), exif
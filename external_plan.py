@@ -0,0 +1,272 @@
+import datetime
+import fnmatch
+import glob
+import heapq
+import json
+import os
+import shutil
+import tempfile
+
+import sort_image_files
+
+
+# The number of planned moves held in memory, before they are sorted and spilled to disk as a run. Each entry takes
+# roughly a few hundred bytes (its paths, and the tuple and list objects holding them), so the default keeps the
+# planning stage well under 100 MB.
+DEFAULT_MAX_ENTRIES_IN_MEMORY = 100000
+
+# The most runs which are merged at once (each one holds an open file); beyond this, runs are merged in several passes.
+MAX_MERGE_FAN_IN = 128
+
+
+def iter_file_paths(source_folder_path, file_match_pattern="*.*"):
+    """
+    Iterates through the files, in the provided path, which match the file match pattern, in the same way as
+    build_file_list, but without building the whole list in memory. (glob lists each folder in full before matching,
+    so a plain file name pattern is matched against a streaming os.scandir instead; a pattern which spans folders falls
+    back to glob.iglob.)
+
+    :param source_folder_path:
+    :param file_match_pattern:
+    :return: generator of file paths
+    """
+
+    if os.sep in file_match_pattern or (os.altsep and os.altsep in file_match_pattern):
+        yield from glob.iglob(os.path.join(source_folder_path, file_match_pattern))
+        return
+
+    with os.scandir(source_folder_path) as entries:
+        for entry in entries:
+            if fnmatch.fnmatch(entry.name, file_match_pattern) and not (entry.name.startswith(".") and
+                                                                       not file_match_pattern.startswith(".")):
+                yield os.path.join(source_folder_path, entry.name)
+
+
+def write_run(entries, work_folder):
+    """
+    Sorts the provided planned moves, by destination folder (and then by source path), and writes them to a new run
+    file, one JSON array per line.
+
+    :param entries: list of [destination_folder_components, source_path, capture_datetime] lists
+    :param work_folder: string
+    :return: path of the run file
+    """
+
+    entries.sort(key=lambda entry: (entry[0], entry[1]))
+
+    descriptor, run_path = tempfile.mkstemp(dir=work_folder, prefix="run-", suffix=".jsonl")
+    with os.fdopen(descriptor, "w", encoding="utf-8") as run_file:
+        for entry in entries:
+            run_file.write(json.dumps(entry))
+            run_file.write("\n")
+
+    return run_path
+
+
+def read_run(run_path):
+    """
+    Reads the planned moves back from a run file, one at a time.
+
+    :param run_path: string
+    :return: generator of [destination_folder_components, source_path, capture_datetime] lists
+    """
+
+    with open(run_path, encoding="utf-8") as run_file:
+        for line in run_file:
+            yield json.loads(line)
+
+
+def merge_runs(run_paths):
+    """
+    Merges the provided (sorted) run files into a single stream of planned moves, ordered by destination folder.
+
+    :param run_paths: list of strings
+    :return: generator of [destination_folder_components, source_path, capture_datetime] lists
+    """
+
+    return heapq.merge(*[read_run(run_path) for run_path in run_paths], key=lambda entry: (entry[0], entry[1]))
+
+
+def reduce_runs(run_paths, work_folder):
+    """
+    Merges the provided run files, in groups of at most MAX_MERGE_FAN_IN, into fewer (longer) runs, until few enough
+    remain to be merged at once. The merged runs are removed.
+
+    :param run_paths: list of strings
+    :param work_folder: string
+    :return: list of the remaining run paths
+    """
+
+    while len(run_paths) > MAX_MERGE_FAN_IN:
+        merged_paths = []
+
+        for start in range(0, len(run_paths), MAX_MERGE_FAN_IN):
+            group = run_paths[start:start + MAX_MERGE_FAN_IN]
+            descriptor, merged_path = tempfile.mkstemp(dir=work_folder, prefix="run-", suffix=".jsonl")
+            with os.fdopen(descriptor, "w", encoding="utf-8") as merged_file:
+                for entry in merge_runs(group):
+                    merged_file.write(json.dumps(entry))
+                    merged_file.write("\n")
+            for run_path in group:
+                os.remove(run_path)
+            merged_paths.append(merged_path)
+
+        run_paths = merged_paths
+
+    return run_paths
+
+
+def write_results(results, results_file, totals):
+    """
+    Appends the provided results to the results log (one JSON object per line), adds them to the running totals, and
+    then empties them, so that results never accumulate in memory. A file which was moved, but could not be recorded
+    (e.g. in the library index), has a line of its own, with its 'bookkeeping_failure'.
+
+    :param results: results dictionary
+    :param results_file: file object
+    :param totals: dictionary of 'success', 'failure' and 'bookkeeping_failures' counts
+    :return:
+    """
+
+    for file_path in results['success']:
+        results_file.write(json.dumps({"path": file_path, "success": True}) + "\n")
+
+    for file_path, result in results['failure'].items():
+        results_file.write(json.dumps({"path": file_path, "success": False, "failure": result,
+                                       "kind": getattr(result, "kind", None)}) + "\n")
+
+    bookkeeping_failures = results.get('bookkeeping_failures', {})
+    for file_path, result in bookkeeping_failures.items():
+        results_file.write(json.dumps({"path": file_path, "success": True, "bookkeeping_failure": result,
+                                       "kind": getattr(result, "kind", None)}) + "\n")
+
+    totals['success'] += len(results['success'])
+    totals['failure'] += len(results['failure'])
+    totals['bookkeeping_failures'] += len(bookkeeping_failures)
+    results['success'].clear()
+    results['failure'].clear()
+    bookkeeping_failures.clear()
+
+
+def plan_moves(file_paths, work_folder, results_file, totals, max_entries_in_memory=DEFAULT_MAX_ENTRIES_IN_MEMORY,
+               target_timezone=None, retry_policy=None):
+    """
+    Extracts the capture date of each file, and plans its move into the hierarchical folder structure, spilling the
+    planned moves to sorted runs on disk whenever max_entries_in_memory of them have accumulated. Files whose date
+    cannot be extracted are written straight to the results log.
+
+    :param file_paths: iterable of file paths
+    :param work_folder: string
+    :param results_file: file object (the results log)
+    :param totals: dictionary of 'success', 'failure' and 'bookkeeping_failures' counts
+    :param max_entries_in_memory: int
+    :param target_timezone: optional timezone (see sort_hierarchical_by_date)
+    :param retry_policy: optional retry_policy.RetryPolicy
+    :return: list of run paths
+    """
+
+    results = {"success": [], "failure": {}}
+    entries = []
+    run_paths = []
+
+    for file_path in file_paths:
+        print("Inspecting file: {}".format(file_path))
+
+        capture_datetime = sort_image_files.extract_capture_datetime(file_path, results, target_timezone,
+                                                                     retry_policy)
+        if capture_datetime is None:
+            write_results(results, results_file, totals)
+            continue
+
+        entries.append([sort_image_files.compute_date_path_components(capture_datetime), file_path,
+                        capture_datetime.isoformat()])
+
+        if len(entries) >= max_entries_in_memory:
+            run_paths.append(write_run(entries, work_folder))
+            entries = []
+
+    if entries:
+        run_paths.append(write_run(entries, work_folder))
+
+    return run_paths
+
+
+def execute_plan(planned_moves, destination_base_path, results_file, totals, index=None, retry_policy=None):
+    """
+    Carries out the planned moves, as they are streamed from the merged runs. As the moves arrive grouped by
+    destination folder, the results are written to the results log once per folder.
+
+    :param planned_moves: iterable of [destination_folder_components, source_path, capture_datetime] lists, ordered by
+                          destination folder
+    :param destination_base_path: string
+    :param results_file: file object (the results log)
+    :param totals: dictionary of 'success', 'failure' and 'bookkeeping_failures' counts
+    :param index: optional library index connection, in which each sorted file is recorded
+    :param retry_policy: optional retry_policy.RetryPolicy
+    :return:
+    """
+
+    results = {"success": [], "failure": {}}
+    current_folder = None
+
+    for destination_folder, file_path, capture_datetime in planned_moves:
+        if destination_folder != current_folder:
+            write_results(results, results_file, totals)
+            current_folder = destination_folder
+
+        print("Moving file: {}".format(file_path))
+        sort_image_files.move_file_to_folder(file_path, destination_base_path, destination_folder,
+                                             datetime.datetime.fromisoformat(capture_datetime), results, index,
+                                             retry_policy)
+
+    write_results(results, results_file, totals)
+
+
+def sort_files_bounded(source_folder_path, destination_folder_path, file_match_pattern, results_path,
+                       max_entries_in_memory=DEFAULT_MAX_ENTRIES_IN_MEMORY, work_folder=None, index=None,
+                       target_timezone=None, retry_policy=None):
+    """
+    Sorts the files, in the provided path, into the hierarchical folder structure (as sort_hierarchical_by_date does),
+    using a bounded amount of memory, however many files there are:
+
+    1) The files are listed lazily, and their planned moves spilled to sorted runs on disk (see plan_moves).
+    2) The runs are merged (an external merge sort, by destination folder), and the moves carried out as the merged
+       plan is streamed (see execute_plan), so each destination folder is visited once.
+
+    Rather than being returned, the result of each file is written to the results log (one JSON object per line, e.g.
+    {"path": "/incoming/IMG_0766.jpg", "success": true}), and only the totals are returned. Files which were moved, but
+    could not be recorded in the index, are counted under 'bookkeeping_failures' as well as 'success'.
+
+    :param source_folder_path:
+    :param destination_folder_path:
+    :param file_match_pattern:
+    :param results_path: path of the results log to write
+    :param max_entries_in_memory: the most planned moves held in memory at once
+    :param work_folder: folder in which to write the runs (by default, a temporary folder), which must have room for
+                        a few hundred bytes per file
+    :param index: optional library index connection, in which each sorted file is recorded
+    :param target_timezone: optional timezone (see sort_hierarchical_by_date)
+    :param retry_policy: optional retry_policy.RetryPolicy
+    :return: dictionary of the 'success', 'failure' and 'bookkeeping_failures' counts
+    """
+
+    # Sets the destination path to the current working directory, if one hasn't be specified.
+    if not destination_folder_path:
+        destination_folder_path = os.getcwd()
+        print("No destination path specified. Using current directory as default.")
+
+    totals = {"success": 0, "failure": 0, "bookkeeping_failures": 0}
+    run_folder = tempfile.mkdtemp(dir=work_folder, prefix="sort-plan-")
+
+    try:
+        with open(results_path, "w", encoding="utf-8") as results_file:
+            file_paths = iter_file_paths(source_folder_path, file_match_pattern)
+            run_paths = plan_moves(file_paths, run_folder, results_file, totals, max_entries_in_memory,
+                                   target_timezone, retry_policy)
+            run_paths = reduce_runs(run_paths, run_folder)
+            execute_plan(merge_runs(run_paths), destination_folder_path, results_file, totals, index, retry_policy)
+
+    finally:
+        shutil.rmtree(run_folder, ignore_errors=True)
+
+    return totals
@@ -0,0 +1,157 @@
+import os
+
+import sort_image_files
+
+
+# The extensions of the files from which EXIF metadata can be read, from the cheapest to read to the dearest: piexif
+# reads just the header of a JPEG, but the whole of a TIFF based RAW file.
+JPEG_EXTENSIONS = {".jpg", ".jpeg", ".jpe"}
+TIFF_EXTENSIONS = {".tif", ".tiff", ".dng", ".cr2", ".nef", ".nrw", ".arw", ".srw", ".orf", ".rw2", ".pef", ".raf"}
+
+# The extensions of sidecar files, which may also be named after the full name of the file they belong to (e.g.
+# 'IMG_0001.CR2.xmp').
+SIDECAR_EXTENSIONS = {".xmp", ".aae"}
+
+# The extensions of the photos and videos which a sidecar's name may include.
+MEDIA_EXTENSIONS = JPEG_EXTENSIONS | TIFF_EXTENSIONS | {".heic", ".heif", ".png", ".cr3", ".mov", ".mp4", ".m4v"}
+
+
+def compute_group_key(file_path):
+    """
+    Computes the key by which the provided file is grouped with its paired files: its folder, and its stem (its name
+    without its extension, and, for a sidecar named after the full name of its photo or video, without that file's
+    extension too, ignoring case).
+
+    Example: ('/incoming/IMG_0001.CR2.xmp')
+
+    ('/incoming', 'img_0001')
+
+    :param file_path: string
+    :return: tuple
+    """
+
+    folder_path, filename = os.path.split(file_path)
+    stem, extension = os.path.splitext(filename)
+
+    if extension.lower() in SIDECAR_EXTENSIONS:
+        inner_stem, inner_extension = os.path.splitext(stem)
+        if inner_extension.lower() in MEDIA_EXTENSIONS:
+            stem = inner_stem
+
+    return folder_path, stem.lower()
+
+
+def group_files(file_list):
+    """
+    Groups the provided files by stem (see compute_group_key), so that paired files (e.g. a RAW file and the JPEG
+    taken with it, a Live Photo and its video, or a photo and its sidecars) are sorted together.
+
+    :param file_list: list of file paths
+    :return: list of groups (each a list of file paths), in the order of each group's first file
+    """
+
+    groups = {}
+
+    for file_path in file_list:
+        groups.setdefault(compute_group_key(file_path), []).append(file_path)
+
+    return list(groups.values())
+
+
+def order_metadata_sources(group):
+    """
+    Orders the members of a group which may hold EXIF metadata, from the cheapest to read (JPEG files, and then TIFF
+    based RAW files, smallest first) to the dearest. Sidecars, and files of any other type (e.g. videos), are only
+    tried if the group has no photos.
+
+    :param group: list of file paths
+    :return: list of file paths
+    """
+
+    def cost(file_path):
+        extension = os.path.splitext(file_path)[1].lower()
+        rank = 0 if extension in JPEG_EXTENSIONS else 1 if extension in TIFF_EXTENSIONS else 2
+
+        try:
+            size = os.stat(file_path).st_size
+        except OSError:
+            size = 0
+
+        return rank, size, file_path
+
+    sources = sorted((file_path for file_path in group
+                      if os.path.splitext(file_path)[1].lower() not in SIDECAR_EXTENSIONS), key=cost)
+
+    if sources and cost(sources[0])[0] < 2:
+        return [file_path for file_path in sources if cost(file_path)[0] < 2]
+
+    return sources or sorted(group)
+
+
+def sort_grouped_by_date(file_list, destination_base_path, index=None, target_timezone=None, retry_policy=None,
+                         throttle=None, durability=None, duplicate_detector=None, transfer=None):
+    """
+    Sorts the provided files into the hierarchical folder structure (see sort_hierarchical_by_date), a group of paired
+    files at a time (see group_files): the capture datetime is read once per group, from its cheapest member (falling
+    back to the next, if that has no readable date), and then every member is moved into the same folder. Sidecars and
+    videos, which have no EXIF metadata of their own, are sorted along with their photo.
+
+    If no date can be read for a group, the failure is recorded for each of its members.
+
+    :param file_list:
+    :param destination_base_path:
+    :param index: optional library index connection, in which each sorted file is recorded
+    :param target_timezone: optional timezone (see sort_hierarchical_by_date)
+    :param retry_policy: optional retry_policy.RetryPolicy
+    :param throttle: optional io_throttle.IoThrottle
+    :param durability: optional group_commit.GroupCommit
+    :param duplicate_detector: optional near_duplicates.NearDuplicateDetector
+    :param transfer: optional verified_transfer.VerifiedTransfer
+    :return: dictionary of the successfully sorted files, and of the failures
+    """
+
+    results = {"success": [], "failure": {}}
+
+    # Sets the destination path to the current working directory, if one hasn't be specified.
+    if not destination_base_path:
+        destination_base_path = os.getcwd()
+        print("No destination path specified. Using current directory as default.")
+
+    try:
+        for group in group_files(file_list):
+            print("Inspecting group: {}".format(", ".join(group)))
+
+            # Flushes the moves made so far, if they have been waiting too long, before a read which may stall.
+            if durability is not None:
+                durability.commit_if_due()
+
+            # Reads the capture datetime from the cheapest member which has one.
+            capture_datetime = None
+            for file_path in order_metadata_sources(group):
+                attempt = {"success": [], "failure": {}}
+                capture_datetime = sort_image_files.extract_capture_datetime(
+                    file_path, attempt, target_timezone, retry_policy, throttle, duplicate_detector)
+
+                if 'near_duplicates' in attempt:
+                    results.setdefault('near_duplicates', {}).update(attempt['near_duplicates'])
+                if capture_datetime is not None:
+                    break
+
+            # Records the failure of the last member tried, for every member.
+            if capture_datetime is None:
+                failure = next(iter(attempt['failure'].values()))
+                for file_path in group:
+                    results['failure'][file_path] = failure
+                continue
+
+            computed_destination_folder = sort_image_files.compute_date_path_components(capture_datetime)
+            for file_path in group:
+                sort_image_files.move_file_to_folder(file_path, destination_base_path, computed_destination_folder,
+                                                     capture_datetime, results, index, retry_policy, throttle,
+                                                     durability, transfer)
+
+    finally:
+        if durability is not None:
+            durability.commit()
+
+    return results
@@ -0,0 +1,122 @@
+import os
+import re
+import zlib
+
+
+# The number of files above which a day folder is split into subfolders.
+DEFAULT_FANOUT_THRESHOLD = 5000
+
+# Fan-out modes: by the hour in which each photo was taken, or by a numbered shard, computed from the file's name.
+FANOUT_BY_HOUR = "hour"
+FANOUT_BY_SHARD = "shard"
+
+DEFAULT_SHARD_COUNT = 16
+
+# The names of the subfolders of a day folder which has been split, in each mode.
+SUBFOLDER_PATTERNS = {
+    FANOUT_BY_HOUR: re.compile(r"^\d{2}h$"),
+    FANOUT_BY_SHARD: re.compile(r"^shard \d{2,}$"),
+}
+
+
+def compute_shard(filename, shard_count):
+    """
+    Computes the shard of the provided file name (the same for a given name, wherever the file comes from).
+
+    :param filename: string
+    :param shard_count: int
+    :return: int
+    """
+
+    return zlib.crc32(filename.encode("utf-8", "surrogateescape")) % shard_count
+
+
+class FolderFanout:
+    """
+    Splits the day folders of the hierarchical folder structure into subfolders, once they hold more than threshold
+    files, so that no folder grows so large as to slow down lookups, listings, and backups:
+
+    destination_base_path/YYYY/MM - Month/DD/HHh (by hour)
+    destination_base_path/YYYY/MM - Month/DD/shard NN (by shard)
+
+    The decision is made per day folder, from the number of files being sorted into it, along with the number already
+    in it, before any are moved (see plan), so that it does not depend on the order in which the files are sorted. Once
+    a day folder has been split, every later file for that day also goes into a subfolder, so each file's folder stays
+    the same across reruns (with the same mode and shard count). Files already in a day folder when it is split are
+    left where they are.
+    """
+
+    def __init__(self, threshold=DEFAULT_FANOUT_THRESHOLD, mode=FANOUT_BY_HOUR, shard_count=DEFAULT_SHARD_COUNT):
+        if mode not in SUBFOLDER_PATTERNS:
+            raise ValueError("Unknown fan-out mode: {}".format(mode))
+
+        self.threshold = threshold
+        self.mode = mode
+        self.shard_count = shard_count
+        self.split_folders = set()
+
+    def is_split(self, folder_path):
+        """
+        Determines whether the provided (existing) day folder has already been split, i.e. whether it has any
+        subfolders named as this mode names them.
+
+        :param folder_path: string
+        :return:
+        """
+
+        try:
+            with os.scandir(folder_path) as entries:
+                return any(entry.is_dir() and SUBFOLDER_PATTERNS[self.mode].match(entry.name) for entry in entries)
+
+        except FileNotFoundError:
+            return False
+
+    def count_files(self, folder_path):
+        """
+        Counts the files (and any other entries) in the provided day folder.
+
+        :param folder_path: string
+        :return: int
+        """
+
+        try:
+            with os.scandir(folder_path) as entries:
+                return sum(1 for _ in entries)
+
+        except FileNotFoundError:
+            return 0
+
+    def plan(self, day_folder_counts, destination_base_path):
+        """
+        Decides which day folders to split, from the number of files about to be sorted into each.
+
+        :param day_folder_counts: dictionary of day folder components (as a tuple) to a number of files
+        :param destination_base_path: string
+        :return: set of the day folders (as tuples of components) to split
+        """
+
+        for day_components, count in day_folder_counts.items():
+            folder_path = os.path.join(destination_base_path, *day_components)
+            if self.is_split(folder_path) or count + self.count_files(folder_path) > self.threshold:
+                self.split_folders.add(tuple(day_components))
+
+        return self.split_folders
+
+    def compute_path_components(self, day_components, capture_datetime, filename):
+        """
+        Computes the folder for a file, within its day folder: the day folder itself, or one of its subfolders, if it
+        has been split.
+
+        :param day_components: list of day folder components (see compute_date_path_components)
+        :param capture_datetime: datetime.datetime
+        :param filename: string
+        :return: list of subfolder components
+        """
+
+        if tuple(day_components) not in self.split_folders:
+            return list(day_components)
+
+        if self.mode == FANOUT_BY_HOUR:
+            return list(day_components) + ["{:02d}h".format(capture_datetime.hour)]
+
+        return list(day_components) + ["shard {:02d}".format(compute_shard(filename, self.shard_count))]
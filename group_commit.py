@@ -0,0 +1,117 @@
+import os
+import time
+
+
+# The defaults, which bound how much recent sorting a power loss can undo: at most this many files, or this many
+# seconds' worth of moves.
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_DELAY = 1.0
+
+
+def fsync_folder(folder_path):
+    """
+    Flushes the provided folder's entries (e.g. a file renamed into or out of it) to disk.
+
+    :param folder_path: string
+    :return:
+    """
+
+    descriptor = os.open(folder_path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class GroupCommit:
+    """
+    Makes moves durable in batches. A rename is only durable once both the folder it was moved out of, and the folder
+    it was moved into (and any folders created to hold it), have been flushed to disk; rather than flushing them after
+    every move, the folders touched by a batch of moves are each flushed once, when the batch is committed.
+
+    A batch is committed once batch_size moves have been recorded, or max_delay seconds after its first move, whichever
+    comes first (and whenever commit is called, e.g. at the end of a sort). The delay is checked whenever a move is
+    recorded, and by the sorting schemes before each file is read (see commit_if_due), so a batch can outlive max_delay
+    by at most the duration of a single read or move (e.g. one which is stalled on a slow mount, or being retried).
+
+    These set the trade-off between durability and throughput: a power loss can undo at most the moves of the current
+    batch, while each commit costs one fsync per distinct folder touched. A batch_size of 1 flushes after every move.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY, clock=time.monotonic):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.clock = clock
+        self.pending_folders = set()
+        self.pending_moves = 0
+        self.batch_started = None
+        self.commits = 0
+        self.failed_folders = []
+
+    def record_move(self, source_path, destination_path, destination_base_path=None):
+        """
+        Records a completed rename, committing the batch if it is now due.
+
+        :param source_path: string
+        :param destination_path: string
+        :param destination_base_path: optional string; if provided, every folder from the destination's folder up to
+                                      (and including) this one is flushed, so that newly created folders are durable too
+        :return:
+        """
+
+        self.pending_folders.add(os.path.dirname(os.path.abspath(source_path)))
+
+        folder_path = os.path.dirname(os.path.abspath(destination_path))
+        self.pending_folders.add(folder_path)
+        if destination_base_path is not None:
+            base_path = os.path.abspath(destination_base_path)
+            while folder_path.startswith(base_path + os.sep):
+                folder_path = os.path.dirname(folder_path)
+                self.pending_folders.add(folder_path)
+
+        if self.pending_moves == 0:
+            self.batch_started = self.clock()
+        self.pending_moves += 1
+
+        if self.pending_moves >= self.batch_size or self.clock() - self.batch_started >= self.max_delay:
+            self.commit()
+
+    def commit_if_due(self):
+        """
+        Commits the pending batch, if it is older than max_delay (e.g. while the next file is slow to read).
+
+        :return: True if a batch was committed, otherwise False
+        """
+
+        if self.pending_moves and self.clock() - self.batch_started >= self.max_delay:
+            self.commit()
+            return True
+
+        return False
+
+    def commit(self):
+        """
+        Flushes every folder touched by the moves recorded since the last commit. A folder which cannot be flushed is
+        recorded in failed_folders (the moves into and out of it may not survive a power loss).
+
+        :return: True if every folder was flushed, otherwise False
+        """
+
+        success = True
+
+        for folder_path in sorted(self.pending_folders):
+            try:
+                fsync_folder(folder_path)
+
+            except OSError as e:
+                print("Unable to flush folder {}: {}".format(folder_path, e))
+                self.failed_folders.append(folder_path)
+                success = False
+
+        if self.pending_moves:
+            self.commits += 1
+        self.pending_folders.clear()
+        self.pending_moves = 0
+        self.batch_started = None
+
+        return success
@@ -0,0 +1,275 @@
+import collections
+import heapq
+import itertools
+import os
+import threading
+import time
+
+import sort_image_files
+
+
+# Priority classes: live drops (e.g. photos arriving from a phone), which should appear in the library within seconds,
+# and bulk backfills (e.g. a migration), which use whatever capacity is left.
+LIVE = "live"
+BULK = "bulk"
+
+DEFAULT_LIVE_CAPACITY = 10000
+DEFAULT_BULK_CAPACITY = 100000
+
+# The latency target for live files: the time from submission until the file is sorted.
+DEFAULT_LATENCY_TARGET = 5.0
+
+# The share of the latency target which a bulk batch may take, as a live file arriving just after a bulk batch has
+# started has to wait for it to finish.
+BULK_BATCH_SHARE = 0.5
+DEFAULT_MAX_BULK_BATCH = 500
+DEFAULT_MAX_LIVE_BATCH = 100
+
+# The weight of the latest batch, in the running average of the time taken to sort each file.
+COST_SMOOTHING = 0.2
+
+# The number of recent live latencies kept, for the percentiles reported by get_status.
+LATENCY_WINDOW = 1000
+
+
+def compute_percentile(values, percentile):
+    """
+    Computes the provided percentile (0 to 100) of the values, by the nearest rank.
+
+    :param values: list of numbers
+    :param percentile: number
+    :return: number, or None if there are no values
+    """
+
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(percentile / 100.0 * len(ordered))) - 1))]
+
+
+class IngestScheduler:
+    """
+    Schedules continuously arriving files for sorting, in two priority classes, each with its own bounded queue:
+
+    - LIVE files are sorted first, the newest (by modification time) first, in batches of at most max_live_batch.
+    - BULK files are sorted in the order they were submitted, whenever no live files are waiting, in batches sized
+      (from the measured time taken to sort each file) to take no more than BULK_BATCH_SHARE of the latency target,
+      so that a live file never waits long behind a bulk batch.
+
+    The latency of each live file (from submission until it is sorted) is tracked against the latency target (see
+    get_status). The scheduler is driven by run (e.g. on a background thread), or by run_once, and files may be
+    submitted from any thread.
+
+    As the scheduler is meant to run indefinitely, it keeps only counts of the files sorted and failed; the results of
+    each batch are passed to on_batch (if provided), as (priority, results) when the batch is done.
+    """
+
+    def __init__(self, destination_base_path, sorting_scheme=sort_image_files.sort_hierarchical_by_date,
+                 live_capacity=DEFAULT_LIVE_CAPACITY, bulk_capacity=DEFAULT_BULK_CAPACITY,
+                 latency_target=DEFAULT_LATENCY_TARGET, max_live_batch=DEFAULT_MAX_LIVE_BATCH,
+                 max_bulk_batch=DEFAULT_MAX_BULK_BATCH, clock=time.monotonic, on_batch=None, **scheme_options):
+        self.destination_base_path = destination_base_path
+        self.sorting_scheme = sorting_scheme
+        self.on_batch = on_batch
+        self.scheme_options = scheme_options
+        self.live_capacity = live_capacity
+        self.bulk_capacity = bulk_capacity
+        self.latency_target = latency_target
+        self.max_live_batch = max_live_batch
+        self.max_bulk_batch = max_bulk_batch
+        self.clock = clock
+
+        self.condition = threading.Condition()
+        self.live_queue = []
+        self.bulk_queue = collections.deque()
+        self.sequence = itertools.count()
+
+        self.file_cost = None
+        self.live_latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.missed_target = 0
+        self.sorted_counts = {LIVE: 0, BULK: 0}
+        self.failed_count = 0
+
+    def submit(self, file_paths, priority=LIVE):
+        """
+        Queues the provided files for sorting, in the provided priority class. Files which do not fit in the class's
+        queue are rejected, so that the caller can hold on to them, and submit them again later.
+
+        :param file_paths: list of file paths
+        :param priority: LIVE or BULK
+        :return: list of the rejected file paths
+        """
+
+        if priority not in (LIVE, BULK):
+            raise ValueError("Unknown priority class: {}".format(priority))
+
+        now = self.clock()
+        rejected = []
+
+        # Stats the live files outside of the lock, to order them by modification time.
+        if priority == LIVE:
+            entries = []
+            for file_path in file_paths:
+                try:
+                    mtime = os.stat(file_path).st_mtime
+                except OSError:
+                    mtime = 0.0
+                entries.append((mtime, file_path))
+
+        with self.condition:
+            if priority == LIVE:
+                for mtime, file_path in entries:
+                    if len(self.live_queue) >= self.live_capacity:
+                        rejected.append(file_path)
+                    else:
+                        heapq.heappush(self.live_queue, (-mtime, next(self.sequence), file_path, now))
+            else:
+                room = max(0, self.bulk_capacity - len(self.bulk_queue))
+                self.bulk_queue.extend((file_path, now) for file_path in file_paths[:room])
+                rejected.extend(file_paths[room:])
+
+            self.condition.notify()
+
+        return rejected
+
+    def compute_bulk_batch_size(self):
+        """
+        Computes the size of the next bulk batch: as many files as can be sorted in BULK_BATCH_SHARE of the latency
+        target, at the measured cost per file (between 1 and max_bulk_batch files).
+
+        :return: int
+        """
+
+        if not self.file_cost:
+            return 1
+
+        return max(1, min(self.max_bulk_batch, int(self.latency_target * BULK_BATCH_SHARE / self.file_cost)))
+
+    def take_batch(self):
+        """
+        Takes the next batch of files to sort, from the live queue if it has any files, and otherwise from the bulk
+        queue.
+
+        :return: (priority, list of (file_path, submitted) tuples) tuple, or None if both queues are empty
+        """
+
+        with self.condition:
+            if self.live_queue:
+                count = min(self.max_live_batch, len(self.live_queue))
+                batch = [heapq.heappop(self.live_queue)[2:] for _ in range(count)]
+                return LIVE, batch
+
+            if self.bulk_queue:
+                count = min(self.compute_bulk_batch_size(), len(self.bulk_queue))
+                return BULK, [self.bulk_queue.popleft() for _ in range(count)]
+
+        return None
+
+    def run_batch(self, priority, batch):
+        """
+        Sorts the provided batch of files, and records the cost per file, the latency of each live file, and the
+        counts of the files sorted and failed. If the sorting scheme raises an error, every file of the batch is
+        recorded as failed, so that one bad batch does not stop the scheduler.
+
+        :param priority: LIVE or BULK
+        :param batch: list of (file_path, submitted) tuples
+        :return: results dictionary, of the batch
+        """
+
+        from retry_policy import SortFailure, classify_error
+
+        file_list = [file_path for file_path, _ in batch]
+        started = self.clock()
+
+        try:
+            results = self.sorting_scheme(file_list, self.destination_base_path, **self.scheme_options)
+
+        except Exception as e:
+            result = SortFailure("Error sorting batch: {}".format(e), classify_error(e), e)
+            results = {"success": [], "failure": {file_path: result for file_path in file_list}}
+            print("\t{}".format(result))
+
+        finished = self.clock()
+
+        with self.condition:
+            cost = (finished - started) / len(batch)
+            self.file_cost = cost if self.file_cost is None else \
+                (1 - COST_SMOOTHING) * self.file_cost + COST_SMOOTHING * cost
+
+            if priority == LIVE:
+                for _, submitted in batch:
+                    latency = finished - submitted
+                    self.live_latencies.append(latency)
+                    if latency > self.latency_target:
+                        self.missed_target += 1
+
+            self.sorted_counts[priority] += len(batch)
+            self.failed_count += len(results['failure'])
+
+        if self.on_batch is not None:
+            try:
+                self.on_batch(priority, results)
+
+            except Exception as e:
+                print("Error reporting batch results: {}".format(e))
+
+        return results
+
+    def run_once(self):
+        """
+        Sorts the next batch of files, if any are waiting.
+
+        :return: True if a batch was sorted, otherwise False
+        """
+
+        batch = self.take_batch()
+        if batch is None:
+            return False
+
+        self.run_batch(*batch)
+        return True
+
+    def run(self, stop_event, poll_interval=1.0):
+        """
+        Sorts batches of files as they are submitted, until the provided event is set.
+
+        :param stop_event: threading.Event
+        :param poll_interval: the longest time (in seconds) to wait for files, before checking the stop event again
+        :return:
+        """
+
+        while not stop_event.is_set():
+            if not self.run_once():
+                with self.condition:
+                    if not self.live_queue and not self.bulk_queue:
+                        self.condition.wait(poll_interval)
+
+    def get_status(self):
+        """
+        Reports the state of the queues, and how the live class is doing against its latency target.
+
+        Example:
+
+        {'live_queued': 0, 'bulk_queued': 48000, 'live_sorted': 120, 'bulk_sorted': 2000, 'failed': 3,
+         'bulk_batch_size': 62, 'live_latency_p50': 0.4, 'live_latency_p95': 1.8, 'live_latency_max': 2.5,
+         'missed_target': 0}
+
+        :return: dictionary
+        """
+
+        with self.condition:
+            latencies = list(self.live_latencies)
+
+            return {
+                "live_queued": len(self.live_queue),
+                "bulk_queued": len(self.bulk_queue),
+                "live_sorted": self.sorted_counts[LIVE],
+                "bulk_sorted": self.sorted_counts[BULK],
+                "failed": self.failed_count,
+                "bulk_batch_size": self.compute_bulk_batch_size(),
+                "live_latency_p50": compute_percentile(latencies, 50),
+                "live_latency_p95": compute_percentile(latencies, 95),
+                "live_latency_max": max(latencies) if latencies else None,
+                "missed_target": self.missed_target,
+            }
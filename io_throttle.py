@@ -0,0 +1,291 @@
+import json
+import os
+import platform
+import time
+
+import exif_segments
+
+
+# The ioprio_set system call, which Python does not expose, by machine architecture.
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30, "armv7l": 314, "ppc64le": 273}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+
+# I/O scheduling classes, for set_io_priority.
+IOPRIO_CLASS_REALTIME = 1
+IOPRIO_CLASS_BEST_EFFORT = 2
+IOPRIO_CLASS_IDLE = 3
+
+# The rates which can be set through the control file (see IoThrottle.load_control_file).
+RATE_NAMES = ("bytes_per_second", "operations_per_second", "metadata_operations_per_second")
+
+
+def validate_rate(rate):
+    """
+    Checks that the provided rate is either None (no limit), or a positive number. A rate of 0 is rejected, rather than
+    taken to mean either no limit, or paused (which would block the sort, with no way to resume it).
+
+    :param rate:
+    :return: the rate
+    """
+
+    if rate is None:
+        return rate
+
+    if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not rate > 0 or rate == float("inf"):
+        raise ValueError("Invalid rate (expected a positive number, or null for no limit): {!r}".format(rate))
+
+    return rate
+
+
+class TokenBucket:
+    """
+    A token bucket, which limits the rate of some quantity (bytes, or operations) to rate per second, while allowing
+    bursts of up to burst at once. A request larger than the bucket holds is let through, and the bucket goes into debt,
+    so that the following requests wait until the rate has been made good.
+
+    A rate of None means no limit (see validate_rate).
+    """
+
+    def __init__(self, rate=None, burst=None, sleep=time.sleep, clock=time.monotonic):
+        self.sleep = sleep
+        self.clock = clock
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        """
+        Changes the rate (and burst) of the bucket, which starts out full.
+
+        :param rate: positive number per second, or None
+        :param burst: positive number, or None for one second's worth
+        :return:
+        """
+
+        validate_rate(rate)
+        validate_rate(burst)
+
+        self.rate = rate
+        self.burst = burst if burst is not None else (rate or 0)
+        self.tokens = self.burst
+        self.updated = self.clock()
+
+    def acquire(self, amount=1):
+        """
+        Takes the provided amount from the bucket, waiting first, if the bucket is in debt.
+
+        :param amount: number
+        :return: the time spent waiting (in seconds)
+        """
+
+        if self.rate is None:
+            return 0.0
+
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+
+        if self.tokens >= 0:
+            return 0.0
+
+        delay = -self.tokens / self.rate
+        self.sleep(delay)
+        return delay
+
+
+class ThrottledReader:
+    """
+    Wraps a binary stream, so that each read is charged to the throttle's byte rate.
+    """
+
+    def __init__(self, stream, throttle):
+        self.stream = stream
+        self.throttle = throttle
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.throttle.read_bytes(len(data))
+        return data
+
+
+class IoThrottle:
+    """
+    Limits the I/O of a sort, so that it does not starve other services sharing the same disks. Three separate token
+    buckets limit:
+
+    - bytes_per_second: the bytes read, while extracting EXIF metadata (and while copying and verifying files, see
+      verified_transfer)
+    - operations_per_second: the file operations (each file read, and each file moved)
+    - metadata_operations_per_second: the folder metadata operations (each folder created, and each file renamed)
+
+    The rates can be changed while a sort is running, by rewriting the control file (a JSON object, with any of the
+    rate names above as keys, and null for no limit; the rates it omits are left as they are), which is checked for
+    changes at most every check_interval seconds, or immediately after the signal installed by install_signal_handler
+    has been received.
+    """
+
+    def __init__(self, bytes_per_second=None, operations_per_second=None, metadata_operations_per_second=None,
+                 control_path=None, check_interval=1.0, sleep=time.sleep, clock=time.monotonic):
+        self.bytes = TokenBucket(bytes_per_second, sleep=sleep, clock=clock)
+        self.operations = TokenBucket(operations_per_second, sleep=sleep, clock=clock)
+        self.metadata_operations = TokenBucket(metadata_operations_per_second, sleep=sleep, clock=clock)
+        self.control_path = control_path
+        self.check_interval = check_interval
+        self.clock = clock
+        self.control_mtime = None
+        self.next_check = clock()
+        self.reload_requested = False
+        self.waited = 0.0
+
+    def configure(self, bytes_per_second=None, operations_per_second=None, metadata_operations_per_second=None):
+        """
+        Changes all three rates at once (None for no limit).
+
+        :param bytes_per_second:
+        :param operations_per_second:
+        :param metadata_operations_per_second:
+        :return:
+        """
+
+        self.bytes.set_rate(bytes_per_second)
+        self.operations.set_rate(operations_per_second)
+        self.metadata_operations.set_rate(metadata_operations_per_second)
+
+    def load_control_file(self):
+        """
+        Reads the rates from the control file, if it has changed since it was last read, and changes the rates it
+        contains (leaving the others as they are). A missing, unreadable, or invalid control file (e.g. one which is
+        not a JSON object, or which holds a rate that is not a positive number or null) leaves every rate as it is.
+
+        :return: True if the rates were changed, otherwise False
+        """
+
+        self.reload_requested = False
+        self.next_check = self.clock() + self.check_interval
+
+        try:
+            mtime = os.stat(self.control_path).st_mtime_ns
+            if mtime == self.control_mtime:
+                return False
+
+            with open(self.control_path, encoding="utf-8") as control_file:
+                rates = json.load(control_file)
+            self.control_mtime = mtime
+
+        except (OSError, ValueError) as e:
+            print("Unable to read the throttle control file: {}".format(e))
+            return False
+
+        # Validates every rate, before changing any of them.
+        try:
+            if not isinstance(rates, dict):
+                raise ValueError("Expected a JSON object, not: {}".format(type(rates).__name__))
+            rates = {name: validate_rate(rates[name]) for name in RATE_NAMES if name in rates}
+
+        except ValueError as e:
+            print("Invalid throttle control file: {}".format(e))
+            return False
+
+        buckets = {"bytes_per_second": self.bytes, "operations_per_second": self.operations,
+                   "metadata_operations_per_second": self.metadata_operations}
+        for name, rate in rates.items():
+            buckets[name].set_rate(rate)
+
+        print("Throttle rates changed: {}".format(rates))
+        return bool(rates)
+
+    def check_control_file(self):
+        """
+        Reloads the control file, if there is one, and it is due to be checked (or a reload has been requested).
+
+        :return:
+        """
+
+        if self.control_path is not None and (self.reload_requested or self.clock() >= self.next_check):
+            self.load_control_file()
+
+    def install_signal_handler(self, signal_number=None):
+        """
+        Installs a handler for the provided signal (SIGHUP, by default), on which the control file is reloaded before
+        the next operation. Must be called from the main thread.
+
+        :param signal_number:
+        :return:
+        """
+
+        import signal
+
+        def request_reload(signal_number, frame):
+            self.reload_requested = True
+
+        signal.signal(signal.SIGHUP if signal_number is None else signal_number, request_reload)
+
+    def read_bytes(self, amount):
+        self.check_control_file()
+        self.waited += self.bytes.acquire(amount)
+
+    def file_operation(self):
+        self.check_control_file()
+        self.waited += self.operations.acquire()
+
+    def metadata_operation(self):
+        self.check_control_file()
+        self.waited += self.metadata_operations.acquire()
+
+    def read_exif_data(self, file_path):
+        """
+        Reads the EXIF metadata from the provided file, charging the read to the throttle. For a JPEG, only the header
+        is read (as piexif would read it); any other file is left for piexif to read, and charged in full.
+
+        :param file_path: string
+        :return: bytes, or the file path, either of which piexif.load accepts
+        """
+
+        self.file_operation()
+
+        with open(file_path, "rb") as file:
+            header, exif = exif_segments.read_exif_header(ThrottledReader(file, self))
+
+            if exif is not None:
+                return exif
+
+            if header.startswith(exif_segments.SOI):
+                return header
+
+            self.read_bytes(os.fstat(file.fileno()).st_size - len(header))
+
+        return file_path
+
+
+def set_io_priority(niceness=None, io_class=None, io_level=4):
+    """
+    Lowers the priority of the current process, so that a sort yields the CPU (niceness, added to the current value, as
+    with os.nice) and the disks (io_class, one of the IOPRIO_CLASS_ constants, with a level from 0, highest, to 7,
+    lowest, within the realtime and best effort classes) to other processes. The I/O priority is only supported on
+    Linux, and only takes effect with I/O schedulers which honour it (e.g. BFQ).
+
+    :param niceness: int, or None to leave the CPU priority unchanged
+    :param io_class: int, or None to leave the I/O priority unchanged
+    :param io_level: int
+    :return: True if the requested priorities were set, otherwise False
+    """
+
+    success = True
+
+    if niceness is not None:
+        os.nice(niceness)
+
+    if io_class is not None:
+        syscall_number = IOPRIO_SET_SYSCALLS.get(platform.machine())
+        if not platform.system() == "Linux" or syscall_number is None:
+            return False
+
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        priority = (io_class << IOPRIO_CLASS_SHIFT) | (0 if io_class == IOPRIO_CLASS_IDLE else io_level)
+        if libc.syscall(syscall_number, IOPRIO_WHO_PROCESS, 0, priority) != 0:
+            print("Unable to set the I/O priority: {}".format(os.strerror(ctypes.get_errno())))
+            success = False
+
+    return success
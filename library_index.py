@@ -0,0 +1,250 @@
+import hashlib
+import os
+import sqlite3
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    destination_path TEXT PRIMARY KEY,
+    source_path TEXT NOT NULL,
+    capture_datetime TEXT NOT NULL,
+    capture_day TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_capture_datetime ON files (capture_datetime);
+CREATE INDEX IF NOT EXISTS files_capture_day ON files (capture_day);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+"""
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# The number of sorted files recorded in each transaction (see record_sorted_file), so that the index costs one journal
+# flush per batch of files, rather than one per file.
+COMMIT_BATCH_SIZE = 500
+
+
+class LibraryIndexConnection(sqlite3.Connection):
+    """
+    A connection to the library index, which counts the files recorded since the last commit, and commits them when it
+    is closed (rather than discarding them, as a plain connection would).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = 0
+
+    def commit(self):
+        super().commit()
+        self.pending = 0
+
+    def close(self):
+        try:
+            self.commit()
+        except sqlite3.Error:
+            pass
+        super().close()
+
+
+def open_library_index(index_path):
+    """
+    Opens (creating it, if necessary) the SQLite library index at the provided path, and assures that the schema and
+    its indexes exist.
+
+    :param index_path: string
+    :return: LibraryIndexConnection
+    """
+
+    connection = sqlite3.connect(index_path, factory=LibraryIndexConnection)
+    connection.executescript(SCHEMA)
+
+    return connection
+
+
+def normalize_index_datetime(datetime_string):
+    """
+    Converts an EXIF datetime string ('YYYY:MM:DD HH:MM:SS'), or a datetime, into the sortable form that is stored in
+    the index ('YYYY-MM-DD HH:MM:SS'). Dates without a time portion are given a time of midnight.
+
+    Example: ('2020:01:22 18:00:00')
+
+    '2020-01-22 18:00:00'
+
+    :param datetime_string: string or datetime.datetime
+    :return: string
+    """
+
+    if hasattr(datetime_string, "strftime"):
+        return datetime_string.strftime("%Y-%m-%d %H:%M:%S")
+
+    date_part, _, time_part = datetime_string.strip().partition(" ")
+    date_part = date_part.replace(":", "-")
+    time_part = time_part.strip() or "00:00:00"
+
+    return "{} {}".format(date_part, time_part)
+
+
+def compute_file_hash(file_path):
+    """
+    Computes the SHA-256 digest, of the contents of the provided file, reading it in fixed size chunks.
+
+    :param file_path: string
+    :return: string
+    """
+
+    digest = hashlib.sha256()
+
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def record_sorted_file(connection, source_path, destination_path, creation_date, sha256=None):
+    """
+    Records a file, that has been moved into the sorted library, in the index. Any existing entry for the same
+    destination path is replaced.
+
+    Unless its digest is provided, the file is read once more, in full, to hash it. The entries are committed in
+    batches of COMMIT_BATCH_SIZE files, and when the connection is closed (see LibraryIndexConnection), so a crash can
+    lose at most the last batch of entries (the files themselves are already in place). Connections which were not
+    opened with open_library_index commit every entry.
+
+    :param connection: sqlite3.Connection
+    :param source_path: string
+    :param destination_path: string
+    :param creation_date: string or datetime.datetime
+    :param sha256: optional SHA-256 hex digest of the file, if already known (e.g. from a verified transfer), so that
+                   the file need not be read again
+    :return:
+    """
+
+    capture_datetime = normalize_index_datetime(creation_date)
+    size = os.stat(destination_path).st_size
+    sha256 = sha256 or compute_file_hash(destination_path)
+
+    try:
+        connection.execute(
+            "INSERT OR REPLACE INTO files "
+            "(destination_path, source_path, capture_datetime, capture_day, size, sha256) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (destination_path, source_path, capture_datetime, capture_datetime[:10], size, sha256))
+
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+
+    if not isinstance(connection, LibraryIndexConnection):
+        connection.commit()
+        return
+
+    connection.pending += 1
+    if connection.pending >= COMMIT_BATCH_SIZE:
+        connection.commit()
+
+
+def find_files_between(connection, start, end):
+    """
+    Finds the indexed files which were captured between the provided start and end (inclusive). Each bound may be
+    either a date ('YYYY-MM-DD') or a datetime ('YYYY-MM-DD HH:MM:SS'); a date used as the end bound includes the whole
+    of that day.
+
+    Example: ('2020-01-15', '2020-01-16')
+
+    [('/library/2020/01 - January/15/IMG_0766.jpg', '2020-01-15 18:00:41', 2555907, '...'), ...]
+
+    :param connection: sqlite3.Connection
+    :param start: string
+    :param end: string
+    :return: list of (destination_path, capture_datetime, size, sha256) tuples, ordered by capture datetime
+    """
+
+    # Extends a date-only end bound, so that it covers every time within that day.
+    if len(end) == 10:
+        end = "{} 23:59:59".format(end)
+
+    cursor = connection.execute(
+        "SELECT destination_path, capture_datetime, size, sha256 FROM files "
+        "WHERE capture_datetime BETWEEN ? AND ? ORDER BY capture_datetime, destination_path",
+        (start, end))
+
+    return cursor.fetchall()
+
+
+def count_files_per_day(connection, start=None, end=None):
+    """
+    Counts the indexed files captured on each day, optionally limited to the days between the provided start and end
+    dates ('YYYY-MM-DD', inclusive).
+
+    Example: ('2020-01-01', '2020-01-31')
+
+    {'2020-01-15': 1, '2020-01-22': 8}
+
+    :param connection: sqlite3.Connection
+    :param start: string
+    :param end: string
+    :return: dictionary of day to file count
+    """
+
+    query = "SELECT capture_day, COUNT(*) FROM files"
+    conditions = []
+    parameters = []
+
+    if start:
+        conditions.append("capture_day >= ?")
+        parameters.append(start)
+
+    if end:
+        conditions.append("capture_day <= ?")
+        parameters.append(end)
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    query += " GROUP BY capture_day ORDER BY capture_day"
+
+    return dict(connection.execute(query, parameters).fetchall())
+
+
+def find_files_under(connection, folder_path):
+    """
+    Finds the indexed files beneath the provided folder (at any depth).
+
+    :param connection: sqlite3.Connection
+    :param folder_path: string
+    :return: dictionary of destination path to capture datetime ('YYYY-MM-DD HH:MM:SS')
+    """
+
+    prefix = os.path.join(folder_path, "")
+
+    # Matches every path starting with the prefix, as a range (so that the primary key's index is used, and no
+    # characters need escaping, as they would with LIKE).
+    cursor = connection.execute(
+        "SELECT destination_path, capture_datetime FROM files WHERE destination_path >= ? AND destination_path < ?",
+        (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+
+    return dict(cursor.fetchall())
+
+
+def move_indexed_files(connection, old_path, new_path):
+    """
+    Updates the index, after a sorted file, or a whole folder of them, has been moved within the library.
+
+    :param connection: sqlite3.Connection
+    :param old_path: string (a file, or a folder)
+    :param new_path: string
+    :return: number of entries updated
+    """
+
+    old_prefix, new_prefix = os.path.join(old_path, ""), os.path.join(new_path, "")
+
+    with connection:
+        count = connection.execute(
+            "UPDATE files SET destination_path = ? WHERE destination_path = ?", (new_path, old_path)).rowcount
+        count += connection.execute(
+            "UPDATE files SET destination_path = ? || substr(destination_path, ?) "
+            "WHERE destination_path >= ? AND destination_path < ?",
+            (new_prefix, len(old_prefix) + 1, old_prefix, old_prefix[:-1] + chr(ord(old_prefix[-1]) + 1))).rowcount
+
+    return count
@@ -0,0 +1,433 @@
+import collections
+import re
+import struct
+
+import exif_segments
+
+
+SOF_BASELINE = 0xC0
+SOF_EXTENDED = 0xC1
+DHT = 0xC4
+DQT = 0xDB
+DRI = 0xDD
+
+# The largest Hamming distance (out of 64 bits) at which two thumbnails are considered near-duplicates. Re-encoded
+# and resized copies of a photo typically differ by a few bits, while unrelated photos differ by around 32.
+DEFAULT_MAX_DISTANCE = 6
+
+# The size of the grid from which the difference hash is computed (one column wider than the 8 bits of each row, as
+# each bit compares two neighbouring columns).
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+# Matches the end of the entropy coded data, in a scan: any marker other than a stuffed zero, or a restart marker.
+SCAN_END = re.compile(b"\xff(?![\x00\xd0-\xd7])")
+RESTART_MARKER = re.compile(b"\xff[\xd0-\xd7]")
+
+# The largest thumbnail (in either dimension) which is decoded: far larger than any EXIF thumbnail (which has to fit
+# within the 64 KB EXIF segment), while bounding the memory a corrupt frame header can claim.
+MAX_THUMBNAIL_DIMENSION = 2048
+
+# The Huffman tables most recently used (see get_huffman_table), least recently used first, and how many are kept:
+# enough for the few tables most cameras write into every thumbnail, while bounding the memory used by encoders which
+# write optimized tables, different for each image.
+HUFFMAN_TABLES = collections.OrderedDict()
+HUFFMAN_TABLE_CACHE_SIZE = 16
+
+
+class HuffmanTable:
+    """
+    A JPEG Huffman table, decoded with a single lookup of the next 16 bits (which any code, at most 16 bits long, is a
+    prefix of).
+
+    As an AC table is only used to skip coefficients, ac_lookup gives, for the same 16 bits, the total number of bits
+    to skip (the code, and the coefficient bits which follow it) and how many coefficients that covers (0 for an
+    invalid code, and 64 for the end of the block), so that each coefficient is skipped with a single lookup.
+    """
+
+    def __init__(self, counts, values):
+        self.lookup = [(16, None)] * (1 << 16)
+        self.ac_lookup = [(16, 0)] * (1 << 16)
+
+        code = position = 0
+        for length in range(1, 17):
+            for value in values[position:position + counts[length - 1]]:
+                start = code << (16 - length)
+                span = 1 << (16 - length)
+                run, size = value >> 4, value & 0x0F
+                self.lookup[start:start + span] = [(length, value)] * span
+                coefficients = run + 1 if size else 16 if run == 15 else 64
+                self.ac_lookup[start:start + span] = [(length + size, coefficients)] * span
+                code += 1
+            position += counts[length - 1]
+            code <<= 1
+
+
+def get_huffman_table(counts, values):
+    """
+    Gets the Huffman table with the provided code counts and values, building it only if it is not among the most
+    recently used (as most cameras write the same tables into every thumbnail).
+
+    :param counts: bytes
+    :param values: bytes
+    :return: HuffmanTable
+    """
+
+    key = (bytes(counts), bytes(values))
+    table = HUFFMAN_TABLES.get(key)
+
+    if table is None:
+        table = HUFFMAN_TABLES[key] = HuffmanTable(counts, values)
+        if len(HUFFMAN_TABLES) > HUFFMAN_TABLE_CACHE_SIZE:
+            HUFFMAN_TABLES.popitem(last=False)
+    else:
+        HUFFMAN_TABLES.move_to_end(key)
+
+    return table
+
+
+class BitReader:
+    """
+    Reads the bits of a run of entropy coded data (with its stuffed zero bytes already removed). Past the end of the
+    data, ones are read, as a decoder would read the fill bits of a following marker.
+
+    The data is unpacked into 32 bit words up front, and the bits not yet read are held in an integer buffer (the count
+    lowest bits of buffer), refilled a word at a time, so that it always holds enough bits for the longest step (a 16
+    bit code, and the up to 15 bits which follow it).
+    """
+
+    def __init__(self, data):
+        data += b"\xff" * (-len(data) % 4)
+        self.words = struct.unpack(">{}L".format(len(data) // 4), data)
+        self.index = 0
+        self.buffer = 0
+        self.count = 0
+
+    def decode_block(self, dc_table, ac_table):
+        """
+        Decodes the DC coefficient difference of the next block, and skips its AC coefficients.
+
+        :param dc_table: HuffmanTable
+        :param ac_table: HuffmanTable
+        :return: int
+        """
+
+        words, index, buffer, count = self.words, self.index, self.buffer, self.count
+        if count < 32:
+            buffer = ((buffer & ((1 << count) - 1)) << 32) | (words[index] if index < len(words) else 0xFFFFFFFF)
+            index += 1
+            count += 32
+
+        length, size = dc_table.lookup[(buffer >> (count - 16)) & 0xFFFF]
+        if size is None or size > 16:
+            raise ValueError("Invalid Huffman code")
+        count -= length
+
+        difference = 0
+        if size:
+            bits = (buffer >> (count - size)) & ((1 << size) - 1)
+            count -= size
+            difference = bits if bits >> (size - 1) else bits - (1 << size) + 1
+
+        ac_lookup = ac_table.ac_lookup
+        coefficient = 1
+        while coefficient < 64:
+            if count < 32:
+                buffer = ((buffer & ((1 << count) - 1)) << 32) | (words[index] if index < len(words) else 0xFFFFFFFF)
+                index += 1
+                count += 32
+            skipped, coefficients = ac_lookup[(buffer >> (count - 16)) & 0xFFFF]
+            if not coefficients:
+                raise ValueError("Invalid Huffman code")
+            count -= skipped
+            coefficient += coefficients
+
+        self.index, self.buffer, self.count = index, buffer, count
+
+        return difference
+
+
+def decode_dc_luma(jpeg):
+    """
+    Decodes the DC coefficient of each luma block, of the provided baseline JPEG (e.g. an EXIF thumbnail), giving the
+    image at one eighth of its size, without decoding the rest of the image (the AC coefficients are skipped, and no
+    inverse DCT is needed). Progressive JPEGs are not supported.
+
+    :param jpeg: bytes
+    :return: list of rows, of the average brightness (0 to 255) of each 8x8 block of the image
+    """
+
+    quantization_tables = {}
+    huffman_tables = {}
+    frame = None
+    restart_interval = 0
+
+    position = 2
+    if jpeg[:2] != exif_segments.SOI:
+        raise ValueError("Not a JPEG image")
+
+    while True:
+        if jpeg[position] != 0xFF:
+            raise ValueError("Invalid JPEG marker")
+
+        marker, length = struct.unpack_from(">xBH", jpeg, position)
+        segment = jpeg[position + 4:position + 2 + length]
+        position += 2 + length
+
+        if marker == DQT:
+            offset = 0
+            while offset < len(segment):
+                precision, table_id = segment[offset] >> 4, segment[offset] & 0x0F
+                quantization_tables[table_id] = struct.unpack_from(">H" if precision else "B", segment, offset + 1)[0]
+                offset += 1 + 64 * (2 if precision else 1)
+
+        elif marker == DHT:
+            offset = 0
+            while offset < len(segment):
+                table_class, table_id = segment[offset] >> 4, segment[offset] & 0x0F
+                counts = segment[offset + 1:offset + 17]
+                values = segment[offset + 17:offset + 17 + sum(counts)]
+                huffman_tables[table_class, table_id] = get_huffman_table(counts, values)
+                offset += 17 + sum(counts)
+
+        elif marker == DRI:
+            restart_interval = struct.unpack(">H", segment[:2])[0]
+
+        elif marker in (SOF_BASELINE, SOF_EXTENDED):
+            height, width, component_count = struct.unpack_from(">xHHB", segment)
+            frame = (height, width, [(segment[6 + 3 * index], segment[7 + 3 * index] >> 4,
+                                      segment[7 + 3 * index] & 0x0F, segment[8 + 3 * index])
+                                     for index in range(component_count)])
+
+        elif 0xC2 <= marker <= 0xCF and marker not in (DHT, 0xC8, 0xCC):
+            raise ValueError("Unsupported JPEG encoding")
+
+        elif marker == exif_segments.SOS:
+            break
+
+    if frame is None:
+        raise ValueError("No frame header")
+
+    # Rejects frames which cannot be decoded, before any memory is allocated for them.
+    height, width, components = frame
+    if not (0 < width <= MAX_THUMBNAIL_DIMENSION and 0 < height <= MAX_THUMBNAIL_DIMENSION):
+        raise ValueError("Unsupported frame size: {}x{}".format(width, height))
+    if not components or not all(1 <= component[1] <= 4 and 1 <= component[2] <= 4 for component in components):
+        raise ValueError("Unsupported sampling factors")
+
+    max_horizontal = max(component[1] for component in components)
+    max_vertical = max(component[2] for component in components)
+
+    # The components of the scan, in order, with their tables, and their number of blocks in each MCU.
+    scan = []
+    for index in range(segment[0]):
+        component_id, tables = segment[1 + 2 * index], segment[2 + 2 * index]
+        _, horizontal, vertical, _ = next(component for component in components if component[0] == component_id)
+        scan.append((component_id, huffman_tables[0, tables >> 4], huffman_tables[1, tables & 0x0F], horizontal,
+                     vertical))
+
+    luma_id = components[0][0]
+    if len(scan) == 1:
+        if len(components) != 1:
+            raise ValueError("Unsupported non-interleaved JPEG")
+        scan = [scan[0][:3] + (1, 1)]
+        max_horizontal = max_vertical = 1
+
+    mcu_columns = -(-width // (8 * max_horizontal))
+    mcu_rows = -(-height // (8 * max_vertical))
+    luma_horizontal, luma_vertical = scan[0][3], scan[0][4]
+    quantization = quantization_tables[components[0][3]]
+    blocks = [[0] * (mcu_columns * luma_horizontal) for _ in range(mcu_rows * luma_vertical)]
+
+    # Splits the entropy coded data at its restart markers, each part of which starts afresh.
+    end = SCAN_END.search(jpeg, position)
+    data = jpeg[position:end.start() if end else len(jpeg)]
+    intervals = [part.replace(b"\xff\x00", b"\xff") for part in RESTART_MARKER.split(data)]
+    mcus_per_interval = restart_interval or mcu_columns * mcu_rows
+
+    mcu = 0
+    for interval in intervals:
+        reader = BitReader(interval)
+        predictions = {component[0]: 0 for component in scan}
+
+        for _ in range(mcus_per_interval):
+            if mcu >= mcu_columns * mcu_rows:
+                break
+            mcu_row, mcu_column = divmod(mcu, mcu_columns)
+
+            for component_id, dc_table, ac_table, horizontal, vertical in scan:
+                for block_row in range(vertical):
+                    for block_column in range(horizontal):
+                        predictions[component_id] += reader.decode_block(dc_table, ac_table)
+                        if component_id == luma_id:
+                            blocks[mcu_row * vertical + block_row][mcu_column * horizontal + block_column] = \
+                                predictions[component_id]
+
+            mcu += 1
+
+    # Crops the padding blocks, and converts each DC coefficient to the average brightness of its block.
+    columns = -(-width * luma_horizontal // (8 * max_horizontal))
+    rows = -(-height * luma_vertical // (8 * max_vertical))
+
+    return [[min(255.0, max(0.0, value * quantization / 8.0 + 128)) for value in row[:columns]]
+            for row in blocks[:rows]]
+
+
+def resize(image, width, height):
+    """
+    Resizes the provided image (a list of rows of brightness values), by averaging the area of the original image
+    covered by each pixel of the new one.
+
+    :param image: list of rows
+    :param width: int
+    :param height: int
+    :return: list of rows
+    """
+
+    source_height, source_width = len(image), len(image[0])
+
+    def spans(source_size, size):
+        # The (source pixel, weight) pairs covered by each new pixel.
+        scale = source_size / size
+        result = []
+        for index in range(size):
+            start, end = index * scale, (index + 1) * scale
+            result.append([(pixel, min(end, pixel + 1) - max(start, pixel))
+                           for pixel in range(int(start), min(source_size, int(-(-end // 1))))
+                           if min(end, pixel + 1) > max(start, pixel)])
+        return result
+
+    row_spans, column_spans = spans(source_height, height), spans(source_width, width)
+
+    return [[sum(image[row][column] * row_weight * column_weight
+                 for row, row_weight in row_span for column, column_weight in column_span) /
+             sum(row_weight * column_weight for _, row_weight in row_span for _, column_weight in column_span)
+             for column_span in column_spans] for row_span in row_spans]
+
+
+def compute_thumbnail_hash(thumbnail):
+    """
+    Computes a 64 bit perceptual hash (a difference hash) of the provided JPEG thumbnail: the image is reduced to 9x8
+    (from its DC coefficients; see decode_dc_luma), and each bit records whether a pixel is brighter than its right
+    hand neighbour. As it only depends on the coarse structure of the image, the hash survives resizing and
+    re-encoding.
+
+    :param thumbnail: bytes (e.g. the 'thumbnail' of piexif.load)
+    :return: int
+    """
+
+    image = resize(decode_dc_luma(thumbnail), HASH_WIDTH, HASH_HEIGHT)
+
+    value = 0
+    for row in image:
+        for left, right in zip(row, row[1:]):
+            value = (value << 1) | (left > right)
+
+    return value
+
+
+def hamming_distance(first, second):
+    return bin(first ^ second).count("1")
+
+
+class BKTree:
+    """
+    A BK-tree of hashes, which finds every hash within a given Hamming distance of a query, while visiting only a small
+    part of the tree (by the triangle inequality, only the children whose distance from their parent is within
+    max_distance of the query's distance from the parent can hold a match).
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, value, item):
+        """
+        Adds the provided hash to the tree, along with an item (e.g. the file's path).
+
+        :param value: int
+        :param item:
+        :return:
+        """
+
+        self.size += 1
+        if self.root is None:
+            self.root = (value, [item], {})
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            if distance not in node[2]:
+                node[2][distance] = (value, [item], {})
+                return
+            node = node[2][distance]
+
+    def search(self, value, max_distance):
+        """
+        Finds the items whose hashes are within the provided distance of the provided hash.
+
+        :param value: int
+        :param max_distance: int
+        :return: list of (distance, item) tuples, nearest first
+        """
+
+        matches = []
+        nodes = [self.root] if self.root is not None else []
+
+        while nodes:
+            node_value, items, children = nodes.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance:
+                matches.extend((distance, item) for item in items)
+            nodes.extend(child for child_distance, child in children.items()
+                         if distance - max_distance <= child_distance <= distance + max_distance)
+
+        return sorted(matches, key=lambda match: match[0])
+
+
+class NearDuplicateDetector:
+    """
+    Flags near-duplicate photos (e.g. resized or re-encoded copies) as they are sorted, by comparing the perceptual
+    hashes of their embedded EXIF thumbnails, which cost almost nothing to decode, rather than decoding the full images.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.tree = BKTree()
+        self.unhashed = 0
+
+    def check(self, file_path, thumbnail, results):
+        """
+        Compares the provided thumbnail with those of the files checked so far, recording any near-duplicates in the
+        results (under 'near_duplicates', as a list of the earlier files' paths, nearest first), and then adds it to
+        those checked. Files without a thumbnail, or with one which cannot be decoded (for any reason, so that one
+        malformed thumbnail cannot abort the sort), are not checked, and are counted in unhashed.
+
+        :param file_path: string
+        :param thumbnail: bytes, or None
+        :param results: results dictionary, of the sort in progress
+        :return: list of the near-duplicates' paths
+        """
+
+        try:
+            value = compute_thumbnail_hash(thumbnail) if thumbnail else None
+
+        except Exception as e:
+            print("\tUnable to hash thumbnail: {}".format(e))
+            value = None
+
+        if value is None:
+            self.unhashed += 1
+            return []
+
+        duplicates = [item for _, item in self.tree.search(value, self.max_distance)]
+        if duplicates:
+            results.setdefault('near_duplicates', {})[file_path] = duplicates
+            print("\tNear-duplicate of: {}".format(", ".join(duplicates)))
+
+        self.tree.add(value, file_path)
+        return duplicates
@@ -0,0 +1,386 @@
+import array
+import math
+import os
+import struct
+import sys
+
+import sort_image_files
+
+
+# The header of a cached place index: a magic number and version, the number of places, and the size and
+# modification time of the gazetteer it was built from (so that a stale cache is rebuilt).
+CACHE_MAGIC = b"PLKD"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct("<4sHIQQ")
+
+EARTH_RADIUS_KM = 6371.0
+
+# Photos further than this from the nearest place are sorted into UNKNOWN_PLACE, rather than a misleading city.
+DEFAULT_MAX_DISTANCE_KM = 100.0
+UNKNOWN_PLACE = ("Unknown", "Unknown")
+
+# The columns of a GeoNames gazetteer (e.g. cities15000.txt), which is tab separated.
+GEONAMES_NAME = 1
+GEONAMES_LATITUDE = 4
+GEONAMES_LONGITUDE = 5
+GEONAMES_COUNTRY_CODE = 8
+
+
+def to_unit_vector(latitude, longitude):
+    """
+    Converts a position (in degrees) into a point on the unit sphere, so that the straight line distance between two
+    points orders them in the same way as the distance along the earth's surface (without any special handling of the
+    poles or the antimeridian).
+
+    :param latitude: float
+    :param longitude: float
+    :return: (x, y, z) tuple
+    """
+
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+
+    return (math.cos(latitude) * math.cos(longitude), math.cos(latitude) * math.sin(longitude), math.sin(latitude))
+
+
+def chord_to_km(chord):
+    """
+    Converts a straight line distance between two points on the unit sphere into a distance along the earth's surface.
+
+    :param chord: float
+    :return: float
+    """
+
+    return 2 * math.asin(min(1.0, chord / 2)) * EARTH_RADIUS_KM
+
+
+def read_gazetteer(gazetteer_path):
+    """
+    Reads the places from a GeoNames gazetteer file (e.g. cities15000.txt, from https://download.geonames.org/export/
+    dump/), skipping any malformed lines.
+
+    :param gazetteer_path: string
+    :return: list of (latitude, longitude, country_code, name) tuples
+    """
+
+    places = []
+
+    with open(gazetteer_path, encoding="utf-8") as gazetteer_file:
+        for line in gazetteer_file:
+            columns = line.rstrip("\n").split("\t")
+            try:
+                places.append((float(columns[GEONAMES_LATITUDE]), float(columns[GEONAMES_LONGITUDE]),
+                               columns[GEONAMES_COUNTRY_CODE], columns[GEONAMES_NAME]))
+            except (IndexError, ValueError):
+                continue
+
+    return places
+
+
+class PlaceIndex:
+    """
+    An in-memory k-d tree of places, for finding the nearest place to a position. The tree is implicit: the places are
+    ordered so that the median of each range (on the axis for its depth) is the node splitting that range, and the
+    points are held in a flat array, so that the tree can be written to (and read from) disk as it is.
+    """
+
+    def __init__(self, points, names):
+        self.points = points
+        self.names = names
+
+    @classmethod
+    def build(cls, places):
+        """
+        Builds the tree from the provided places.
+
+        :param places: list of (latitude, longitude, country_code, name) tuples
+        :return: PlaceIndex
+        """
+
+        entries = [to_unit_vector(latitude, longitude) + ((country_code, name),)
+                   for latitude, longitude, country_code, name in places]
+
+        ranges = [(0, len(entries), 0)]
+        while ranges:
+            start, end, axis = ranges.pop()
+            if end - start < 2:
+                continue
+            entries[start:end] = sorted(entries[start:end], key=lambda entry: entry[axis])
+            middle = (start + end) // 2
+            ranges.append((start, middle, (axis + 1) % 3))
+            ranges.append((middle + 1, end, (axis + 1) % 3))
+
+        points = array.array("f")
+        for x, y, z, _ in entries:
+            points.extend((x, y, z))
+
+        return cls(points, [entry[3] for entry in entries])
+
+    def nearest(self, latitude, longitude):
+        """
+        Finds the place nearest to the provided position.
+
+        :param latitude: float (degrees)
+        :param longitude: float (degrees)
+        :return: ((country_code, name), distance in km) tuple, or (None, None) if the index is empty
+        """
+
+        query = to_unit_vector(latitude, longitude)
+        points = self.points
+        best = [float("inf"), -1]
+
+        def search(start, end, axis):
+            if start >= end:
+                return
+
+            middle = (start + end) // 2
+            offset = 3 * middle
+            distance = ((points[offset] - query[0]) ** 2 + (points[offset + 1] - query[1]) ** 2 +
+                        (points[offset + 2] - query[2]) ** 2)
+            if distance < best[0]:
+                best[0], best[1] = distance, middle
+
+            difference = query[axis] - points[offset + axis]
+            near, far = ((start, middle), (middle + 1, end)) if difference < 0 else ((middle + 1, end), (start, middle))
+            search(near[0], near[1], (axis + 1) % 3)
+            if difference * difference < best[0]:
+                search(far[0], far[1], (axis + 1) % 3)
+
+        search(0, len(self.names), 0)
+
+        if best[1] < 0:
+            return None, None
+
+        return self.names[best[1]], chord_to_km(math.sqrt(best[0]))
+
+    def save(self, cache_path, gazetteer_size=0, gazetteer_mtime=0):
+        """
+        Writes the tree to disk, in a compact binary form: the header, the points (as little endian 32 bit floats), and
+        then the names, one 'country_code<TAB>name' line per place.
+
+        :param cache_path: string
+        :param gazetteer_size: int
+        :param gazetteer_mtime: int (nanoseconds)
+        :return:
+        """
+
+        points = array.array("f", self.points)
+        if sys.byteorder != "little":
+            points.byteswap()
+
+        names = "\n".join("{}\t{}".format(country_code, name) for country_code, name in self.names).encode("utf-8")
+
+        temporary_path = cache_path + ".tmp"
+        with open(temporary_path, "wb") as cache_file:
+            cache_file.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(self.names), gazetteer_size,
+                                               gazetteer_mtime))
+            cache_file.write(points.tobytes())
+            cache_file.write(names)
+        os.replace(temporary_path, cache_path)
+
+    @classmethod
+    def load(cls, cache_path, gazetteer_size=None, gazetteer_mtime=None):
+        """
+        Reads a tree written by save.
+
+        :param cache_path: string
+        :param gazetteer_size: optional int, which must match the one the cache was built from
+        :param gazetteer_mtime: optional int, which must match the one the cache was built from
+        :return: PlaceIndex, or None if the cache is missing, invalid, or stale
+        """
+
+        try:
+            with open(cache_path, "rb") as cache_file:
+                data = cache_file.read()
+        except OSError:
+            return None
+
+        if len(data) < CACHE_HEADER.size:
+            return None
+
+        magic, version, count, size, mtime = CACHE_HEADER.unpack_from(data)
+        if (magic, version) != (CACHE_MAGIC, CACHE_VERSION) or (gazetteer_size is not None and size != gazetteer_size) \
+                or (gazetteer_mtime is not None and mtime != gazetteer_mtime):
+            return None
+
+        points = array.array("f")
+        points_end = CACHE_HEADER.size + 3 * count * points.itemsize
+        if len(data) < points_end:
+            return None
+        points.frombytes(data[CACHE_HEADER.size:points_end])
+        if sys.byteorder != "little":
+            points.byteswap()
+
+        names = [tuple(line.split("\t", 1)) for line in data[points_end:].decode("utf-8").split("\n")] if count else []
+        if len(names) != count:
+            return None
+
+        return cls(points, names)
+
+
+def load_place_index(gazetteer_path, cache_path=None):
+    """
+    Loads the place index for the provided gazetteer, from its cache (by default, alongside the gazetteer, with a
+    '.kdtree' extension), or builds it (and writes the cache), if the cache is missing or older than the gazetteer.
+
+    :param gazetteer_path: string
+    :param cache_path: optional string
+    :return: PlaceIndex
+    """
+
+    cache_path = cache_path or gazetteer_path + ".kdtree"
+    status = os.stat(gazetteer_path)
+
+    place_index = PlaceIndex.load(cache_path, status.st_size, status.st_mtime_ns)
+    if place_index is None:
+        print("Building place index: {}".format(cache_path))
+        place_index = PlaceIndex.build(read_gazetteer(gazetteer_path))
+
+        try:
+            place_index.save(cache_path, status.st_size, status.st_mtime_ns)
+        except OSError as e:
+            print("Unable to write the place index cache: {}".format(e))
+
+    return place_index
+
+
+def read_gps_position(exif_dict):
+    """
+    Reads the position, from the GPS IFD of the provided EXIF metadata (as loaded by piexif.load).
+
+    :param exif_dict: dictionary of EXIF metadata
+    :return: (latitude, longitude) tuple, in degrees, or None if there is no (valid) position
+    """
+
+    import piexif
+
+    gps = exif_dict.get("GPS") or {}
+
+    def degrees(value, reference, negative_reference):
+        (degrees_numerator, degrees_denominator), (minutes_numerator, minutes_denominator), \
+            (seconds_numerator, seconds_denominator) = value
+        result = (degrees_numerator / degrees_denominator + minutes_numerator / minutes_denominator / 60 +
+                  seconds_numerator / seconds_denominator / 3600)
+        return -result if reference.upper().startswith(negative_reference) else result
+
+    try:
+        latitude = degrees(gps[piexif.GPSIFD.GPSLatitude], gps.get(piexif.GPSIFD.GPSLatitudeRef, b"N"), b"S")
+        longitude = degrees(gps[piexif.GPSIFD.GPSLongitude], gps.get(piexif.GPSIFD.GPSLongitudeRef, b"E"), b"W")
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return None
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+
+    return latitude, longitude
+
+
+def compute_location_path_components(place):
+    """
+    Computes the folder components for a place: its country code, and then its name (with any path separators
+    replaced).
+
+    Example: (('FR', 'Paris'))
+
+    ['FR', 'Paris']
+
+    :param place: (country_code, name) tuple
+    :return: list of folder components
+    """
+
+    return [component.replace(os.sep, "-").replace("/", "-").strip() or UNKNOWN_PLACE[0] for component in place]
+
+
+def sort_by_location(file_list, destination_base_path, place_index=None, max_distance_km=DEFAULT_MAX_DISTANCE_KM,
+                     index=None, target_timezone=None, retry_policy=None, throttle=None, durability=None,
+                     transfer=None):
+    """
+    Iterate through the provided list of files, and sort them by where they were taken, into the following folder
+    structure:
+
+    destination_base_path/CC/City
+
+    CC - the country code of the nearest place (in the gazetteer)
+    City - the name of the nearest place
+
+    Example: (a photo taken near the Eiffel Tower)
+
+    /destination_base_path/FR/Paris
+
+    Positions are read from the GPS IFD of each file's EXIF metadata, and looked up in the place index (see
+    load_place_index, which is built once, and cached on disk), without any network access. Files without a position
+    fail to sort, and files taken further than max_distance_km from any place are sorted into 'Unknown/Unknown'.
+
+    To be used with sort_files, the place index must be bound first (e.g. with functools.partial).
+
+    :param file_list:
+    :param destination_base_path:
+    :param place_index: PlaceIndex
+    :param max_distance_km: float
+    :param index: optional library index connection, in which each sorted file that also has a capture date is
+                  recorded
+    :param target_timezone: optional timezone (see sort_hierarchical_by_date)
+    :param retry_policy: optional retry_policy.RetryPolicy
+    :param throttle: optional io_throttle.IoThrottle
+    :param durability: optional group_commit.GroupCommit
+    :param transfer: optional verified_transfer.VerifiedTransfer
+    :return: dictionary of the successfully sorted files, and of the failures
+    """
+
+    import piexif
+    from retry_policy import MISSING_METADATA, SortFailure, describe_read_failure
+
+    if place_index is None:
+        raise ValueError("A place index is needed, to sort by location")
+
+    results = {"success": [], "failure": {}}
+
+    # Sets the destination path to the current working directory, if one hasn't be specified.
+    if not destination_base_path:
+        destination_base_path = os.getcwd()
+        print("No destination path specified. Using current directory as default.")
+
+    def read(file_path):
+        exif_dict = piexif.load(file_path if throttle is None else throttle.read_exif_data(file_path))
+        try:
+            capture_datetime = sort_image_files.get_capture_datetime_from_exif(exif_dict, target_timezone)
+        except Exception:
+            capture_datetime = None
+        return read_gps_position(exif_dict), capture_datetime
+
+    try:
+        for file_path in file_list:
+            print("Inspecting file: {}".format(file_path))
+
+            # Flushes the moves made so far, if they have been waiting too long, before a read which may stall.
+            if durability is not None:
+                durability.commit_if_due()
+
+            # Attempts to extract the position from the EXIF metadata.
+            try:
+                position, capture_datetime = sort_image_files.run_file_operation(retry_policy, file_path, read,
+                                                                                 file_path)
+                result = None if position else SortFailure("Unable to extract position from EXIF metadata.",
+                                                           MISSING_METADATA)
+
+            except Exception as e:
+                result = describe_read_failure(e)
+
+            if result is not None:
+                results['failure'][file_path] = result
+                print("\t{}".format(result))
+                continue
+
+            place, distance = place_index.nearest(*position)
+            if place is None or distance > max_distance_km:
+                place = UNKNOWN_PLACE
+
+            sort_image_files.move_file_to_folder(file_path, destination_base_path,
+                                                 compute_location_path_components(place), capture_datetime, results,
+                                                 index if capture_datetime is not None else None, retry_policy,
+                                                 throttle, durability, transfer)
+
+    finally:
+        if durability is not None:
+            durability.commit()
+
+    return results
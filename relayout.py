@@ -0,0 +1,277 @@
+import datetime
+import os
+import re
+import sys
+
+import sort_image_files
+
+
+# Matches the folders of the hierarchical folder structure (see sort_hierarchical_by_date), as well as those of the
+# other layouts: the day of an event folder ('DD - event N'), the hour of a split day folder ('HHh'), and the day
+# folder of the ISO date layout ('YYYY-MM-DD').
+YEAR_FOLDER = re.compile(r"^(\d{4})$")
+MONTH_FOLDER = re.compile(r"^(\d{2})(?: - .*)?$")
+DAY_FOLDER = re.compile(r"^(\d{2})(?: - .*)?$")
+HOUR_FOLDER = re.compile(r"^(\d{2})h$")
+ISO_DATE_FOLDER = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+
+
+def date_layout(capture_datetime, filename):
+    """
+    The layout of sort_hierarchical_by_date: 'YYYY/MM - Month/DD'.
+
+    :param capture_datetime: datetime.datetime
+    :param filename: string
+    :return: list of folder components
+    """
+
+    return sort_image_files.compute_date_path_components(capture_datetime)
+
+
+def month_layout(capture_datetime, filename):
+    """
+    A layout with a folder per month, rather than per day: 'YYYY/MM - Month'.
+
+    :param capture_datetime: datetime.datetime
+    :param filename: string
+    :return: list of folder components
+    """
+
+    return sort_image_files.compute_date_path_components(capture_datetime)[:2]
+
+
+def iso_date_layout(capture_datetime, filename):
+    """
+    A layout with a folder per day, named by its ISO date, within each year: 'YYYY/YYYY-MM-DD'.
+
+    :param capture_datetime: datetime.datetime
+    :param filename: string
+    :return: list of folder components
+    """
+
+    return ["{:04d}".format(capture_datetime.year), capture_datetime.strftime("%Y-%m-%d")]
+
+
+LAYOUTS = {"date": date_layout, "month": month_layout, "iso-date": iso_date_layout}
+
+
+def parse_folder_date(folder_components):
+    """
+    Determines the date of the files in a folder, from the folder's path within the library (in any of the layouts
+    written by the sorting schemes, or by this module): the year, month, and day folders (or the year, and ISO date
+    folders), and the hour, if the day folder has been split by hour (see folder_fanout).
+
+    Example: (['2020', '01 - January', '22', '18h'])
+
+    datetime.datetime(2020, 1, 22, 18, 0)
+
+    Example: (['2020', '2020-01-22'])
+
+    datetime.datetime(2020, 1, 22, 0, 0)
+
+    :param folder_components: list of folder names, relative to the library
+    :return: datetime.datetime, or None if the folder's path does not hold a date
+    """
+
+    iso_date = ISO_DATE_FOLDER.match(folder_components[1]) if len(folder_components) > 1 else None
+
+    if iso_date and iso_date.group(1) == folder_components[0]:
+        year, month, day = (int(group) for group in iso_date.groups())
+        hour_position = 2
+
+    elif len(folder_components) >= 3:
+        year, month, day = (pattern.match(component) for pattern, component in
+                            zip((YEAR_FOLDER, MONTH_FOLDER, DAY_FOLDER), folder_components))
+        if not (year and month and day):
+            return None
+
+        year, month, day = int(year.group(1)), int(month.group(1)), int(day.group(1))
+        hour_position = 3
+
+    else:
+        return None
+
+    if not sort_image_files.is_date_valid(year, month, day):
+        return None
+
+    hour = HOUR_FOLDER.match(folder_components[hour_position]) if len(folder_components) > hour_position else None
+    hour = int(hour.group(1)) if hour and int(hour.group(1)) < 24 else 0
+
+    return datetime.datetime(year, month, day, hour)
+
+
+def plan_relayout(library_path, layout, index=None):
+    """
+    Plans the moves which take the library from its current layout to the provided one, working only from what is
+    already known of each file's date, without opening any of the files: the date of each file is taken from the
+    library index, if one is provided, and the file is in it, and otherwise from the folder it is in (see
+    parse_folder_date; a layout which depends on the time of day needs the index). Files whose date is not known are
+    left where they are, and listed as unknown.
+
+    Only files whose folder changes are moved. Where every file in a folder moves to the same new folder, which does
+    not yet exist (and the folder has no subfolders), the whole folder is renamed instead, in a single operation.
+
+    :param library_path: string
+    :param layout: function, of a file's capture datetime and name, to its list of folder components
+    :param index: optional library index connection
+    :return: (folder_renames, file_moves, unchanged, unknown) tuple, where folder_renames is a list of (old_folder,
+             new_folder, file_names) tuples, file_moves a list of (old_path, new_path) tuples, unchanged is the number
+             of files already in place, and unknown is a list of the paths of the files whose date is not known
+    """
+
+    indexed_dates = {}
+    if index is not None:
+        import library_index
+
+        indexed_dates = library_index.find_files_under(index, library_path)
+
+    folder_renames = []
+    file_moves = []
+    unchanged = 0
+    unknown = []
+    claimed_folders = set()
+
+    for folder_path, folder_names, file_names in os.walk(library_path):
+        relative_path = os.path.relpath(folder_path, library_path)
+        folder_date = parse_folder_date([] if relative_path == os.curdir else relative_path.split(os.sep))
+
+        # Computes the new folder of each file, whose date is known.
+        targets = {}
+        for file_name in sorted(file_names):
+            file_path = os.path.join(folder_path, file_name)
+            indexed_date = indexed_dates.get(file_path)
+            capture_datetime = datetime.datetime.fromisoformat(indexed_date) if indexed_date else folder_date
+            if capture_datetime is not None:
+                targets[file_name] = os.path.join(library_path, *layout(capture_datetime, file_name))
+            else:
+                unknown.append(file_path)
+
+        unchanged += sum(1 for target in targets.values() if target == folder_path)
+        moving = {file_name: target for file_name, target in targets.items() if target != folder_path}
+        if not moving:
+            continue
+
+        # Renames the whole folder, if every file in it moves to the same new folder, and nothing else would be
+        # caught up in the rename.
+        new_folders = set(moving.values())
+        new_folder = new_folders.pop() if len(new_folders) == 1 else None
+        if (new_folder is not None and len(moving) == len(file_names) and not folder_names and
+                new_folder not in claimed_folders and not os.path.lexists(new_folder) and
+                not new_folder.startswith(os.path.join(folder_path, "")) and
+                not folder_path.startswith(os.path.join(new_folder, ""))):
+            folder_renames.append((folder_path, new_folder, sorted(moving)))
+            claimed_folders.add(new_folder)
+            continue
+
+        file_moves.extend((os.path.join(folder_path, file_name), os.path.join(target, file_name))
+                          for file_name, target in sorted(moving.items()))
+        claimed_folders.update(moving.values())
+
+    return folder_renames, file_moves, unchanged, unknown
+
+
+def remove_empty_folders(folder_path, library_path):
+    """
+    Removes the provided folder, and then each of its parents, for as long as they are empty, stopping at the library
+    folder.
+
+    :param folder_path: string
+    :param library_path: string
+    :return:
+    """
+
+    library_path = os.path.abspath(library_path)
+    folder_path = os.path.abspath(folder_path)
+
+    while folder_path.startswith(os.path.join(library_path, "")):
+        try:
+            os.rmdir(folder_path)
+        except OSError:
+            break
+        folder_path = os.path.dirname(folder_path)
+
+
+def relayout_library(library_path, layout, index=None):
+    """
+    Re-arranges the library into the provided layout (see plan_relayout), renaming whole folders where possible, and
+    moving individual files otherwise. A file is never moved over an existing file. Folders left empty are removed,
+    and the moves recorded in the library index, if one is provided.
+
+    :param library_path: string
+    :param layout: function, of a file's capture datetime and name, to its list of folder components
+    :param index: optional library index connection
+    :return: dictionary of the moved files (by their old paths, including those moved along with their folder), of the
+             failures, of the renamed folders (as 'renamed_folders', old to new path), the number of files which
+             were already in place (as 'unchanged'), and the files which were left where they are, as their dates are
+             not known (as 'unknown')
+    """
+
+    from retry_policy import DESTINATION, SortFailure, classify_error
+
+    folder_renames, file_moves, unchanged, unknown = plan_relayout(library_path, layout, index)
+    results = {"success": [], "failure": {}, "renamed_folders": {}, "unchanged": unchanged, "unknown": unknown}
+    for file_path in unknown:
+        print("Date unknown, leaving in place: {}".format(file_path))
+
+    def record_move(old_path, new_path):
+        if index is not None:
+            import library_index
+
+            library_index.move_indexed_files(index, old_path, new_path)
+
+    for old_folder, new_folder, file_names in folder_renames:
+        print("Renaming folder: {}\n\tTo: {}".format(old_folder, new_folder))
+
+        try:
+            os.makedirs(os.path.dirname(new_folder), exist_ok=True)
+            os.rename(old_folder, new_folder)
+            results['renamed_folders'][old_folder] = new_folder
+            results['success'].extend(os.path.join(old_folder, file_name) for file_name in file_names)
+            record_move(old_folder, new_folder)
+            remove_empty_folders(os.path.dirname(old_folder), library_path)
+
+        except Exception as e:
+            for file_name in file_names:
+                results['failure'][os.path.join(old_folder, file_name)] = SortFailure(
+                    "Error renaming folder: {}".format(e), classify_error(e), e)
+            print("\tError renaming folder: {}".format(e))
+
+    for old_path, new_path in file_moves:
+        print("Moving file: {}\n\tTo: {}".format(old_path, new_path))
+
+        try:
+            if os.path.lexists(new_path):
+                result = SortFailure("Destination file already exists", DESTINATION)
+                results['failure'][old_path] = result
+                print("\t{}".format(result))
+                continue
+
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            os.rename(old_path, new_path)
+            results['success'].append(old_path)
+            record_move(old_path, new_path)
+            remove_empty_folders(os.path.dirname(old_path), library_path)
+
+        except Exception as e:
+            result = SortFailure("Error moving file: {}".format(e), classify_error(e), e)
+            results['failure'][old_path] = result
+            print("\t{}".format(result))
+
+    return results
+
+
+if __name__ == '__main__':
+
+    # Usage: relayout.py LIBRARY_PATH LAYOUT [INDEX_PATH], where LAYOUT is one of: date, month, iso-date
+    index_connection = None
+    if len(sys.argv) > 3:
+        import library_index
+
+        index_connection = library_index.open_library_index(sys.argv[3])
+
+    try:
+        relayout_library(sys.argv[1], LAYOUTS[sys.argv[2]], index_connection)
+
+    finally:
+        if index_connection is not None:
+            index_connection.close()
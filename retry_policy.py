@@ -0,0 +1,240 @@
+import errno
+import os
+import random
+import time
+
+
+# Failure kinds, recorded on each SortFailure, so that callers can tell which failures are worth re-running.
+TRANSIENT = "transient"
+MOUNT_UNAVAILABLE = "mount_unavailable"
+MISSING_METADATA = "missing_metadata"
+CORRUPT = "corrupt"
+DESTINATION = "destination"
+IO_ERROR = "io_error"
+# The file was moved, but the record of the move (in the library index, or the durability batch) could not be made.
+BOOKKEEPING = "bookkeeping"
+
+# Error numbers which indicate a (probably) temporary problem with the storage, rather than with the file itself, e.g.
+# from a flaky NFS mount.
+TRANSIENT_ERRNOS = {errno.EIO, errno.ESTALE, errno.EAGAIN, errno.EINTR, errno.EBUSY, errno.ETIMEDOUT}
+
+
+class SortFailure(str):
+    """
+    A failure message, as stored in the 'failure' dictionary of the sorting results. It compares equal to the plain
+    message, but also records the kind of failure (see the constants above), and the underlying error, if any.
+    """
+
+    def __new__(cls, message, kind, error=None):
+        failure = super().__new__(cls, message)
+        failure.kind = kind
+        failure.error = error
+        return failure
+
+    @property
+    def transient(self):
+        return self.kind in (TRANSIENT, MOUNT_UNAVAILABLE)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised, instead of attempting an operation, while the circuit breaker for the file's source mount is open.
+    """
+
+    def __init__(self, mount_point):
+        super().__init__("Too many transient failures on source mount: {}".format(mount_point))
+        self.mount_point = mount_point
+
+
+def classify_error(error):
+    """
+    Classifies the provided error (as raised while reading or moving a file) into one of the failure kinds.
+
+    :param error: Exception
+    :return: string
+    """
+
+    if isinstance(error, CircuitOpenError):
+        return MOUNT_UNAVAILABLE
+
+    if isinstance(error, OSError):
+        return TRANSIENT if error.errno in TRANSIENT_ERRNOS else IO_ERROR
+
+    # piexif raises KeyError for a missing tag, and a variety of errors (ValueError, struct.error, etc.) for files
+    # which cannot be parsed.
+    if isinstance(error, KeyError):
+        return MISSING_METADATA
+
+    return CORRUPT
+
+
+def describe_read_failure(error=None):
+    """
+    Builds the failure, for a file whose capture date could not be read, from the error which was raised (or from no
+    error, if the file was read but its date was not valid).
+
+    :param error: Exception, or None
+    :return: SortFailure
+    """
+
+    kind = MISSING_METADATA if error is None else classify_error(error)
+
+    if kind in (MISSING_METADATA, CORRUPT):
+        return SortFailure("Unable to extract creation date from EXIF metadata.", kind, error)
+
+    return SortFailure("Error reading file: {}".format(error), kind, error)
+
+
+def find_mount_point(path):
+    """
+    Finds the mount point, of the file system containing the provided path.
+
+    :param path: string
+    :return: string
+    """
+
+    path = os.path.dirname(os.path.abspath(path))
+
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+
+    return path
+
+
+class RetryPolicy:
+    """
+    Retries file operations which fail with a transient error, with bounded exponential backoff (and jitter), and
+    keeps a circuit breaker for each source mount.
+
+    A breaker opens when, of the most recent operations on its mount (at least minimum_calls of them, and at most
+    window), the fraction which failed transiently reaches failure_rate_threshold. While open, operations on the mount
+    fail immediately with CircuitOpenError; after cooldown seconds, a single trial operation is let through, which
+    closes the breaker again if it succeeds.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.1, max_delay=5.0, failure_rate_threshold=0.5, window=20,
+                 minimum_calls=5, cooldown=30.0, sleep=time.sleep, clock=time.monotonic):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window = window
+        self.minimum_calls = minimum_calls
+        self.cooldown = cooldown
+        self.sleep = sleep
+        self.clock = clock
+        self.mount_points = {}
+        self.outcomes = {}
+        self.opened_at = {}
+        self.half_open = set()
+
+    def backoff_delay(self, attempt):
+        """
+        Computes the delay before the provided (1-based) retry attempt: base_delay doubled for each attempt, capped at
+        max_delay, with 'full jitter' so that many workers hitting the same mount do not retry in lockstep.
+
+        :param attempt: int
+        :return: float (seconds)
+        """
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def mount_point_for(self, path):
+        """
+        Finds (and caches, per folder) the mount point for the provided path.
+
+        :param path: string
+        :return: string
+        """
+
+        folder = os.path.dirname(os.path.abspath(path))
+        if folder not in self.mount_points:
+            self.mount_points[folder] = find_mount_point(path)
+
+        return self.mount_points[folder]
+
+    def check_circuit(self, mount_point):
+        """
+        Raises CircuitOpenError, if the breaker for the provided mount is open, and its cooldown has not yet passed.
+
+        :param mount_point: string
+        :return:
+        """
+
+        opened_at = self.opened_at.get(mount_point)
+        if opened_at is not None:
+            if self.clock() - opened_at < self.cooldown:
+                raise CircuitOpenError(mount_point)
+
+            # Lets a trial operation through (half open); the breaker re-opens immediately if it fails.
+            self.opened_at.pop(mount_point)
+            self.half_open.add(mount_point)
+
+    def record_outcome(self, mount_point, failed):
+        """
+        Records the outcome of an operation on the provided mount, and opens its breaker if the failure rate over the
+        window has reached the threshold.
+
+        :param mount_point: string
+        :param failed: bool (True if the operation failed transiently)
+        :return:
+        """
+
+        outcomes = self.outcomes.setdefault(mount_point, [])
+        outcomes.append(failed)
+        del outcomes[:-self.window]
+
+        trial_failed = failed and mount_point in self.half_open
+        self.half_open.discard(mount_point)
+
+        if trial_failed or (len(outcomes) >= self.minimum_calls and
+                            sum(outcomes) / len(outcomes) >= self.failure_rate_threshold):
+            print("\tOpening circuit breaker for source mount: {}".format(mount_point))
+            self.opened_at[mount_point] = self.clock()
+            outcomes.clear()
+
+    def call(self, path, function, *args):
+        """
+        Calls the provided function (an operation on the provided path), retrying it while it fails with a transient
+        error, up to max_attempts in total. Any other error is raised immediately.
+
+        :param path: string (the source file, used to find its mount)
+        :param function:
+        :param args:
+        :return: the function's return value
+        """
+
+        mount_point = self.mount_point_for(path)
+        attempt = 1
+
+        while True:
+            self.check_circuit(mount_point)
+
+            try:
+                result = function(*args)
+
+            except OSError as e:
+                if classify_error(e) != TRANSIENT:
+                    self.record_outcome(mount_point, False)
+                    raise
+
+                self.record_outcome(mount_point, True)
+                if attempt >= self.max_attempts:
+                    raise
+
+                delay = self.backoff_delay(attempt)
+                print("\tTransient error ({}), retrying in {:.2f}s".format(e, delay))
+                self.sleep(delay)
+                attempt += 1
+                continue
+
+            except Exception:
+                self.record_outcome(mount_point, False)
+                raise
+
+            self.record_outcome(mount_point, False)
+
+            return result
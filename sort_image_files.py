@@ -1,7 +1,17 @@
-import calendar
-import glob
 import os
-import piexif
+
+# The EXIF parser (piexif), file matching (glob), and the library index (sqlite3) are imported on first use, rather
+# than here, so that importing this module stays cheap for callers that only need the path helpers.
+
+# Month names, as used in the 'MM - Month' folder names (equivalent to calendar.month_name, without the cost of
+# importing calendar and locale).
+MONTH_NAMES = ['', 'January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+               'November', 'December']
+DAYS_IN_MONTH = [0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+MONTH_FOLDER_NAMES = [''] + ["{:02d} - {}".format(number, MONTH_NAMES[number]) for number in range(1, 13)]
+
+# The longest gap between two photos of the same event, used by sort_by_event (two hours).
+DEFAULT_EVENT_GAP_SECONDS = 2 * 60 * 60
 
 
 def build_file_list(source_folder_path, file_match_pattern="*.*"):
@@ -13,30 +23,271 @@ def build_file_list(source_folder_path, file_match_pattern="*.*"):
     :return:
     """
 
+    import glob
+
     return glob.glob(os.path.join(source_folder_path, file_match_pattern))
 
 
-def sort_files(source_folder_path, destination_folder_path, file_match_pattern, sorting_scheme):
+def sort_files(source_folder_path, destination_folder_path, file_match_pattern, sorting_scheme, index_path=None,
+               throttle=None, durability=None, duplicate_detector=None, fanout=None, transfer=None, retry_policy=None,
+               target_timezone=None):
     """
     Iterate through the files, in the provided path, and attempt to sort them using the specified sorting scheme.
 
+    If an index path is provided, each file that is successfully sorted is also recorded in the library index (see
+    library_index), so that it can later be looked up by capture date without re-parsing its EXIF metadata.
+
+    If the source path is a ZIP or TAR archive, rather than a folder, its members are streamed straight into the
+    hierarchical folder structure, without first extracting the archive (see archive_source.sort_archive). Archives can
+    only be sorted in that layout, so a ValueError is raised if an archive is combined with any other sorting scheme,
+    or with any of the options marked 'folders only' below. Likewise, a ValueError is raised if an option is provided
+    which the sorting scheme does not support (e.g. a fanout, with sort_by_event, whose folders are per event).
+
     :param source_folder_path:
     :param destination_folder_path:
     :param file_match_pattern:
     :param sorting_scheme:
+    :param index_path:
+    :param throttle: optional io_throttle.IoThrottle, with which the sort's I/O is rate limited (folders only)
+    :param durability: optional group_commit.GroupCommit, with which the moves are made durable (folders only)
+    :param duplicate_detector: optional near_duplicates.NearDuplicateDetector, with which near-duplicates are flagged
+                               (folders only)
+    :param fanout: optional folder_fanout.FolderFanout, with which large day folders are split (folders only)
+    :param transfer: optional verified_transfer.VerifiedTransfer, with which files are moved by verified copies
+                     (folders only)
+    :param retry_policy: optional retry_policy.RetryPolicy, with which transient I/O errors are retried (folders only)
+    :param target_timezone: optional timezone, into which capture datetimes are converted
     :return:
     """
 
-    # Builds the list of files to sort, using the provided path, and file match pattern
-    file_list = build_file_list(source_folder_path, file_match_pattern)
+    is_archive = False
+    if os.path.isfile(source_folder_path):
+        import archive_source
+
+        is_archive = archive_source.is_archive(source_folder_path)
 
-    # Attempts to sort the files, in the provided list.
-    results = sorting_scheme(file_list, destination_folder_path)
+    # Refuses, rather than silently ignores, the scheme and options which archives do not support.
+    if is_archive:
+        if sorting_scheme is not sort_hierarchical_by_date:
+            raise ValueError("Archives can only be sorted with sort_hierarchical_by_date")
+
+        unsupported = [name for name, value in (("throttle", throttle), ("durability", durability),
+                                                ("duplicate_detector", duplicate_detector), ("fanout", fanout),
+                                                ("transfer", transfer), ("retry_policy", retry_policy))
+                       if value is not None]
+        if unsupported:
+            raise ValueError("Options not supported for archives: {}".format(", ".join(unsupported)))
+
+    index = None
+    if index_path:
+        import library_index
+
+        index = library_index.open_library_index(index_path)
+
+    try:
+        if is_archive:
+            return archive_source.sort_archive(source_folder_path, destination_folder_path, file_match_pattern,
+                                               index=index, target_timezone=target_timezone)
+
+        # Builds the list of files to sort, using the provided path, and file match pattern
+        file_list = build_file_list(source_folder_path, file_match_pattern)
+
+        # Attempts to sort the files, in the provided list (passing the optional arguments only where set, so that any
+        # sorting scheme can be used without them).
+        options = {}
+        if index is not None:
+            options['index'] = index
+        if throttle is not None:
+            options['throttle'] = throttle
+        if durability is not None:
+            options['durability'] = durability
+        if duplicate_detector is not None:
+            options['duplicate_detector'] = duplicate_detector
+        if fanout is not None:
+            options['fanout'] = fanout
+        if transfer is not None:
+            options['transfer'] = transfer
+        if retry_policy is not None:
+            options['retry_policy'] = retry_policy
+        if target_timezone is not None:
+            options['target_timezone'] = target_timezone
+        check_scheme_options(sorting_scheme, options)
+        results = sorting_scheme(file_list, destination_folder_path, **options)
+
+    finally:
+        if index is not None:
+            index.close()
 
     return results
 
 
-def compute_hierarchical_path_components(datetime_string):
+def check_scheme_options(sorting_scheme, options):
+    """
+    Checks that the provided sorting scheme accepts each of the provided options, so that an unsupported option is
+    refused up front, rather than failing part way through (or being silently ignored).
+
+    :param sorting_scheme: function
+    :param options: dictionary of keyword arguments
+    :return:
+    """
+
+    import inspect
+
+    parameters = inspect.signature(sorting_scheme).parameters
+    if any(parameter.kind == parameter.VAR_KEYWORD for parameter in parameters.values()):
+        return
+
+    unsupported = sorted(name for name in options if name not in parameters)
+    if unsupported:
+        raise ValueError("Options not supported by {}: {}".format(getattr(sorting_scheme, "__name__", sorting_scheme),
+                                                                  ", ".join(unsupported)))
+
+
+# Matches an EXIF datetime in a single pass, in the standard 'YYYY:MM:DD HH:MM:SS' form, as well as the common
+# variants written by some cameras and editors ('-' or '/' date separators, a 'T' separator, sub-seconds, a trailing
+# offset, or a missing or garbled time). It is compiled on first use (see parse_exif_datetime).
+EXIF_DATETIME_PATTERN = (
+    r"(\d{4})[:\-/](\d{2})[:\-/](\d{2})"
+    r"(?:$|[ T]+(?:(\d{2})[:\-.](\d{2})[:\-.](\d{2})(?:[.,](\d{1,9}))?\s*(Z|[+\-]\d{2}:?\d{2})?)?)")
+exif_datetime_regex = None
+
+# Matches only the date portion of an EXIF datetime, for computing the day folders (where the time is not needed).
+EXIF_DATE_PATTERN = r"(\d{4})[:\-/](\d{2})[:\-/](\d{2})(?![^ T])"
+exif_date_regex = None
+
+
+def parse_utc_offset(offset_string):
+    """
+    Parses an EXIF offset string (e.g. the OffsetTimeOriginal tag), in the format '+HH:MM', '+HHMM', or 'Z', into a
+    timezone.
+
+    Example: ('+09:00')
+
+    datetime.timezone(datetime.timedelta(seconds=32400))
+
+    :param offset_string: string
+    :return: datetime.timezone, or None if the offset is missing or malformed
+    """
+
+    import datetime
+
+    offset_string = offset_string.strip(" \x00") if offset_string else ""
+
+    if offset_string == "Z":
+        return datetime.timezone.utc
+
+    digits = offset_string[1:].replace(":", "")
+    if len(offset_string) < 5 or offset_string[0] not in "+-" or len(digits) != 4 or not digits.isdigit():
+        return None
+
+    hours = int(digits[:2])
+    minutes = int(digits[2:])
+    if hours > 14 or minutes > 59:
+        return None
+
+    offset = datetime.timedelta(hours=hours, minutes=minutes)
+
+    return datetime.timezone(-offset if offset_string[0] == "-" else offset)
+
+
+def parse_exif_datetime(datetime_string, offset_string=None, subsec_string=None, target_timezone=None):
+    """
+    Parses an EXIF datetime string (e.g. the DateTimeOriginal tag) into a datetime. NUL padding, '-' or '/' date
+    separators, and a missing time are tolerated, while impossible dates (such as '0000:00:00', or February 31st) are
+    rejected.
+
+    If an offset is provided (e.g. the OffsetTimeOriginal tag), or is embedded in the string, the datetime is timezone
+    aware; otherwise it is naive, and represents the local time at which the photo was taken. Sub-seconds (e.g. the
+    SubSecTimeOriginal tag) are added as microseconds.
+
+    If a target timezone is provided, timezone aware datetimes are converted into it, so that photos shot abroad can
+    be bucketed by the day in a single reference timezone. Naive datetimes are left unchanged.
+
+    Example: ('2020:01:22 18:00:00', '+09:00', '25')
+
+    datetime.datetime(2020, 1, 22, 18, 0, 0, 250000, tzinfo=datetime.timezone(datetime.timedelta(seconds=32400)))
+
+    :param datetime_string: string
+    :param offset_string: string
+    :param subsec_string: string
+    :param target_timezone: datetime.tzinfo
+    :return: datetime.datetime, or None if the string is not a valid date
+    """
+
+    import datetime
+
+    match = match_exif_datetime(datetime_string)
+    if match is None:
+        return None
+
+    year, month, day, hour, minute, second, fraction, embedded_offset = match.groups()
+
+    # An out of range time is ignored, as the date alone is enough to sort the file.
+    if hour is None or int(hour) > 23 or int(minute) > 59 or int(second) > 59:
+        hour = minute = second = 0
+        microsecond = 0
+    else:
+        fraction = fraction or (subsec_string.strip(" \x00") if subsec_string else "")
+        microsecond = int((fraction + "000000")[:6]) if fraction.isdigit() else 0
+
+    # Builds the datetime, which raises ValueError for impossible dates (e.g. month 00, or February 31st).
+    try:
+        capture_datetime = datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                                             microsecond)
+    except ValueError:
+        return None
+
+    # Attaches the offset, preferring the one embedded in the string over the separate offset tag.
+    if embedded_offset or offset_string:
+        timezone = parse_utc_offset(embedded_offset or offset_string)
+        if timezone is not None:
+            capture_datetime = capture_datetime.replace(tzinfo=timezone)
+            if target_timezone is not None:
+                capture_datetime = capture_datetime.astimezone(target_timezone)
+
+    return capture_datetime
+
+
+def match_exif_datetime(datetime_string):
+    """
+    Matches the provided EXIF datetime string against EXIF_DATETIME_PATTERN, after stripping any whitespace and NUL
+    padding. The pattern is compiled on the first call.
+
+    :param datetime_string: string
+    :return: re.Match, or None if the string does not start with a date
+    """
+
+    global exif_datetime_regex
+
+    if not datetime_string:
+        return None
+
+    if exif_datetime_regex is None:
+        import re
+
+        exif_datetime_regex = re.compile(EXIF_DATETIME_PATTERN)
+
+    return exif_datetime_regex.match(datetime_string.strip(" \x00"))
+
+
+def compute_date_path_components(capture_datetime):
+    """
+    Computes the hierarchical path components, from the provided date (or datetime), in the following format:
+
+    ['YYYY', 'MM - Month', 'DD']
+
+    Example: (datetime.date(2020, 1, 22))
+
+    ['2020', '01 - January', '22']
+
+    :param capture_datetime: datetime.date
+    :return: list
+    """
+
+    return ["%04d" % capture_datetime.year, MONTH_FOLDER_NAMES[capture_datetime.month], "%02d" % capture_datetime.day]
+
+
+def compute_hierarchical_path_components(datetime_string, offset_string=None, target_timezone=None):
     """
     Computes the hierarchical path components, from the provided datetime string, in the following format:
 
@@ -51,36 +302,62 @@ def compute_hierarchical_path_components(datetime_string):
 
     ['2020', '01 - January', '22']
 
+    The datetime string is parsed with parse_exif_datetime, so the same variants are accepted, and the offset and
+    target timezone are applied in the same way.
+
     :param datetime_string: string
-    :return: string
+    :param offset_string: string
+    :param target_timezone: datetime.tzinfo
+    :return: list (empty if the datetime string is not a valid date)
     """
 
-    path_components = []
+    global exif_date_regex
 
-    # Confirms that a datetime string has been provided.
-    if datetime_string:
+    # Converts the datetime into the target timezone, which may change the day.
+    if target_timezone is not None:
+        capture_datetime = parse_exif_datetime(datetime_string, offset_string, target_timezone=target_timezone)
+        return compute_date_path_components(capture_datetime) if capture_datetime else []
 
-        # Extracts the date components from the provided string.
-        date_parts = datetime_string.strip().split(" ")[0]
-        date_parts = date_parts.split(":")
+    # Otherwise, the local capture day is used, and so the folders can be built from the matched text directly, once
+    # the date has been confirmed to exist.
+    if not datetime_string:
+        return []
 
-        # Confirms that there are 3 date components (year, month, day).
-        if len(date_parts) == 3:
+    if exif_date_regex is None:
+        import re
 
-            # Unpacks the year, month, and day from the date components.
-            year = date_parts[0]
-            month_number = date_parts[1]
-            day = date_parts[2]
+        exif_date_regex = re.compile(EXIF_DATE_PATTERN)
 
-            # Confirms that each of the date components are valid
-            if is_year_valid(year) and is_month_valid(month_number) and is_day_valid(day):
+    match = exif_date_regex.match(datetime_string.strip(" \x00"))
+    if match is None:
+        return []
 
-                # Constructs the path, from the provided date components.
-                month_name = calendar.month_name[int(month_number)]
-                month = "{} - {}".format(month_number, month_name)
-                path_components = [year, month, day]
+    year, month, day = match.groups()
+    month_number = int(month)
+    if not is_date_valid(int(year), month_number, int(day)):
+        return []
 
-    return path_components
+    return [year, MONTH_FOLDER_NAMES[month_number], day]
+
+
+def is_date_valid(year, month, day):
+    """
+    Determines whether the provided (numeric) year, month, and day form a date which exists. Unlike is_day_valid, the
+    day is checked against the length of the month, including February 29th in leap years.
+
+    :param year: int
+    :param month: int
+    :param day: int
+    :return:
+    """
+
+    if year < 1 or month < 1 or month > 12 or day < 1:
+        return False
+
+    if month == 2 and day == 29:
+        return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+    return day <= DAYS_IN_MONTH[month]
 
 
 def is_year_valid(year):
@@ -151,6 +428,8 @@ def get_creation_date_from_file(file_path):
     :return:
     """
 
+    import piexif
+
     # Attempts to retrieve the DateTimeOriginal property, from the EXIF metadata.
     try:
         metadata = piexif.load(file_path)
@@ -163,13 +442,93 @@ def get_creation_date_from_file(file_path):
     return creation_date
 
 
-def check_or_create_path(base_path, subfolder_components):
+def read_capture_datetime(file_path, target_timezone=None):
+    """
+    Reads the image capture datetime, from the EXIF metadata in the provided file. Along with the DateTimeOriginal
+    property, the OffsetTimeOriginal and SubSecTimeOriginal properties are used, where present (see
+    parse_exif_datetime). The EXIF data itself (e.g. as returned by exif_segments.read_exif_header) may be provided in
+    place of the file path.
+
+    Unlike get_capture_datetime_from_file, errors are raised rather than suppressed (so that they can be classified,
+    and transient ones retried; see retry_policy): OSError if the file cannot be read, KeyError if it has no
+    DateTimeOriginal property, or a parsing error if its metadata is corrupt.
+
+    :param file_path:
+    :param target_timezone: optional timezone, into which timezone aware datetimes are converted
+    :return: datetime.datetime, or None if the DateTimeOriginal property is not a valid date
+    """
+
+    import piexif
+
+    return get_capture_datetime_from_exif(piexif.load(file_path), target_timezone)
+
+
+def get_capture_datetime_from_exif(exif_dict, target_timezone=None):
+    """
+    Reads the image capture datetime, from the provided EXIF metadata (as loaded by piexif.load), in the same way as
+    read_capture_datetime.
+
+    :param exif_dict: dictionary of EXIF metadata
+    :param target_timezone: optional timezone, into which timezone aware datetimes are converted
+    :return: datetime.datetime, or None if the DateTimeOriginal property is not a valid date
+    """
+
+    import piexif
+
+    exif = exif_dict['Exif']
+    creation_date = exif[piexif.ExifIFD.DateTimeOriginal].decode("utf-8", "replace")
+    offset = exif.get(piexif.ExifIFD.OffsetTimeOriginal, b"").decode("utf-8", "replace")
+    subsec = exif.get(piexif.ExifIFD.SubSecTimeOriginal, b"").decode("utf-8", "replace")
+
+    return parse_exif_datetime(creation_date, offset, subsec, target_timezone)
+
+
+def get_capture_datetime_from_file(file_path, target_timezone=None):
+    """
+    Attempts to determine the image capture datetime, from the EXIF metadata in the provided file (see
+    read_capture_datetime).
+
+    :param file_path:
+    :param target_timezone: optional timezone, into which timezone aware datetimes are converted
+    :return: datetime.datetime, or None if no valid date can be retrieved
+    """
+
+    # There is no capture datetime, if it cannot be retrieved from the EXIF metadata.
+    try:
+        capture_datetime = read_capture_datetime(file_path, target_timezone)
+
+    except Exception as e:
+        capture_datetime = None
+
+    return capture_datetime
+
+
+def run_file_operation(retry_policy, file_path, function, *args):
+    """
+    Runs an operation on the provided file, through the retry policy if one has been provided (so that transient
+    errors are retried, and the source mount's circuit breaker is respected), or directly otherwise.
+
+    :param retry_policy: retry_policy.RetryPolicy, or None
+    :param file_path: string
+    :param function:
+    :param args:
+    :return: the function's return value
+    """
+
+    if retry_policy is None:
+        return function(*args)
+
+    return retry_policy.call(file_path, function, *args)
+
+
+def check_or_create_path(base_path, subfolder_components, throttle=None):
     """
     Checks to see if the folder that is specified (by joining the provided base path and subfolder components)
     exists. If it doesn't, then each of the missing subfolders are created.
 
     :param base_path:
     :param subfolder_components:
+    :param throttle: optional io_throttle.IoThrottle, to which each folder created is charged
     :return:
     """
 
@@ -183,11 +542,13 @@ def check_or_create_path(base_path, subfolder_components):
     except FileNotFoundError:
 
         # Checks to see if the parent folder of the specified path is valid.
-        exists = check_or_create_path(base_path, subfolder_components[:-1])
+        exists = check_or_create_path(base_path, subfolder_components[:-1], throttle)
         path = os.path.join(base_path, *subfolder_components)
 
         # Attempts to create the folder.
         try:
+            if throttle is not None:
+                throttle.metadata_operation()
             os.mkdir(path)
 
         except FileNotFoundError:
@@ -196,7 +557,151 @@ def check_or_create_path(base_path, subfolder_components):
     return exists
 
 
-def sort_hierarchical_by_date(file_list, destination_base_path):
+def extract_capture_datetime(file_path, results, target_timezone=None, retry_policy=None, throttle=None,
+                             duplicate_detector=None):
+    """
+    Attempts to extract the capture datetime, from the EXIF metadata in the provided file, as the first step in
+    sorting it. If it cannot be extracted, the failure is recorded in the provided results.
+
+    If a duplicate detector is provided, the file's embedded thumbnail (loaded along with the rest of its EXIF
+    metadata) is also checked for near-duplicates of the files extracted before it.
+
+    :param file_path:
+    :param results: results dictionary, of the sort in progress
+    :param target_timezone: optional timezone (see read_capture_datetime)
+    :param retry_policy: optional retry_policy.RetryPolicy
+    :param throttle: optional io_throttle.IoThrottle, to which the read is charged
+    :param duplicate_detector: optional near_duplicates.NearDuplicateDetector
+    :return: datetime.datetime, or None if the extraction failed
+    """
+
+    import piexif
+    from retry_policy import describe_read_failure
+
+    def read():
+        exif_dict = piexif.load(file_path if throttle is None else throttle.read_exif_data(file_path))
+        return get_capture_datetime_from_exif(exif_dict, target_timezone), exif_dict['thumbnail']
+
+    try:
+        capture_datetime, thumbnail = run_file_operation(retry_policy, file_path, read)
+        error = None
+
+    except Exception as e:
+        capture_datetime = None
+        error = e
+
+    if capture_datetime is None:
+        result = describe_read_failure(error)
+        results['failure'][file_path] = result
+        print("\t{}".format(result))
+
+    elif duplicate_detector is not None:
+        duplicate_detector.check(file_path, thumbnail, results)
+
+    return capture_datetime
+
+
+def move_file_to_folder(file_path, destination_base_path, computed_destination_folder, capture_datetime, results,
+                        index=None, retry_policy=None, throttle=None, durability=None, transfer=None):
+    """
+    Moves the provided file into the computed destination folder (beneath the destination base path), creating the
+    folder if necessary, as the final step in sorting it. The outcome is recorded in the provided results.
+
+    :param file_path:
+    :param destination_base_path:
+    :param computed_destination_folder: list of subfolder components
+    :param capture_datetime: datetime.datetime (recorded in the library index)
+    :param results: results dictionary, of the sort in progress
+    :param index: optional library index connection, in which the sorted file is recorded
+    :param retry_policy: optional retry_policy.RetryPolicy
+    :param throttle: optional io_throttle.IoThrottle, to which the move (and any folders created) are charged, as are
+                     the bytes copied and verified by a transfer
+    :param durability: optional group_commit.GroupCommit, in which the move is recorded, to be flushed with its batch
+    :param transfer: optional verified_transfer.VerifiedTransfer, with which the file is copied (and verified), rather
+                     than renamed; the file's digest is recorded in the results, under 'digests'
+    :return: True if the file was moved, otherwise False; a file which was moved, but could not then be recorded in the
+             library index (or the durability batch), is still reported as sorted, and the failure to record it is
+             reported separately, under 'bookkeeping_failures'
+    """
+
+    from retry_policy import BOOKKEEPING, DESTINATION, SortFailure, classify_error
+
+    filename = os.path.split(file_path)[1]
+    full_destination_path = os.path.join(destination_base_path, *computed_destination_folder, filename)
+    moved = False
+    attempts = []
+
+    def rename():
+        # Renames are not idempotent on NFS: an attempt which reported a transient error may still have succeeded on
+        # the server, in which case the retry fails with ENOENT. That is treated as success, if the source is gone
+        # and the destination is in place.
+        retried = bool(attempts)
+        attempts.append(True)
+
+        try:
+            os.rename(file_path, full_destination_path)
+
+        except FileNotFoundError:
+            if not (retried and not os.path.lexists(file_path) and os.path.lexists(full_destination_path)):
+                raise
+
+    # Attempts to move the file into the appropriate folder.
+    try:
+        print("\tMoving to: {}".format(full_destination_path))
+
+        # Assures that the necessary destination folder structure exists
+        exists = check_or_create_path(destination_base_path, computed_destination_folder, throttle)
+        if exists:
+
+            # Moves the file to the destination in the hierarchical folder structure.
+            # TODO: check to see if file already exists (will currently overwrite)
+            if throttle is not None:
+                throttle.file_operation()
+                throttle.metadata_operation()
+            if transfer is not None:
+                digest = run_file_operation(retry_policy, file_path, transfer.move, file_path, full_destination_path,
+                                            throttle)
+                results.setdefault('digests', {})[file_path] = digest
+            else:
+                digest = None
+                run_file_operation(retry_policy, file_path, rename)
+            results['success'].append(file_path)
+            moved = True
+
+        else:
+            result = SortFailure("Unable to create the destination folder", DESTINATION)
+            results['failure'][file_path] = result
+            print("\t{}".format(result))
+
+    except Exception as e:
+        result = SortFailure("Error moving file: {}".format(e), classify_error(e), e)
+        results['failure'][file_path] = result
+        print("\t{}".format(result))
+
+    if not moved:
+        return moved
+
+    # Records the move (once it has been made), for the durability batch, and in the library index, if one is being
+    # maintained.
+    try:
+        if durability is not None:
+            durability.record_move(file_path, full_destination_path, destination_base_path)
+
+        if index is not None:
+            import library_index
+
+            library_index.record_sorted_file(index, file_path, full_destination_path, capture_datetime, digest)
+
+    except Exception as e:
+        result = SortFailure("Error recording moved file: {}".format(e), BOOKKEEPING, e)
+        results.setdefault('bookkeeping_failures', {})[file_path] = result
+        print("\t{}".format(result))
+
+    return moved
+
+
+def sort_hierarchical_by_date(file_list, destination_base_path, index=None, target_timezone=None, retry_policy=None,
+                              throttle=None, durability=None, duplicate_detector=None, fanout=None, transfer=None):
     """
     Iterate through the provided list of files, and sort them into a hierarchical folder structure, in the
     following format:
@@ -214,7 +719,27 @@ def sort_hierarchical_by_date(file_list, destination_base_path):
 
     :param file_list:
     :param destination_base_path:
-    :return:
+    :param index: optional library index connection, in which each sorted file is recorded
+    :param target_timezone: optional timezone, into which capture datetimes with a known offset are converted before
+                            the day is determined (by default, the local day on which the photo was taken is used)
+    :param retry_policy: optional retry_policy.RetryPolicy, with which reads and moves that fail with transient I/O
+                         errors are retried
+    :param throttle: optional io_throttle.IoThrottle, with which the reads, moves and folder creations are rate limited
+                     (rather than running flat out), so as to leave disk bandwidth for other services
+    :param durability: optional group_commit.GroupCommit, with which the moves are flushed to disk in batches (by
+                       default, nothing is flushed, and a power loss can undo any recent moves); the final batch is
+                       flushed before returning
+    :param duplicate_detector: optional near_duplicates.NearDuplicateDetector, with which each file is compared with
+                               those sorted before it (see extract_capture_datetime), and any near-duplicates (e.g.
+                               resized or re-encoded copies) recorded in the results, under 'near_duplicates'
+    :param fanout: optional folder_fanout.FolderFanout, with which day folders that would hold too many files are split
+                   into subfolders (by hour, or by shard); the dates of every file are then extracted before any are
+                   moved, so that the split does not depend on the order of the files
+    :param transfer: optional verified_transfer.VerifiedTransfer, with which files are moved by copying them (e.g. onto
+                     another device), hashing them as they are copied, and checking the copies before the sources are
+                     removed; each file's digest is recorded in the results, under 'digests'
+    :return: dictionary of the successfully sorted files, and of the failures (as retry_policy.SortFailure messages,
+             which also record the kind of each failure)
     """
 
     results = {"success": [], "failure": {}}
@@ -226,44 +751,155 @@ def sort_hierarchical_by_date(file_list, destination_base_path):
 
     # Visits each file, in the provided list, and moves it to the computed destination path, based on the date that
     # is specified in the EXIF metadata.
+    dated_files = []
+    try:
+        for file_path in file_list:
+            print("Inspecting file: {}".format(file_path))
+
+            # Flushes the moves made so far, if they have been waiting too long, before a read which may stall.
+            if durability is not None:
+                durability.commit_if_due()
+
+            # Attempts to extract the creation data from the EXIF metadata.
+            capture_datetime = extract_capture_datetime(file_path, results, target_timezone, retry_policy, throttle,
+                                                        duplicate_detector)
+
+            if capture_datetime is None:
+                continue
+
+            if fanout is not None:
+                dated_files.append((file_path, capture_datetime))
+            else:
+                computed_destination_folder = compute_date_path_components(capture_datetime)
+                move_file_to_folder(file_path, destination_base_path, computed_destination_folder, capture_datetime,
+                                    results, index, retry_policy, throttle, durability, transfer)
+
+        # With a fan-out, decides which day folders to split, now that the number of files for each day is known, and
+        # then moves the files.
+        if fanout is not None:
+            day_folder_counts = {}
+            for file_path, capture_datetime in dated_files:
+                day_folder = tuple(compute_date_path_components(capture_datetime))
+                day_folder_counts[day_folder] = day_folder_counts.get(day_folder, 0) + 1
+
+            fanout.plan(day_folder_counts, destination_base_path)
+
+            for file_path, capture_datetime in dated_files:
+                computed_destination_folder = fanout.compute_path_components(
+                    compute_date_path_components(capture_datetime), capture_datetime, os.path.basename(file_path))
+                move_file_to_folder(file_path, destination_base_path, computed_destination_folder, capture_datetime,
+                                    results, index, retry_policy, throttle, durability, transfer)
+
+    finally:
+        if durability is not None:
+            durability.commit()
+
+    return results
+
+
+def compute_event_boundaries(timestamps, gap_seconds):
+    """
+    Finds where each event begins, in the provided (sorted) list of timestamps: a new event begins wherever the gap
+    from the previous timestamp exceeds gap_seconds. The gaps are computed with NumPy, if it is installed, and with a
+    plain loop otherwise.
+
+    Example: ([0, 60, 7200, 7260, 30000], 3600)
+
+    [0, 2, 4]
+
+    :param timestamps: sorted list of timestamps (in seconds)
+    :param gap_seconds: number
+    :return: list of the indexes at which each event begins
+    """
+
+    if not timestamps:
+        return []
+
+    try:
+        import numpy
+
+    except ImportError:
+        return [0] + [position for position in range(1, len(timestamps))
+                      if timestamps[position] - timestamps[position - 1] > gap_seconds]
+
+    gaps = numpy.diff(numpy.asarray(timestamps, dtype=numpy.float64))
+
+    return [0] + (numpy.flatnonzero(gaps > gap_seconds) + 1).tolist()
+
+
+def sort_by_event(file_list, destination_base_path, gap_seconds=DEFAULT_EVENT_GAP_SECONDS, index=None,
+                  target_timezone=None, retry_policy=None, throttle=None, durability=None, duplicate_detector=None,
+                  transfer=None):
+    """
+    Iterate through the provided list of files, group them into events (runs of photos with no gap between consecutive
+    capture times longer than gap_seconds), and sort each event into its own folder, in the following format:
+
+    destination_base_path/YYYY/MM - Month/DD - event N
+
+    where the date is that of the first photo in the event, and N numbers the events beginning on that day (from 1).
+
+    Example: (two events on January 22, 2020)
+
+    /destination_base_path/2020/01 - January/22 - event 1
+    /destination_base_path/2020/01 - January/22 - event 2
+
+    The capture dates are all extracted first, and then sorted (the only O(n log n) step), before the gaps are
+    computed in a single pass (see compute_event_boundaries).
+
+    :param file_list:
+    :param destination_base_path:
+    :param gap_seconds: the longest gap (in seconds) between two photos of the same event
+    :param index: optional library index connection, in which each sorted file is recorded
+    :param target_timezone: optional timezone (see sort_hierarchical_by_date)
+    :param retry_policy: optional retry_policy.RetryPolicy
+    :param throttle: optional io_throttle.IoThrottle (see sort_hierarchical_by_date)
+    :param durability: optional group_commit.GroupCommit (see sort_hierarchical_by_date)
+    :param duplicate_detector: optional near_duplicates.NearDuplicateDetector (see sort_hierarchical_by_date)
+    :param transfer: optional verified_transfer.VerifiedTransfer (see sort_hierarchical_by_date)
+    :return: dictionary of the successfully sorted files, and of the failures
+    """
+
+    results = {"success": [], "failure": {}}
+
+    # Sets the destination path to the current working directory, if one hasn't be specified.
+    if not destination_base_path:
+        destination_base_path = os.getcwd()
+        print("No destination path specified. Using current directory as default.")
+
+    # Extracts the capture dates, of every file, before anything is moved.
+    dated_files = []
     for file_path in file_list:
         print("Inspecting file: {}".format(file_path))
 
-        # Attempts to extract the creation data from the EXIF metadata.
-        creation_date = get_creation_date_from_file(file_path)
+        capture_datetime = extract_capture_datetime(file_path, results, target_timezone, retry_policy, throttle,
+                                                    duplicate_detector)
+        if capture_datetime is not None:
+            dated_files.append((capture_datetime.replace(tzinfo=None), file_path, capture_datetime))
 
-        if creation_date == "":
-            result = "Unable to extract creation date from EXIF metadata."
-            results['failure'][file_path] = result
-            print("\t{}".format(result))
+    # Orders the files by (local) capture time, and finds where each event begins.
+    import datetime
 
-        else:
-            computed_destination_folder = compute_hierarchical_path_components(creation_date)
-            filename = os.path.split(file_path)[1]
-            full_destination_path = os.path.join(destination_base_path, *computed_destination_folder, filename)
-
-            # Attempts to move the file into the appropriate folder.
-            try:
-                print("\tMoving to: {}".format(full_destination_path))
-
-                # Assures that the necessary destination folder structure exists
-                exists = check_or_create_path(destination_base_path, computed_destination_folder)
-                if exists:
-
-                    # Moves the file to the destination in the hierarchical folder structure.
-                    # TODO: check to see if file already exists (will currently overwrite)
-                    os.rename(file_path, full_destination_path)
-                    results['success'].append(file_path)
-
-                else:
-                    result = "Unable to create the destination folder"
-                    results['failure'][file_path] = result
-                    print("\t{}".format(result))
-
-            except Exception as e:
-                result = "Error moving file: {}".format(e)
-                results['failure'][file_path] = result
-                print("\t{}".format(result))
+    epoch = datetime.datetime(1970, 1, 1)
+    dated_files.sort(key=lambda dated_file: dated_file[:2])
+    timestamps = [(local_datetime - epoch).total_seconds() for local_datetime, _, _ in dated_files]
+    boundaries = compute_event_boundaries(timestamps, gap_seconds) + [len(dated_files)]
+
+    # Moves each event's files into the event's folder, numbering the events within each day.
+    events_per_day = {}
+    try:
+        for start, end in zip(boundaries, boundaries[1:]):
+            day_components = compute_date_path_components(dated_files[start][0])
+            day_key = tuple(day_components)
+            events_per_day[day_key] = events_per_day.get(day_key, 0) + 1
+
+            event_folder = day_components[:2] + ["{} - event {}".format(day_components[2], events_per_day[day_key])]
+            for _, file_path, capture_datetime in dated_files[start:end]:
+                move_file_to_folder(file_path, destination_base_path, event_folder, capture_datetime, results, index,
+                                    retry_policy, throttle, durability, transfer)
+
+    finally:
+        if durability is not None:
+            durability.commit()
 
     return results
 
@@ -0,0 +1,135 @@
+import json
+import os
+import socket
+import stat
+import sys
+
+import sort_image_files
+
+
+# The longest time (in seconds) to wait for a client to send its request, so that a client which connects and then
+# stalls cannot block the requests behind it.
+REQUEST_TIMEOUT = 30
+
+
+def handle_sort_request(request, index_path=None):
+    """
+    Sorts the files described by the provided request, using the hierarchical date sorting scheme. A request either
+    names the files to sort explicitly:
+
+    {"files": ["/incoming/IMG_0766.jpg"], "destination": "/library"}
+
+    or describes them in the same way as sort_files:
+
+    {"source": "/incoming", "pattern": "*.JPG", "destination": "/library"}
+
+    :param request: dictionary
+    :param index_path: optional library index path, in which sorted files are recorded
+    :return: results dictionary
+    """
+
+    destination_path = request.get("destination")
+
+    if "files" in request:
+        file_list = request["files"]
+    else:
+        file_list = sort_image_files.build_file_list(request["source"], request.get("pattern", "*.*"))
+
+    # Sorts the files, recording them in the library index, if one is being maintained.
+    if index_path:
+        import library_index
+
+        index = library_index.open_library_index(index_path)
+        try:
+            results = sort_image_files.sort_hierarchical_by_date(file_list, destination_path, index=index)
+        finally:
+            index.close()
+
+    else:
+        results = sort_image_files.sort_hierarchical_by_date(file_list, destination_path)
+
+    return results
+
+
+def create_sort_server(socket_path, index_path=None, request_timeout=REQUEST_TIMEOUT):
+    """
+    Creates a sorting server, bound to a Unix socket at the provided path. Each connection carries a single JSON
+    request line, and receives a single JSON results line in reply. Requests are handled one at a time, in the order in
+    which they arrive.
+
+    A stale socket left at the path is removed, but any other kind of file there is left alone, and an error raised.
+
+    :param socket_path: string
+    :param index_path: optional library index path, in which sorted files are recorded
+    :param request_timeout: the longest time (in seconds) to wait for a client's request
+    :return: socketserver.UnixStreamServer
+    """
+
+    import socketserver
+
+    class SortRequestHandler(socketserver.StreamRequestHandler):
+
+        timeout = request_timeout
+
+        def handle(self):
+            try:
+                request = json.loads(self.rfile.readline().decode("utf-8"))
+                response = handle_sort_request(request, index_path)
+            except Exception as e:
+                response = {"error": "Unable to handle request: {}".format(e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+    # Removes a stale socket, left behind by a previous server that did not shut down cleanly.
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError("Not a socket, refusing to replace it: {}".format(socket_path))
+        os.remove(socket_path)
+
+    return socketserver.UnixStreamServer(socket_path, SortRequestHandler)
+
+
+def serve(socket_path, index_path=None):
+    """
+    Runs a persistent sorting server, listening on a Unix socket at the provided path, until it is interrupted. Hook
+    scripts can send sort requests to it (see send_sort_request), rather than starting a new interpreter, and importing
+    the EXIF parser, for every arriving file.
+
+    :param socket_path: string
+    :param index_path: optional library index path, in which sorted files are recorded
+    :return:
+    """
+
+    server = create_sort_server(socket_path, index_path)
+    print("Listening for sort requests on: {}".format(socket_path))
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+def send_sort_request(socket_path, request):
+    """
+    Sends a sort request to a running sorting server, and waits for the results.
+
+    :param socket_path: string
+    :param request: dictionary (see handle_sort_request)
+    :return: results dictionary
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("rb") as response:
+            return json.loads(response.readline().decode("utf-8"))
+
+
+if __name__ == '__main__':
+
+    # Usage: sort_server.py SOCKET_PATH [INDEX_PATH]
+    serve(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
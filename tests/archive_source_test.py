@@ -0,0 +1,133 @@
+import archive_source
+import os
+import shutil
+import sort_image_files
+import tarfile
+import unittest
+import zipfile
+
+
+class TestSortArchive(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a clean 'test_folder' folder, and builds ZIP and TAR archives in it, from a few of the test files.
+
+        :return:
+        """
+
+        self.test_data_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        os.mkdir(self.test_folder_path)
+
+        self.filenames = ['IMG_0766.jpg', 'IMG_0797.JPG', 'IMG_0000_invalid.JPG', 'IMG_0839_no_metadata.JPG']
+
+        self.zip_path = os.path.join(self.test_folder_path, 'export.zip')
+        with zipfile.ZipFile(self.zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for filename in self.filenames:
+                archive.write(os.path.join(self.test_data_path, filename), 'DCIM/' + filename)
+
+        self.tar_path = os.path.join(self.test_folder_path, 'export.tar.gz')
+        with tarfile.open(self.tar_path, 'w:gz') as archive:
+            for filename in self.filenames:
+                archive.add(os.path.join(self.test_data_path, filename), 'DCIM/' + filename)
+
+        self.destination_path = os.path.join(self.test_folder_path, 'library')
+        os.mkdir(self.destination_path)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def check_sorted_archive(self, archive_path, results):
+        """
+        Confirms that the members with a creation date were written, unchanged, to their dated folders, and that the
+        others were recorded as failures.
+
+        :param archive_path:
+        :param results:
+        :return:
+        """
+
+        self.assertEqual(results['success'], [os.path.join(archive_path, 'DCIM/IMG_0766.jpg'),
+                                              os.path.join(archive_path, 'DCIM/IMG_0797.JPG')])
+        self.assertEqual(sorted(results['failure']), [os.path.join(archive_path, 'DCIM/IMG_0000_invalid.JPG'),
+                                                      os.path.join(archive_path, 'DCIM/IMG_0839_no_metadata.JPG')])
+
+        destination_file_path = os.path.join(self.destination_path, '2020', '01 - January', '15', 'IMG_0766.jpg')
+        with open(destination_file_path, 'rb') as sorted_file, \
+                open(os.path.join(self.test_data_path, 'IMG_0766.jpg'), 'rb') as original_file:
+            self.assertEqual(sorted_file.read(), original_file.read())
+
+    def test_sort_zip_archive(self):
+        """
+        In this test case, a ZIP archive is sorted, by passing it to sort_files as the source.
+
+        We expect its members to be written straight into the hierarchical folder structure.
+
+        :return:
+        """
+
+        results = sort_image_files.sort_files(self.zip_path, self.destination_path, "*.*",
+                                              sort_image_files.sort_hierarchical_by_date)
+
+        self.check_sorted_archive(self.zip_path, results)
+
+    def test_sort_tar_archive(self):
+        """
+        In this test case, a compressed TAR archive is sorted.
+
+        We expect its members to be written straight into the hierarchical folder structure.
+
+        :return:
+        """
+
+        results = archive_source.sort_archive(self.tar_path, self.destination_path)
+
+        self.check_sorted_archive(self.tar_path, results)
+
+    def test_sort_archive_with_match_pattern(self):
+        """
+        In this test case, a ZIP archive is sorted with a match pattern which only matches the '.jpg' member.
+
+        We expect only that member to be sorted.
+
+        :return:
+        """
+
+        results = archive_source.sort_archive(self.zip_path, self.destination_path, "*.jpg")
+
+        self.assertEqual(results, {"success": [os.path.join(self.zip_path, 'DCIM/IMG_0766.jpg')], "failure": {}})
+
+    def test_sort_archive_unsupported_options(self):
+        """
+        In this test case, a ZIP archive is passed to sort_files with the event sorting scheme, and then with a
+        throttle.
+
+        We expect each to be refused with a ValueError (rather than the scheme, or option, being silently ignored), and
+        nothing to be sorted.
+
+        :return:
+        """
+
+        import io_throttle
+
+        with self.assertRaises(ValueError):
+            sort_image_files.sort_files(self.zip_path, self.destination_path, "*.*", sort_image_files.sort_by_event)
+
+        with self.assertRaises(ValueError):
+            sort_image_files.sort_files(self.zip_path, self.destination_path, "*.*",
+                                        sort_image_files.sort_hierarchical_by_date,
+                                        throttle=io_throttle.IoThrottle(bytes_per_second=1000))
+
+        self.assertFalse(os.path.exists(os.path.join(self.destination_path, '2020')))
+
+
+if __name__ == '__main__':
+    unittest.main()
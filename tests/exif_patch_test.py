@@ -0,0 +1,236 @@
+import exif_patch
+import exif_segments
+import group_commit
+import os
+import piexif
+import shutil
+import sort_image_files
+import struct
+import unittest
+
+
+class TestWriteCreationDate(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be patched.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def read_image_data(self, file_path):
+        """
+        Reads the image data (everything from the start of scan marker onwards) of the provided file.
+
+        :param file_path:
+        :return:
+        """
+
+        with open(file_path, 'rb') as file:
+            header, exif = exif_segments.read_exif_header(file)
+            return header[-2:] + file.read()
+
+    def test_existing_value_is_overwritten_in_place(self):
+        """
+        In this test case, a file which already has a DateTimeOriginal property is patched.
+
+        We expect only the value to be rewritten, leaving the file the same size, with the new date readable.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+        size = os.path.getsize(file_path)
+
+        self.assertEqual(exif_patch.write_creation_date(file_path, '2019:12:31 23:59:59'), 'value')
+        self.assertEqual(sort_image_files.get_creation_date_from_file(file_path), '2019:12:31 23:59:59')
+        self.assertEqual(os.path.getsize(file_path), size)
+
+    def test_value_outside_segment_is_not_overwritten(self):
+        """
+        In this test case, the DateTimeOriginal entry of a file is corrupted, so that its value offset points past the
+        end of the EXIF segment (into the image data), and the file is then patched.
+
+        We expect the value not to be written at the corrupt offset; the segment is rebuilt instead, leaving the image
+        data intact, with the new date readable.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+        image_data = self.read_image_data(file_path)
+
+        with open(file_path, 'r+b') as file:
+            for marker, offset, segment in exif_segments.iter_jpeg_segments(file):
+                if marker == exif_segments.APP1 and segment[4:10] == exif_segments.EXIF_HEADER:
+                    break
+            tiff = segment[10:]
+            endian = "<" if tiff[:2] == b"II" else ">"
+            exif_pointer = exif_patch.find_ifd_entry(tiff, endian, struct.unpack_from(endian + "L", tiff, 4)[0],
+                                                     exif_patch.EXIF_IFD_POINTER_TAG)
+            entry = exif_patch.find_ifd_entry(tiff, endian, exif_pointer[3], exif_patch.DATE_TIME_ORIGINAL_TAG)
+            os.pwrite(file.fileno(), struct.pack(endian + "L", len(tiff) + 100), offset + 10 + entry[0] + 8)
+
+        self.assertEqual(exif_patch.write_creation_date(file_path, '2019:12:31 23:59:59'), 'file')
+        self.assertEqual(sort_image_files.get_creation_date_from_file(file_path), '2019:12:31 23:59:59')
+        self.assertEqual(self.read_image_data(file_path), image_data)
+
+    def test_segment_with_space_is_overwritten_in_place(self):
+        """
+        In this test case, a file with an EXIF segment which has no DateTimeOriginal property, but enough unused space
+        for it, is patched, with in place segment rewrites allowed.
+
+        We expect only the segment to be rewritten, leaving the file the same size, with the new date readable.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0839_no_metadata.JPG')
+        payload = piexif.dump({"0th": {piexif.ImageIFD.Make: b"Camera"}}) + b"\x00" * 200
+        piexif.insert(payload, file_path)
+        size = os.path.getsize(file_path)
+        image_data = self.read_image_data(file_path)
+
+        self.assertEqual(exif_patch.write_creation_date(file_path, '2020:01:17 01:38:30', in_place_segment=True),
+                         'segment')
+        self.assertEqual(sort_image_files.get_creation_date_from_file(file_path), '2020:01:17 01:38:30')
+        self.assertEqual(os.path.getsize(file_path), size)
+        self.assertEqual(self.read_image_data(file_path), image_data)
+
+    def test_segment_is_rewritten_atomically_by_default(self):
+        """
+        In this test case, a file with an EXIF segment which has no DateTimeOriginal property, but enough unused space
+        for it, is patched, with the default options.
+
+        We expect the file to be rewritten through a temporary file (not in place), with the new date readable, and the
+        image data unchanged.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0839_no_metadata.JPG')
+        payload = piexif.dump({"0th": {piexif.ImageIFD.Make: b"Camera"}}) + b"\x00" * 200
+        piexif.insert(payload, file_path)
+        inode = os.stat(file_path).st_ino
+        image_data = self.read_image_data(file_path)
+
+        self.assertEqual(exif_patch.write_creation_date(file_path, '2020:01:17 01:38:30'), 'file')
+        self.assertEqual(sort_image_files.get_creation_date_from_file(file_path), '2020:01:17 01:38:30')
+        self.assertNotEqual(os.stat(file_path).st_ino, inode)
+        self.assertEqual(self.read_image_data(file_path), image_data)
+
+    def test_file_without_metadata_is_rewritten(self):
+        """
+        In this test case, a file without any EXIF metadata is patched.
+
+        We expect a new EXIF segment to be written, with the new date readable, and the image data unchanged.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0839_no_metadata.JPG')
+        image_data = self.read_image_data(file_path)
+
+        self.assertEqual(exif_patch.write_creation_date(file_path, '2020:01:17 01:38:30'), 'file')
+        self.assertEqual(sort_image_files.get_creation_date_from_file(file_path), '2020:01:17 01:38:30')
+        self.assertEqual(self.read_image_data(file_path), image_data)
+
+    def test_invalid_date_is_rejected(self):
+        """
+        In this test case, an invalid creation date is provided.
+
+        We expect a ValueError to be raised, and the file to be left untouched.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+
+        with self.assertRaises(ValueError):
+            exif_patch.write_creation_date(file_path, '2020:02:31 00:00:00')
+        self.assertEqual(sort_image_files.get_creation_date_from_file(file_path), '2020:01:15 18:00:41')
+
+
+class TestPatchCreationDates(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be patched.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_patch_failed_files(self):
+        """
+        In this test case, the files which fail to sort are patched, using their modification times as the fallback
+        source of creation dates.
+
+        We expect the valid JPEG to be patched, and the invalid file to be recorded as a failure.
+
+        :return:
+        """
+
+        no_metadata = os.path.join(self.test_folder_path, 'IMG_0839_no_metadata.JPG')
+        invalid = os.path.join(self.test_folder_path, 'IMG_0000_invalid.JPG')
+        dates = {file_path: exif_patch.date_from_modification_time(file_path) for file_path in (no_metadata, invalid)}
+
+        results = exif_patch.patch_creation_dates(dates)
+
+        self.assertEqual(results['success'], {no_metadata: 'file'})
+        self.assertEqual(list(results['failure']), [invalid])
+        self.assertEqual(sort_image_files.get_creation_date_from_file(no_metadata), dates[no_metadata])
+
+    def test_folder_flushed_once(self):
+        """
+        In this test case, two files in the same folder, neither with EXIF metadata, are patched (so that each is
+        rewritten, and renamed over the original).
+
+        We expect the folder to be flushed once, for the whole batch, rather than once per file.
+
+        :return:
+        """
+
+        first = os.path.join(self.test_folder_path, 'IMG_0839_no_metadata.JPG')
+        second = os.path.join(self.test_folder_path, 'IMG_0839_copy.JPG')
+        shutil.copyfile(first, second)
+
+        flushed = []
+        self.addCleanup(setattr, group_commit, 'fsync_folder', group_commit.fsync_folder)
+        group_commit.fsync_folder = flushed.append
+
+        results = exif_patch.patch_creation_dates({first: '2020:01:15 18:00:41', second: '2020:01:15 18:00:42'})
+
+        self.assertEqual(results['success'], {first: 'file', second: 'file'})
+        self.assertEqual(flushed, [self.test_folder_path])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import exif_segments
+import io
+import os
+import unittest
+
+
+class TestReadExifHeader(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data_path = os.path.join(os.getcwd(), 'test_data')
+
+    def test_header_with_exif(self):
+        """
+        In this test case, a JPEG file containing EXIF metadata is read.
+
+        We expect the EXIF segment to be returned, and the header followed by the rest of the stream to reproduce the
+        file exactly.
+
+        :return:
+        """
+
+        with open(os.path.join(self.test_data_path, 'IMG_0766.jpg'), 'rb') as file:
+            data = file.read()
+
+        stream = io.BytesIO(data)
+        header, exif = exif_segments.read_exif_header(stream)
+
+        self.assertTrue(exif.startswith(exif_segments.EXIF_HEADER))
+        self.assertEqual(header + stream.read(), data)
+
+    def test_header_without_exif(self):
+        """
+        In this test case, a JPEG file containing no EXIF metadata is read.
+
+        We expect no EXIF segment to be returned.
+
+        :return:
+        """
+
+        with open(os.path.join(self.test_data_path, 'IMG_0839_no_metadata.JPG'), 'rb') as file:
+            header, exif = exif_segments.read_exif_header(file)
+
+        self.assertTrue(header.startswith(exif_segments.SOI))
+        self.assertIsNone(exif)
+
+    def test_not_a_jpeg(self):
+        """
+        In this test case, a stream which is not a JPEG is read.
+
+        We expect only the first two bytes to be consumed, and no EXIF segment to be returned.
+
+        :return:
+        """
+
+        expected_result = (b'Th', None)
+        actual_result = exif_segments.read_exif_header(io.BytesIO(b'This is not a JPEG'))
+
+        self.assertEqual(actual_result, expected_result)
+
+
+if __name__ == '__main__':
+    unittest.main()
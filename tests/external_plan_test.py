@@ -0,0 +1,107 @@
+import external_plan
+import json
+import library_index
+import os
+import shutil
+import unittest
+
+
+class TestSortFilesBounded(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        self.results_path = os.path.join(os.getcwd(), 'test_results.jsonl')
+        self.max_merge_fan_in = external_plan.MAX_MERGE_FAN_IN
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        external_plan.MAX_MERGE_FAN_IN = self.max_merge_fan_in
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        if os.path.exists(self.results_path):
+            os.remove(self.results_path)
+
+    def test_sort_with_many_runs(self):
+        """
+        In this test case, the test files are sorted with room for only two planned moves in memory, and only two runs
+        merged at a time, so that the plan is spilled to several runs, which take more than one pass to merge.
+
+        We expect every file to be sorted as by sort_hierarchical_by_date, and every result to be in the log.
+
+        :return:
+        """
+
+        external_plan.MAX_MERGE_FAN_IN = 2
+
+        totals = external_plan.sort_files_bounded(self.test_folder_path, self.test_folder_path, "*.*",
+                                                  self.results_path, max_entries_in_memory=2)
+
+        with open(self.results_path) as results_file:
+            logged = [json.loads(line) for line in results_file]
+
+        self.assertEqual(totals, {"success": 9, "failure": 2, "bookkeeping_failures": 0})
+        self.assertEqual(sorted(entry['path'] for entry in logged if not entry['success']), [
+            os.path.join(self.test_folder_path, "IMG_0000_invalid.JPG"),
+            os.path.join(self.test_folder_path, "IMG_0839_no_metadata.JPG"),
+        ])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.test_folder_path, '2020', '01 - January', '15'))), [
+            'IMG_0766.jpg', 'IMG_0797.JPG', 'IMG_0801.JPG', 'IMG_0802.JPG', 'IMG_0803.JPG', 'IMG_0812.JPG',
+            'IMG_0813.JPG', 'IMG_0814.JPG',
+        ])
+        self.assertEqual(os.listdir(os.path.join(self.test_folder_path, '2020', '01 - January', '17')),
+                         ['IMG_0839.JPG'])
+
+    def test_index_failures_are_logged(self):
+        """
+        In this test case, the test files are sorted with an index which fails every write (as its connection has been
+        closed).
+
+        We expect the files to be moved, and each failure to record it in the index to be logged, and counted.
+
+        :return:
+        """
+
+        index = library_index.open_library_index(':memory:')
+        index.close()
+
+        totals = external_plan.sort_files_bounded(self.test_folder_path, self.test_folder_path, "*.*",
+                                                  self.results_path, index=index)
+
+        with open(self.results_path) as results_file:
+            logged = [json.loads(line) for line in results_file]
+
+        self.assertEqual(totals, {"success": 9, "failure": 2, "bookkeeping_failures": 9})
+        self.assertEqual(len([entry for entry in logged if 'bookkeeping_failure' in entry]), 9)
+        self.assertTrue(all(entry['kind'] == 'bookkeeping' for entry in logged if 'bookkeeping_failure' in entry))
+
+    def test_iter_file_paths_matches_pattern(self):
+        """
+        In this test case, the files matching a (case sensitive) '.jpg' pattern are listed.
+
+        We expect only the file with that extension.
+
+        :return:
+        """
+
+        expected_result = [os.path.join(self.test_folder_path, 'IMG_0766.jpg')]
+        actual_result = list(external_plan.iter_file_paths(self.test_folder_path, '*.jpg'))
+
+        self.assertEqual(actual_result, expected_result)
+
+
+if __name__ == '__main__':
+    unittest.main()
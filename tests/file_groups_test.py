@@ -0,0 +1,112 @@
+import file_groups
+import os
+import shutil
+import sort_image_files
+import unittest
+
+
+class TestGroupFiles(unittest.TestCase):
+
+    def test_group_by_stem(self):
+        """
+        In this test case, a RAW file, its JPEG, its sidecars (including one named after the RAW file's full name), a
+        Live Photo video, and an unrelated photo are grouped.
+
+        We expect every file sharing the stem (ignoring case) in one group, and the unrelated photo in its own.
+
+        :return:
+        """
+
+        file_list = ['/in/IMG_0001.CR2', '/in/IMG_0001.JPG', '/in/IMG_0001.CR2.xmp', '/in/img_0001.aae',
+                     '/in/IMG_0001.MOV', '/in/IMG_0002.JPG', '/other/IMG_0001.JPG']
+        expected_result = [['/in/IMG_0001.CR2', '/in/IMG_0001.JPG', '/in/IMG_0001.CR2.xmp', '/in/img_0001.aae',
+                            '/in/IMG_0001.MOV'], ['/in/IMG_0002.JPG'], ['/other/IMG_0001.JPG']]
+        actual_result = file_groups.group_files(file_list)
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_sidecar_with_dotted_name(self):
+        """
+        In this test case, a photo and its sidecar have a name containing dots which are not part of an extension.
+
+        We expect only a photo or video extension to be removed from the sidecar's name, so that the two are grouped.
+
+        :return:
+        """
+
+        file_list = ['/in/2020.01.22 party.JPG', '/in/2020.01.22 party.xmp', '/in/2020.01.jpg']
+        expected_result = [['/in/2020.01.22 party.JPG', '/in/2020.01.22 party.xmp'], ['/in/2020.01.jpg']]
+        actual_result = file_groups.group_files(file_list)
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_metadata_sources(self):
+        """
+        In this test case, the members of a RAW+JPEG group (with a sidecar and a video) are ordered as sources of
+        metadata.
+
+        We expect the JPEG first, then the RAW file, and neither the sidecar nor the video.
+
+        :return:
+        """
+
+        group = ['/in/IMG_0001.xmp', '/in/IMG_0001.NEF', '/in/IMG_0001.MOV', '/in/IMG_0001.JPG']
+        expected_result = ['/in/IMG_0001.JPG', '/in/IMG_0001.NEF']
+        actual_result = file_groups.order_metadata_sources(group)
+
+        self.assertEqual(actual_result, expected_result)
+
+
+class TestSortGroupedByDate(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted, and adds sidecars and
+        videos for a photo with metadata, and for one without.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        for filename in ('IMG_0766.xmp', 'IMG_0766.AAE', 'IMG_0766.MOV', 'IMG_0839_no_metadata.xmp'):
+            with open(os.path.join(self.test_folder_path, filename), 'wb') as file:
+                file.write(b'<x:xmpmeta/>')
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_sort_groups(self):
+        """
+        In this test case, the test files, and the added sidecars and videos, are sorted as groups.
+
+        We expect the sidecars and video of the photo with metadata to be moved along with it, and the sidecar of the
+        photo without metadata to fail along with it.
+
+        :return:
+        """
+
+        file_list = sort_image_files.build_file_list(self.test_folder_path, "*.*")
+
+        results = file_groups.sort_grouped_by_date(file_list, self.test_folder_path)
+
+        self.assertEqual(len(results['success']), 12)
+        self.assertEqual(sorted(os.path.basename(file_path) for file_path in results['failure']), [
+            'IMG_0000_invalid.JPG', 'IMG_0839_no_metadata.JPG', 'IMG_0839_no_metadata.xmp'])
+        self.assertEqual(results['failure'][os.path.join(self.test_folder_path, 'IMG_0839_no_metadata.xmp')],
+                         "Unable to extract creation date from EXIF metadata.")
+        self.assertTrue(set(['IMG_0766.jpg', 'IMG_0766.xmp', 'IMG_0766.AAE', 'IMG_0766.MOV']).issubset(
+            os.listdir(os.path.join(self.test_folder_path, '2020', '01 - January', '15'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
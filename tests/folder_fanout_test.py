@@ -0,0 +1,123 @@
+import folder_fanout
+import os
+import shutil
+import sort_image_files
+import unittest
+
+
+class TestFolderFanout(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        self.day_folder_path = os.path.join(self.test_folder_path, '2020', '01 - January', '15')
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def sort_test_files(self, fanout):
+        file_list = sort_image_files.build_file_list(self.test_folder_path, "*.*")
+        return sort_image_files.sort_hierarchical_by_date(file_list, self.test_folder_path, fanout=fanout)
+
+    def test_split_by_hour(self):
+        """
+        In this test case, the test files are sorted with a threshold of 5 files per day folder, split by hour.
+
+        We expect the 8 files taken on January 15 to be split into hour folders, and the single file taken on January
+        17 to stay in its day folder.
+
+        :return:
+        """
+
+        results = self.sort_test_files(folder_fanout.FolderFanout(threshold=5))
+
+        self.assertEqual(len(results['success']), 9)
+        hour_folders = sorted(os.listdir(self.day_folder_path))
+        self.assertTrue(hour_folders)
+        self.assertTrue(all(folder_fanout.SUBFOLDER_PATTERNS[folder_fanout.FANOUT_BY_HOUR].match(name)
+                            for name in hour_folders))
+        self.assertEqual(sum(len(os.listdir(os.path.join(self.day_folder_path, name))) for name in hour_folders), 8)
+        self.assertEqual(os.listdir(os.path.join(self.test_folder_path, '2020', '01 - January', '17')),
+                         ['IMG_0839.JPG'])
+
+    def test_split_by_shard(self):
+        """
+        In this test case, the test files are sorted with a threshold of 5 files per day folder, split into 4 shards.
+
+        We expect each of the files taken on January 15 to be in the shard computed from its name.
+
+        :return:
+        """
+
+        self.sort_test_files(folder_fanout.FolderFanout(threshold=5, mode=folder_fanout.FANOUT_BY_SHARD,
+                                                        shard_count=4))
+
+        for name in os.listdir(self.day_folder_path):
+            for filename in os.listdir(os.path.join(self.day_folder_path, name)):
+                self.assertEqual(name, "shard {:02d}".format(folder_fanout.compute_shard(filename, 4)))
+
+    def test_split_folder_stays_split(self):
+        """
+        In this test case, the test files are sorted with a threshold of 5 files per day folder, and then a copy of one
+        of the files (which would be the only new file for its day) is sorted.
+
+        We expect the copy to go into the same hour folder as the original, as the day folder has already been split.
+
+        :return:
+        """
+
+        self.sort_test_files(folder_fanout.FolderFanout(threshold=5))
+        original_path = next(os.path.join(root, filename) for root, _, filenames in os.walk(self.day_folder_path)
+                             for filename in filenames if filename == 'IMG_0766.jpg')
+        shutil.copy(original_path, os.path.join(self.test_folder_path, 'IMG_0766_copy.jpg'))
+
+        self.sort_test_files(folder_fanout.FolderFanout(threshold=5))
+
+        self.assertTrue(os.path.exists(os.path.join(os.path.dirname(original_path), 'IMG_0766_copy.jpg')))
+
+    def test_unknown_mode(self):
+        """
+        In this test case, a fan-out is created with an unknown mode.
+
+        We expect a ValueError to be raised.
+
+        :return:
+        """
+
+        with self.assertRaises(ValueError):
+            folder_fanout.FolderFanout(mode="minute")
+
+    def test_unsupported_scheme(self):
+        """
+        In this test case, the test files are sorted through sort_files with a fan-out, using the event sorting scheme
+        (whose folders are per event, rather than per day).
+
+        We expect a ValueError to be raised, naming the option, before anything is sorted.
+
+        :return:
+        """
+
+        with self.assertRaisesRegex(ValueError, "fanout"):
+            sort_image_files.sort_files(self.test_folder_path, self.test_folder_path, "*.*",
+                                        sort_image_files.sort_by_event, fanout=folder_fanout.FolderFanout())
+
+        self.assertFalse(os.path.exists(os.path.join(self.test_folder_path, '2020')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import group_commit
+import os
+import shutil
+import sort_image_files
+import unittest
+
+
+class TestGroupCommit(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted, and records the folders
+        which are flushed, as well as flushing them.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        self.fsync_folder = group_commit.fsync_folder
+        self.flushed = []
+
+        def record_fsync(folder_path):
+            self.flushed.append(folder_path)
+            self.fsync_folder(folder_path)
+
+        group_commit.fsync_folder = record_fsync
+        self.now = [0.0]
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        group_commit.fsync_folder = self.fsync_folder
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_sort_flushes_each_folder_once_per_batch(self):
+        """
+        In this test case, the test files are sorted, with batches of 4 moves.
+
+        We expect 3 batches (of the 9 files sorted), each flushing the source folder (which is also the destination
+        base folder), and the year, month, and day folders of its moves, once.
+
+        :return:
+        """
+
+        durability = group_commit.GroupCommit(batch_size=4, max_delay=60, clock=lambda: self.now[0])
+        file_list = sort_image_files.build_file_list(self.test_folder_path, "*.*")
+
+        results = sort_image_files.sort_hierarchical_by_date(file_list, self.test_folder_path, durability=durability)
+
+        self.assertEqual(len(results['success']), 9)
+        self.assertEqual(durability.commits, 3)
+        self.assertIn(os.path.join(self.test_folder_path, '2020', '01 - January', '17'), self.flushed)
+        self.assertEqual(self.flushed.count(self.test_folder_path), 3)
+        self.assertEqual(self.flushed.count(os.path.join(self.test_folder_path, '2020')), 3)
+        self.assertEqual(durability.failed_folders, [])
+
+    def test_batch_committed_after_max_delay(self):
+        """
+        In this test case, a move is recorded, and then another, after the batch's max_delay has passed.
+
+        We expect the batch to be committed on the second move, rather than waiting for a full batch.
+
+        :return:
+        """
+
+        durability = group_commit.GroupCommit(batch_size=100, max_delay=1.0, clock=lambda: self.now[0])
+        source_path = os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+
+        durability.record_move(source_path, source_path)
+        self.assertEqual(durability.commits, 0)
+
+        self.now[0] = 1.5
+        durability.record_move(source_path, source_path)
+        self.assertEqual(durability.commits, 1)
+        self.assertEqual(self.flushed, [self.test_folder_path])
+
+    def test_batch_committed_while_reads_stall(self):
+        """
+        In this test case, a file is sorted, and then the read of the next file (which has no metadata, so is not
+        moved) starts after the batch's max_delay has passed.
+
+        We expect the batch to be committed before that read, rather than waiting for the next move, or the end of the
+        sort.
+
+        :return:
+        """
+
+        durability = group_commit.GroupCommit(batch_size=100, max_delay=1.0, clock=lambda: self.now[0])
+        commits_after_stalled_read = []
+
+        def stalled_file_list():
+            yield os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+            self.now[0] = 1.5
+            yield os.path.join(self.test_folder_path, 'IMG_0839_no_metadata.JPG')
+            commits_after_stalled_read.append(durability.commits)
+
+        sort_image_files.sort_hierarchical_by_date(stalled_file_list(), self.test_folder_path, durability=durability)
+
+        self.assertEqual(commits_after_stalled_read, [1])
+        self.assertFalse(durability.commit_if_due())
+
+    def test_unflushable_folder_is_reported(self):
+        """
+        In this test case, a move is recorded out of a folder which no longer exists, and the batch committed.
+
+        We expect the commit to report the failure, and the folder to be recorded.
+
+        :return:
+        """
+
+        durability = group_commit.GroupCommit()
+        missing_path = os.path.join(self.test_folder_path, 'missing', 'IMG_0766.jpg')
+
+        durability.record_move(missing_path, os.path.join(self.test_folder_path, 'IMG_0766.jpg'))
+
+        self.assertFalse(durability.commit())
+        self.assertEqual(durability.failed_folders, [os.path.dirname(missing_path)])
+
+
+if __name__ == '__main__':
+    unittest.main()
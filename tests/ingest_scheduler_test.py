@@ -0,0 +1,264 @@
+import glob
+import ingest_scheduler
+import os
+import shutil
+import threading
+import unittest
+
+
+class FakeClock:
+    """
+    A clock which only moves when told to.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeScheme:
+    """
+    A sorting scheme which records each batch it is given, and takes a fixed time per file (on the fake clock).
+    """
+
+    def __init__(self, clock, file_cost):
+        self.clock = clock
+        self.file_cost = file_cost
+        self.batches = []
+
+    def __call__(self, file_list, destination_base_path):
+        self.batches.append(list(file_list))
+        self.clock.now += self.file_cost * len(file_list)
+        return {"success": list(file_list), "failure": {}}
+
+
+class TestIngestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        self.clock = FakeClock()
+        self.scheme = FakeScheme(self.clock, 0.1)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def create_scheduler(self, **kwargs):
+        return ingest_scheduler.IngestScheduler(self.test_folder_path, self.scheme, clock=self.clock, **kwargs)
+
+    def test_live_before_bulk(self):
+        """
+        In this test case, a bulk backfill is submitted, and then, once it has started, a live file.
+
+        We expect the live file to be sorted in the very next batch, ahead of the rest of the backfill.
+
+        :return:
+        """
+
+        scheduler = self.create_scheduler()
+        bulk_files = ["/backfill/{:04d}.jpg".format(i) for i in range(100)]
+        self.assertEqual([], scheduler.submit(bulk_files, ingest_scheduler.BULK))
+
+        scheduler.run_once()
+        scheduler.submit(["/live/new.jpg"])
+        scheduler.run_once()
+
+        self.assertEqual(["/live/new.jpg"], self.scheme.batches[1])
+        self.assertEqual(bulk_files[:len(self.scheme.batches[0])], self.scheme.batches[0])
+
+    def test_live_newest_first(self):
+        """
+        In this test case, several live files, with different modification times, are submitted, in order of age.
+
+        We expect the newest file to be sorted first.
+
+        :return:
+        """
+
+        file_paths = sorted(glob.glob(os.path.join(self.test_folder_path, "*.*")))[:3]
+        for age, file_path in enumerate(reversed(file_paths)):
+            os.utime(file_path, (1000000 - age, 1000000 - age))
+
+        scheduler = self.create_scheduler()
+        scheduler.submit(file_paths)
+        scheduler.run_once()
+
+        self.assertEqual(list(reversed(file_paths)), self.scheme.batches[0])
+
+    def test_bulk_batch_size(self):
+        """
+        In this test case, a large backfill is sorted, at 0.1 seconds per file, with a 5 second latency target.
+
+        We expect the first batch to be a single file (as the cost per file is not yet known), and the following
+        batches to be sized to half of the latency target (25 files), so that a live file never waits long.
+
+        :return:
+        """
+
+        scheduler = self.create_scheduler(latency_target=5.0)
+        scheduler.submit(["/backfill/{:04d}.jpg".format(i) for i in range(200)], ingest_scheduler.BULK)
+
+        while scheduler.run_once():
+            pass
+
+        self.assertEqual(1, len(self.scheme.batches[0]))
+        self.assertEqual(25, len(self.scheme.batches[1]))
+        self.assertLessEqual(max(len(batch) for batch in self.scheme.batches) * 0.1, 2.5 + 1e-9)
+        self.assertEqual(200, scheduler.get_status()['bulk_sorted'])
+
+    def test_latency_target(self):
+        """
+        In this test case, live files arrive (every second) during a large backfill.
+
+        We expect every live file to be sorted within the latency target, and the backfill to still be completed.
+
+        :return:
+        """
+
+        scheduler = self.create_scheduler(latency_target=5.0)
+        scheduler.submit(["/backfill/{:04d}.jpg".format(i) for i in range(1000)], ingest_scheduler.BULK)
+
+        next_arrival = 0.0
+        arrivals = 0
+        while True:
+            if self.clock.now >= next_arrival and arrivals < 50:
+                scheduler.submit(["/live/{:02d}.jpg".format(arrivals)])
+                arrivals += 1
+                next_arrival += 1.0
+            if not scheduler.run_once():
+                break
+
+        status = scheduler.get_status()
+        self.assertEqual(50, status['live_sorted'])
+        self.assertEqual(1000, status['bulk_sorted'])
+        self.assertEqual(0, status['missed_target'])
+        self.assertLessEqual(status['live_latency_max'], 5.0)
+
+    def test_bounded_queues(self):
+        """
+        In this test case, more files are submitted than the queues can hold.
+
+        We expect the files which do not fit to be rejected (and returned), and those which fit to be queued.
+
+        :return:
+        """
+
+        scheduler = self.create_scheduler(live_capacity=2, bulk_capacity=3)
+
+        self.assertEqual(["/live/3.jpg"], scheduler.submit(["/live/1.jpg", "/live/2.jpg", "/live/3.jpg"]))
+        self.assertEqual(["/bulk/4.jpg", "/bulk/5.jpg"],
+                         scheduler.submit(["/bulk/{}.jpg".format(i) for i in range(1, 6)], ingest_scheduler.BULK))
+
+        status = scheduler.get_status()
+        self.assertEqual(2, status['live_queued'])
+        self.assertEqual(3, status['bulk_queued'])
+
+        with self.assertRaises(ValueError):
+            scheduler.submit(["/live/1.jpg"], "urgent")
+
+    def test_run(self):
+        """
+        In this test case, the test files are submitted to a scheduler running on a background thread, which sorts
+        them into the hierarchical folder structure.
+
+        We expect the files with a capture date to be sorted, and the others to be recorded as failures.
+
+        :return:
+        """
+
+        file_paths = sorted(glob.glob(os.path.join(self.test_folder_path, "*.*")))
+        destination_path = os.path.join(self.test_folder_path, 'library')
+        os.mkdir(destination_path)
+        results = {"success": [], "failure": {}}
+
+        def record_batch(priority, batch_results):
+            results['success'].extend(batch_results['success'])
+            results['failure'].update(batch_results['failure'])
+
+        scheduler = ingest_scheduler.IngestScheduler(destination_path, on_batch=record_batch)
+        stop_event = threading.Event()
+        worker = threading.Thread(target=scheduler.run, args=(stop_event, 0.01))
+        worker.start()
+
+        try:
+            scheduler.submit(file_paths[:5])
+            scheduler.submit(file_paths[5:], ingest_scheduler.BULK)
+            while True:
+                status = scheduler.get_status()
+                if status['live_sorted'] + status['bulk_sorted'] == len(file_paths):
+                    break
+                stop_event.wait(0.01)
+
+        finally:
+            stop_event.set()
+            worker.join()
+
+        self.assertEqual(len(file_paths), len(results['success']) + len(results['failure']))
+        self.assertEqual(scheduler.get_status()['failed'], len(results['failure']))
+        self.assertIn(os.path.join(self.test_folder_path, 'IMG_0000_invalid.JPG'), results['failure'])
+        self.assertTrue(glob.glob(os.path.join(destination_path, "*", "*", "*", "*.*")))
+
+    def test_scheme_error_does_not_stop_worker(self):
+        """
+        In this test case, the sorting scheme raises an error on its first batch, while the scheduler runs on a
+        background thread.
+
+        We expect the batch's files to be recorded as failed, and the worker to carry on, sorting the next batch.
+
+        :return:
+        """
+
+        batches = []
+
+        def failing_scheme(file_list, destination_base_path):
+            batches.append(list(file_list))
+            if len(batches) == 1:
+                raise OSError(5, "Input/output error")
+            return {"success": list(file_list), "failure": {}}
+
+        failures = {}
+        scheduler = ingest_scheduler.IngestScheduler(
+            self.test_folder_path, failing_scheme, on_batch=lambda priority, results: failures.update(
+                results['failure']))
+        stop_event = threading.Event()
+        worker = threading.Thread(target=scheduler.run, args=(stop_event, 0.01))
+        worker.start()
+
+        try:
+            scheduler.submit(["/live/1.jpg"])
+            while scheduler.get_status()['live_sorted'] < 1:
+                stop_event.wait(0.01)
+            scheduler.submit(["/live/2.jpg"])
+            while scheduler.get_status()['live_sorted'] < 2:
+                stop_event.wait(0.01)
+            self.assertTrue(worker.is_alive())
+
+        finally:
+            stop_event.set()
+            worker.join()
+
+        self.assertEqual(batches, [["/live/1.jpg"], ["/live/2.jpg"]])
+        self.assertEqual(list(failures), ["/live/1.jpg"])
+        self.assertEqual(failures["/live/1.jpg"].kind, "transient")
+        self.assertEqual(scheduler.get_status()['failed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
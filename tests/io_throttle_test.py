@@ -0,0 +1,221 @@
+import io_throttle
+import json
+import os
+import shutil
+import sort_image_files
+import unittest
+
+
+class FakeClock:
+    """
+    A clock which only moves forward when slept on, so that throttling can be tested without waiting.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.delays = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.delays.append(delay)
+        self.now += delay
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_rate_is_limited(self):
+        """
+        In this test case, 10 operations are taken from a bucket limited to 2 per second.
+
+        We expect the first 2 (the burst) to pass straight through, and the remaining 8 to take 4 seconds.
+
+        :return:
+        """
+
+        bucket = io_throttle.TokenBucket(2, sleep=self.clock.sleep, clock=self.clock)
+
+        for _ in range(10):
+            bucket.acquire()
+
+        self.assertAlmostEqual(self.clock.now, 4.0)
+
+    def test_large_request_goes_into_debt(self):
+        """
+        In this test case, a read of 3000 bytes is taken from a bucket limited to 1000 bytes per second.
+
+        We expect the read to be let through, after waiting for the 2000 bytes beyond the burst.
+
+        :return:
+        """
+
+        bucket = io_throttle.TokenBucket(1000, sleep=self.clock.sleep, clock=self.clock)
+
+        self.assertAlmostEqual(bucket.acquire(3000), 2.0)
+
+    def test_no_limit(self):
+        """
+        In this test case, operations are taken from a bucket without a rate.
+
+        We expect them never to wait.
+
+        :return:
+        """
+
+        bucket = io_throttle.TokenBucket(None, sleep=self.clock.sleep, clock=self.clock)
+
+        for _ in range(1000):
+            bucket.acquire()
+
+        self.assertEqual(self.clock.delays, [])
+
+    def test_invalid_rate_is_rejected(self):
+        """
+        In this test case, buckets are created with a rate of 0, a negative rate, and a rate which is not a number.
+
+        We expect each to be rejected, rather than treated as no limit.
+
+        :return:
+        """
+
+        for rate in (0, -5, "fast", True):
+            with self.assertRaises(ValueError):
+                io_throttle.TokenBucket(rate, sleep=self.clock.sleep, clock=self.clock)
+
+
+class TestIoThrottle(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        self.control_path = os.path.join(self.test_folder_path, 'throttle.json')
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_control_file_changes_rates(self):
+        """
+        In this test case, the control file is rewritten while the throttle is in use, and then checked.
+
+        We expect the new rates to be used from then on.
+
+        :return:
+        """
+
+        throttle = io_throttle.IoThrottle(operations_per_second=1, control_path=self.control_path,
+                                          sleep=self.clock.sleep, clock=self.clock)
+        with open(self.control_path, 'w') as control_file:
+            json.dump({"operations_per_second": 100, "bytes_per_second": 5000}, control_file)
+
+        throttle.file_operation()
+
+        self.assertEqual(throttle.operations.rate, 100)
+        self.assertEqual(throttle.bytes.rate, 5000)
+        self.assertIsNone(throttle.metadata_operations.rate)
+
+    def test_control_file_keeps_omitted_rates(self):
+        """
+        In this test case, the control file only sets the byte rate, of a throttle which also limits operations.
+
+        We expect the operation rates to be left as they were.
+
+        :return:
+        """
+
+        throttle = io_throttle.IoThrottle(operations_per_second=10, metadata_operations_per_second=20,
+                                          control_path=self.control_path, sleep=self.clock.sleep, clock=self.clock)
+        with open(self.control_path, 'w') as control_file:
+            json.dump({"bytes_per_second": 1000}, control_file)
+
+        self.assertTrue(throttle.load_control_file())
+        self.assertEqual(throttle.bytes.rate, 1000)
+        self.assertEqual(throttle.operations.rate, 10)
+        self.assertEqual(throttle.metadata_operations.rate, 20)
+
+    def test_invalid_control_file_keeps_rates(self):
+        """
+        In this test case, the control file is rewritten with contents which are not valid: a JSON list, a rate which
+        is not a number, and a rate of 0.
+
+        We expect each to be ignored, leaving the previous rates in place, and the throttle to keep working.
+
+        :return:
+        """
+
+        throttle = io_throttle.IoThrottle(bytes_per_second=1000, operations_per_second=10,
+                                          control_path=self.control_path, sleep=self.clock.sleep, clock=self.clock)
+
+        for contents in ([1, 2], {"bytes_per_second": 5000, "operations_per_second": "fast"},
+                         {"operations_per_second": 0}):
+            with open(self.control_path, 'w') as control_file:
+                json.dump(contents, control_file)
+            throttle.control_mtime = None
+
+            self.assertFalse(throttle.load_control_file())
+            self.assertEqual(throttle.bytes.rate, 1000)
+            self.assertEqual(throttle.operations.rate, 10)
+
+        throttle.file_operation()
+
+    def test_read_exif_data_reads_header_only(self):
+        """
+        In this test case, the EXIF metadata is read from a JPEG file, through the throttle.
+
+        We expect only the header to be charged (far less than the whole file), and the same date to be parsed as from
+        the file itself.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+        throttle = io_throttle.IoThrottle(bytes_per_second=1000, sleep=self.clock.sleep, clock=self.clock)
+
+        exif = throttle.read_exif_data(file_path)
+        charged = throttle.bytes.burst - throttle.bytes.tokens
+
+        self.assertLess(charged, os.path.getsize(file_path))
+        self.assertEqual(sort_image_files.read_capture_datetime(exif),
+                         sort_image_files.read_capture_datetime(file_path))
+
+    def test_throttled_sort(self):
+        """
+        In this test case, the test files are sorted, limited to 5 file operations per second.
+
+        We expect the same results as an unthrottled sort, with 20 file operations (11 reads and 9 moves) taking 3
+        seconds beyond the burst.
+
+        :return:
+        """
+
+        throttle = io_throttle.IoThrottle(operations_per_second=5, sleep=self.clock.sleep, clock=self.clock)
+        file_list = sort_image_files.build_file_list(self.test_folder_path, "*.*")
+
+        results = sort_image_files.sort_hierarchical_by_date(file_list, self.test_folder_path, throttle=throttle)
+
+        self.assertEqual(len(results['success']), 9)
+        self.assertEqual(len(results['failure']), 2)
+        self.assertAlmostEqual(self.clock.now, 3.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
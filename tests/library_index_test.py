@@ -0,0 +1,239 @@
+import os
+import shutil
+import library_index
+import sort_image_files
+import unittest
+
+
+class TestNormalizeIndexDatetime(unittest.TestCase):
+
+    def test_datetime_string_well_formed(self):
+        """
+        In this test case, a well formed EXIF datetime string has been provided.
+
+        We expect the date separators to be converted, so that the value sorts correctly as text.
+
+        :return:
+        """
+
+        datetime_string = '2020:01:15 18:00:41'
+        expected_result = '2020-01-15 18:00:41'
+        actual_result = library_index.normalize_index_datetime(datetime_string)
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_datetime_string_missing_time(self):
+        """
+        In this test case, the time portion has been excluded, and only the date components are present.
+
+        We expect the time to default to midnight.
+
+        :return:
+        """
+
+        datetime_string = '2020:01:15'
+        expected_result = '2020-01-15 00:00:00'
+        actual_result = library_index.normalize_index_datetime(datetime_string)
+
+        self.assertEqual(actual_result, expected_result)
+
+
+class TestLibraryIndexQueries(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a clean 'test_folder' folder, containing a few small files that are recorded in a fresh index.
+
+        :return:
+        """
+
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        os.mkdir(self.test_folder_path)
+
+        self.index = library_index.open_library_index(os.path.join(self.test_folder_path, 'index.sqlite'))
+
+        dates = {'a.jpg': '2020:01:15 18:00:41', 'b.jpg': '2020:01:15 20:00:00', 'c.jpg': '2020:01:17 09:30:00'}
+        for filename, creation_date in dates.items():
+            file_path = os.path.join(self.test_folder_path, filename)
+            with open(file_path, 'wb') as file:
+                file.write(filename.encode('utf-8'))
+            library_index.record_sorted_file(self.index, '/source/' + filename, file_path, creation_date)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        self.index.close()
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_find_files_between_days(self):
+        """
+        In this test case, a date range covering only the first day is queried.
+
+        We expect both files captured on that day (and only those) to be returned, in capture order.
+
+        :return:
+        """
+
+        expected_result = [os.path.join(self.test_folder_path, 'a.jpg'), os.path.join(self.test_folder_path, 'b.jpg')]
+        actual_result = [row[0] for row in library_index.find_files_between(self.index, '2020-01-15', '2020-01-15')]
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_find_files_between_datetimes(self):
+        """
+        In this test case, a datetime range which excludes the evening of the first day is queried.
+
+        We expect only the earlier file to be returned.
+
+        :return:
+        """
+
+        expected_result = [os.path.join(self.test_folder_path, 'a.jpg')]
+        rows = library_index.find_files_between(self.index, '2020-01-15 00:00:00', '2020-01-15 19:00:00')
+        actual_result = [row[0] for row in rows]
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_count_files_per_day(self):
+        """
+        In this test case, the per day counts are requested for the whole index.
+
+        We expect a count for each day on which files were captured.
+
+        :return:
+        """
+
+        expected_result = {'2020-01-15': 2, '2020-01-17': 1}
+        actual_result = library_index.count_files_per_day(self.index)
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_record_sorted_file_size_and_hash(self):
+        """
+        In this test case, the size and hash of a recorded file are inspected.
+
+        We expect them to match the file contents.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'c.jpg')
+        rows = library_index.find_files_between(self.index, '2020-01-17', '2020-01-17')
+        expected_result = [(file_path, '2020-01-17 09:30:00', 5, library_index.compute_file_hash(file_path))]
+
+        self.assertEqual(rows, expected_result)
+
+    def test_record_sorted_file_batched_commits(self):
+        """
+        In this test case, fewer files than a batch are recorded, and the index is then closed and reopened.
+
+        We expect the entries to be held in an open transaction until the index is closed, and to be kept by the close.
+
+        :return:
+        """
+
+        self.assertTrue(self.index.in_transaction)
+        self.assertEqual(self.index.pending, 3)
+
+        index_path = os.path.join(self.test_folder_path, 'index.sqlite')
+        self.index.close()
+        self.index = library_index.open_library_index(index_path)
+
+        self.assertEqual(library_index.count_files_per_day(self.index), {'2020-01-15': 2, '2020-01-17': 1})
+
+    def test_record_sorted_file_commits_full_batch(self):
+        """
+        In this test case, the batch size is lowered to the number of files already recorded, and one more is recorded.
+
+        We expect the batch to be committed, leaving no open transaction.
+
+        :return:
+        """
+
+        self.addCleanup(setattr, library_index, 'COMMIT_BATCH_SIZE', library_index.COMMIT_BATCH_SIZE)
+        library_index.COMMIT_BATCH_SIZE = 4
+
+        file_path = os.path.join(self.test_folder_path, 'd.jpg')
+        with open(file_path, 'wb') as file:
+            file.write(b'd.jpg')
+        library_index.record_sorted_file(self.index, '/source/d.jpg', file_path, '2020:01:18 10:00:00')
+
+        self.assertFalse(self.index.in_transaction)
+        self.assertEqual(self.index.pending, 0)
+
+
+class TestSortFilesWithIndex(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_sort_files_records_index(self):
+        """
+        In this test case, the test files are sorted with an index path provided.
+
+        We expect every successfully sorted file to be recorded in the index.
+
+        :return:
+        """
+
+        index_path = os.path.join(self.test_folder_path, 'index.sqlite')
+        results = sort_image_files.sort_files(self.test_folder_path, self.test_folder_path, "*.*",
+                                              sort_image_files.sort_hierarchical_by_date, index_path=index_path)
+
+        index = library_index.open_library_index(index_path)
+        try:
+            expected_result = len(results['success'])
+            actual_result = sum(library_index.count_files_per_day(index).values())
+        finally:
+            index.close()
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_index_failure_after_move(self):
+        """
+        In this test case, the test files are sorted with an index connection which has already been closed, so that
+        every index write fails after its file has been moved.
+
+        We expect each moved file to be reported only as sorted (not as a failed move), and the failure to record it to
+        be reported under 'bookkeeping_failures'.
+
+        :return:
+        """
+
+        index = library_index.open_library_index(os.path.join(self.test_folder_path, 'index.sqlite'))
+        index.close()
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+        results = sort_image_files.sort_hierarchical_by_date([file_path], self.test_folder_path, index=index)
+
+        self.assertEqual([file_path], results['success'])
+        self.assertEqual({}, results['failure'])
+        self.assertEqual("bookkeeping", results['bookkeeping_failures'][file_path].kind)
+        self.assertFalse(os.path.exists(file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
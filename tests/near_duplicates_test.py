@@ -0,0 +1,203 @@
+import near_duplicates
+import os
+import piexif
+import random
+import shutil
+import sort_image_files
+import unittest
+
+
+class TestThumbnailHash(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.thumbnail = piexif.load(os.path.join(self.test_data_folder_path, 'IMG_0766.jpg'))['thumbnail']
+
+    def test_decode_dc_luma(self):
+        """
+        In this test case, the DC coefficients of a 160x120 EXIF thumbnail are decoded.
+
+        We expect a 20x15 image (one pixel per 8x8 block), of brightness values.
+
+        :return:
+        """
+
+        image = near_duplicates.decode_dc_luma(self.thumbnail)
+
+        self.assertEqual(len(image), 15)
+        self.assertTrue(all(len(row) == 20 for row in image))
+        self.assertTrue(all(0 <= value <= 255 for row in image for value in row))
+
+    def test_requantized_thumbnail_hash(self):
+        """
+        In this test case, the thumbnail is re-quantized (its luma DC quantization step coarsened, as a re-encoding at
+        a lower quality would), and both versions are hashed.
+
+        We expect the hashes to be within the near-duplicate distance.
+
+        :return:
+        """
+
+        position = self.thumbnail.index(b"\xff\xdb")
+        requantized = bytearray(self.thumbnail)
+        requantized[position + 5] += 1
+
+        distance = near_duplicates.hamming_distance(near_duplicates.compute_thumbnail_hash(self.thumbnail),
+                                                    near_duplicates.compute_thumbnail_hash(bytes(requantized)))
+
+        self.assertLessEqual(distance, near_duplicates.DEFAULT_MAX_DISTANCE)
+
+    def test_invalid_thumbnail(self):
+        """
+        In this test case, data which is not a JPEG is hashed.
+
+        We expect a ValueError to be raised.
+
+        :return:
+        """
+
+        with self.assertRaises(ValueError):
+            near_duplicates.compute_thumbnail_hash(b"This is not a valid JPEG file.")
+
+    def test_invalid_frame_size(self):
+        """
+        In this test case, the thumbnail's frame header is patched, to a width of 0, and then to an oversized width.
+
+        We expect a ValueError to be raised for each (rather than a ZeroDivisionError, or a huge allocation).
+
+        :return:
+        """
+
+        position = self.thumbnail.index(b"\xff\xc0")
+
+        for width in (b"\x00\x00", b"\xff\xff"):
+            patched = bytearray(self.thumbnail)
+            patched[position + 7:position + 9] = width
+
+            with self.assertRaises(ValueError):
+                near_duplicates.compute_thumbnail_hash(bytes(patched))
+
+    def test_huffman_table_cache_is_bounded(self):
+        """
+        In this test case, more distinct Huffman tables are built than the cache holds (as an encoder writing optimized
+        tables, different for each image, would).
+
+        We expect the cache to stay within its size, keeping the most recently used tables.
+
+        :return:
+        """
+
+        counts = bytes([0, 1] + [0] * 14)
+        for value in range(near_duplicates.HUFFMAN_TABLE_CACHE_SIZE * 2):
+            table = near_duplicates.get_huffman_table(counts, bytes([value]))
+
+        self.assertLessEqual(len(near_duplicates.HUFFMAN_TABLES), near_duplicates.HUFFMAN_TABLE_CACHE_SIZE)
+        self.assertIs(near_duplicates.get_huffman_table(counts, bytes([value])), table)
+
+
+class TestBKTree(unittest.TestCase):
+
+    def test_search_matches_brute_force(self):
+        """
+        In this test case, 500 random hashes are added to a tree, which is then searched around other random hashes.
+
+        We expect the same matches as comparing against every hash.
+
+        :return:
+        """
+
+        generator = random.Random(1)
+        values = [generator.getrandbits(64) for _ in range(500)]
+        tree = near_duplicates.BKTree()
+        for position, value in enumerate(values):
+            tree.add(value, position)
+
+        for _ in range(20):
+            query = values[generator.randrange(len(values))] ^ generator.getrandbits(64) & generator.getrandbits(64)
+            expected_result = sorted(position for position, value in enumerate(values)
+                                     if near_duplicates.hamming_distance(query, value) <= 24)
+            actual_result = sorted(position for _, position in tree.search(query, 24))
+
+            self.assertEqual(actual_result, expected_result)
+
+
+class TestSortWithDuplicateDetector(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted, along with a copy of one
+        of the files.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+        shutil.copy(os.path.join(self.test_folder_path, 'IMG_0766.jpg'),
+                    os.path.join(self.test_folder_path, 'IMG_0766_copy.jpg'))
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_copy_is_flagged(self):
+        """
+        In this test case, the test files (all different photos), and the copy, are sorted with a duplicate detector.
+
+        We expect only the copy to be flagged, as a near-duplicate of the original, and every file to be sorted.
+
+        :return:
+        """
+
+        file_list = sorted(sort_image_files.build_file_list(self.test_folder_path, "*.*"))
+        detector = near_duplicates.NearDuplicateDetector()
+
+        results = sort_image_files.sort_hierarchical_by_date(file_list, self.test_folder_path,
+                                                             duplicate_detector=detector)
+
+        self.assertEqual(results['near_duplicates'], {
+            os.path.join(self.test_folder_path, 'IMG_0766_copy.jpg'): [
+                os.path.join(self.test_folder_path, 'IMG_0766.jpg')],
+        })
+        self.assertEqual(len(results['success']), 10)
+        self.assertEqual(detector.tree.size, 10)
+
+    def test_malformed_thumbnail_does_not_abort_sort(self):
+        """
+        In this test case, the copy's thumbnail is patched to a frame width of 0, and the test files are sorted with a
+        duplicate detector.
+
+        We expect the copy to be sorted, but not hashed (and not flagged), and the sort to carry on with the other
+        files.
+
+        :return:
+        """
+
+        copy_path = os.path.join(self.test_folder_path, 'IMG_0766_copy.jpg')
+        exif_dict = piexif.load(copy_path)
+        position = exif_dict['thumbnail'].index(b"\xff\xc0")
+        thumbnail = bytearray(exif_dict['thumbnail'])
+        thumbnail[position + 7:position + 9] = b"\x00\x00"
+        exif_dict['thumbnail'] = bytes(thumbnail)
+        piexif.insert(piexif.dump(exif_dict), copy_path)
+
+        file_list = sorted(sort_image_files.build_file_list(self.test_folder_path, "*.*"), reverse=True)
+        detector = near_duplicates.NearDuplicateDetector()
+
+        results = sort_image_files.sort_hierarchical_by_date(file_list, self.test_folder_path,
+                                                             duplicate_detector=detector)
+
+        self.assertNotIn('near_duplicates', results)
+        self.assertEqual(len(results['success']), 10)
+        self.assertEqual(detector.unhashed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
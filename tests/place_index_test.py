@@ -0,0 +1,172 @@
+import os
+import piexif
+import place_index
+import shutil
+import unittest
+
+
+GAZETTEER_LINES = [
+    "2988507\tParis\tParis\t\t48.85341\t2.3488\tP\tPPLC\tFR",
+    "2643743\tLondon\tLondon\t\t51.50853\t-0.12574\tP\tPPLC\tGB",
+    "5128581\tNew York City\tNew York City\t\t40.71427\t-74.00597\tP\tPPL\tUS",
+    "2147714\tSydney\tSydney\t\t-33.86785\t151.20732\tP\tPPLA\tAU",
+    "2172517\tCanberra\tCanberra\t\t-35.28346\t149.12807\tP\tPPLC\tAU",
+    "not a place",
+]
+
+
+def to_gps_rational(degrees):
+    """
+    Converts a (positive) number of degrees into EXIF degrees, minutes, and seconds rationals.
+    """
+
+    minutes, seconds = divmod(round(degrees * 3600 * 100), 6000)
+    return (int(minutes // 60), 1), (int(minutes % 60), 1), (int(seconds), 100)
+
+
+def build_gps(latitude, longitude):
+    return {piexif.GPSIFD.GPSLatitudeRef: b"N" if latitude >= 0 else b"S",
+            piexif.GPSIFD.GPSLatitude: to_gps_rational(abs(latitude)),
+            piexif.GPSIFD.GPSLongitudeRef: b"E" if longitude >= 0 else b"W",
+            piexif.GPSIFD.GPSLongitude: to_gps_rational(abs(longitude))}
+
+
+class TestPlaceIndex(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a clean 'test_folder' folder, containing a small gazetteer.
+
+        :return:
+        """
+
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        os.mkdir(self.test_folder_path)
+
+        self.gazetteer_path = os.path.join(self.test_folder_path, 'cities.txt')
+        with open(self.gazetteer_path, 'w', encoding='utf-8') as gazetteer_file:
+            gazetteer_file.write("\n".join(GAZETTEER_LINES) + "\n")
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_nearest_place(self):
+        """
+        In this test case, the places nearest to a few positions are looked up.
+
+        We expect the nearest city (in the gazetteer) to each, with its distance.
+
+        :return:
+        """
+
+        index = place_index.load_place_index(self.gazetteer_path)
+
+        place, distance = index.nearest(48.8584, 2.2945)
+        self.assertEqual(place, ('FR', 'Paris'))
+        self.assertAlmostEqual(distance, 4.2, delta=0.2)
+        self.assertEqual(index.nearest(-35.0, 149.0)[0], ('AU', 'Canberra'))
+        self.assertEqual(index.nearest(40.0, -73.0)[0], ('US', 'New York City'))
+
+    def test_cache(self):
+        """
+        In this test case, the place index is loaded twice, and then again after the gazetteer has changed.
+
+        We expect the index to be written to the cache, and read back the same, until the gazetteer changes.
+
+        :return:
+        """
+
+        index = place_index.load_place_index(self.gazetteer_path)
+        cached_index = place_index.load_place_index(self.gazetteer_path)
+
+        self.assertTrue(os.path.exists(self.gazetteer_path + '.kdtree'))
+        self.assertEqual(cached_index.names, index.names)
+        self.assertEqual(list(cached_index.points), list(index.points))
+
+        with open(self.gazetteer_path, 'a', encoding='utf-8') as gazetteer_file:
+            gazetteer_file.write("2950159\tBerlin\tBerlin\t\t52.52437\t13.41053\tP\tPPLC\tDE\n")
+
+        self.assertEqual(place_index.load_place_index(self.gazetteer_path).nearest(52.5, 13.4)[0], ('DE', 'Berlin'))
+
+    def test_read_gps_position(self):
+        """
+        In this test case, positions are read from a GPS IFD in the southern and western hemispheres, and from EXIF
+        metadata without one.
+
+        We expect the signed position, in degrees, or None.
+
+        :return:
+        """
+
+        latitude, longitude = place_index.read_gps_position({"GPS": build_gps(-33.86785, -74.00597)})
+
+        self.assertAlmostEqual(latitude, -33.86785, places=4)
+        self.assertAlmostEqual(longitude, -74.00597, places=4)
+        self.assertIsNone(place_index.read_gps_position({"GPS": {}}))
+
+
+class TestSortByLocation(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, and gives two of the files positions (one near Paris,
+        and one in the middle of the Pacific).
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        for filename, position in (('IMG_0766.jpg', (48.8584, 2.2945)), ('IMG_0797.JPG', (0.0, -140.0))):
+            file_path = os.path.join(self.test_folder_path, filename)
+            exif_dict = piexif.load(file_path)
+            exif_dict['GPS'] = build_gps(*position)
+            exif_dict['thumbnail'] = None
+            piexif.insert(piexif.dump(exif_dict), file_path)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_sort_by_location(self):
+        """
+        In this test case, the file near Paris, the file in the Pacific, and a file without a position are sorted.
+
+        We expect the first in 'FR/Paris', the second in 'Unknown/Unknown', and the third to fail.
+
+        :return:
+        """
+
+        gazetteer_path = os.path.join(self.test_folder_path, 'cities.txt')
+        with open(gazetteer_path, 'w', encoding='utf-8') as gazetteer_file:
+            gazetteer_file.write("\n".join(GAZETTEER_LINES) + "\n")
+
+        file_list = [os.path.join(self.test_folder_path, filename)
+                     for filename in ('IMG_0766.jpg', 'IMG_0797.JPG', 'IMG_0801.JPG')]
+
+        results = place_index.sort_by_location(file_list, self.test_folder_path,
+                                               place_index.load_place_index(gazetteer_path))
+
+        self.assertEqual(results['success'], file_list[:2])
+        self.assertEqual(results['failure'], {file_list[2]: "Unable to extract position from EXIF metadata."})
+        self.assertTrue(os.path.exists(os.path.join(self.test_folder_path, 'FR', 'Paris', 'IMG_0766.jpg')))
+        self.assertTrue(os.path.exists(os.path.join(self.test_folder_path, 'Unknown', 'Unknown', 'IMG_0797.JPG')))
+
+
+if __name__ == '__main__':
+    unittest.main()
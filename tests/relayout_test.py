@@ -0,0 +1,163 @@
+import datetime
+import library_index
+import os
+import relayout
+import shutil
+import sort_image_files
+import unittest
+
+
+class TestParseFolderDate(unittest.TestCase):
+
+    def test_folder_dates(self):
+        """
+        In this test case, the dates of folders in each of the sorting schemes' layouts are parsed.
+
+        We expect the day of day and event folders, and the hour of split day folders.
+
+        :return:
+        """
+
+        self.assertEqual(relayout.parse_folder_date(['2020', '01 - January', '22']), datetime.datetime(2020, 1, 22))
+        self.assertEqual(relayout.parse_folder_date(['2020', '01 - January', '22 - event 2']),
+                         datetime.datetime(2020, 1, 22))
+        self.assertEqual(relayout.parse_folder_date(['2020', '01 - January', '22', '18h']),
+                         datetime.datetime(2020, 1, 22, 18))
+        self.assertEqual(relayout.parse_folder_date(['2020', '2020-01-22']), datetime.datetime(2020, 1, 22))
+
+    def test_folders_without_dates(self):
+        """
+        In this test case, folders which are not day folders (or are not valid dates) are parsed.
+
+        We expect no date for any of them.
+
+        :return:
+        """
+
+        self.assertIsNone(relayout.parse_folder_date([]))
+        self.assertIsNone(relayout.parse_folder_date(['2020', '01 - January']))
+        self.assertIsNone(relayout.parse_folder_date(['2020', '02 - February', '30']))
+        self.assertIsNone(relayout.parse_folder_date(['imports', '01', '22']))
+        self.assertIsNone(relayout.parse_folder_date(['2019', '2020-01-22']))
+        self.assertIsNone(relayout.parse_folder_date(['2020', '2020-02-30']))
+
+
+class TestRelayoutLibrary(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, and sorts it into the hierarchical folder structure,
+        recording the sorted files in an index.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        self.index = library_index.open_library_index(os.path.join(self.test_folder_path, 'index.sqlite'))
+        file_list = sort_image_files.build_file_list(self.test_folder_path, "*.*")
+        sort_image_files.sort_hierarchical_by_date(file_list, self.test_folder_path, index=self.index)
+
+        self.month_folder_path = os.path.join(self.test_folder_path, '2020', '01 - January')
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        self.index.close()
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_relayout_renames_folders(self):
+        """
+        In this test case, the library is re-arranged into ISO date folders, from its folder structure alone.
+
+        We expect each day folder to be renamed as a whole, the emptied month folder to be removed, and the files which
+        were not sorted to be left in place.
+
+        :return:
+        """
+
+        results = relayout.relayout_library(self.test_folder_path, relayout.iso_date_layout)
+
+        self.assertEqual(results['renamed_folders'], {
+            os.path.join(self.month_folder_path, '15'): os.path.join(self.test_folder_path, '2020', '2020-01-15'),
+            os.path.join(self.month_folder_path, '17'): os.path.join(self.test_folder_path, '2020', '2020-01-17'),
+        })
+        self.assertEqual(len(results['success']), 9)
+        self.assertEqual(results['failure'], {})
+        self.assertFalse(os.path.exists(self.month_folder_path))
+        self.assertEqual(os.listdir(os.path.join(self.test_folder_path, '2020', '2020-01-17')), ['IMG_0839.JPG'])
+        self.assertTrue(os.path.exists(os.path.join(self.test_folder_path, 'IMG_0000_invalid.JPG')))
+        self.assertIn(os.path.join(self.test_folder_path, 'IMG_0000_invalid.JPG'), results['unknown'])
+
+    def test_relayout_iso_date_round_trip(self):
+        """
+        In this test case, the library is re-arranged into ISO date folders, and then back into the hierarchical folder
+        structure, from its folder structure alone.
+
+        We expect the second re-layout to read the dates back from the ISO date folders, and to restore the original
+        day folders.
+
+        :return:
+        """
+
+        relayout.relayout_library(self.test_folder_path, relayout.iso_date_layout)
+        results = relayout.relayout_library(self.test_folder_path, relayout.date_layout)
+
+        self.assertEqual(len(results['success']), 9)
+        self.assertEqual(results['failure'], {})
+        self.assertEqual(os.listdir(os.path.join(self.month_folder_path, '17')), ['IMG_0839.JPG'])
+        self.assertFalse(os.path.exists(os.path.join(self.test_folder_path, '2020', '2020-01-15')))
+
+    def test_relayout_moves_files(self):
+        """
+        In this test case, the library is re-arranged into month folders (the parents of the existing day folders).
+
+        We expect the files to be moved individually, and the emptied day folders to be removed.
+
+        :return:
+        """
+
+        results = relayout.relayout_library(self.test_folder_path, relayout.month_layout)
+
+        self.assertEqual(results['renamed_folders'], {})
+        self.assertEqual(len(results['success']), 9)
+        self.assertEqual(len(os.listdir(self.month_folder_path)), 9)
+
+    def test_relayout_from_index(self):
+        """
+        In this test case, the library is re-arranged into hour folders, which needs the time of each photo (only known
+        from the index), and then re-arranged again into the same layout.
+
+        We expect each file to be moved into its hour's folder, the index to be updated with the new paths, and nothing
+        to move the second time.
+
+        :return:
+        """
+
+        def hour_layout(capture_datetime, filename):
+            return relayout.date_layout(capture_datetime, filename) + ["{:02d}h".format(capture_datetime.hour)]
+
+        results = relayout.relayout_library(self.test_folder_path, hour_layout, self.index)
+        indexed_files = library_index.find_files_under(self.index, self.test_folder_path)
+
+        self.assertEqual(len(results['success']), 9)
+        self.assertEqual(len(indexed_files), 9)
+        for file_path, capture_datetime in indexed_files.items():
+            self.assertTrue(os.path.exists(file_path))
+            self.assertEqual(os.path.basename(os.path.dirname(file_path)), capture_datetime[11:13] + "h")
+
+        results = relayout.relayout_library(self.test_folder_path, hour_layout, self.index)
+
+        self.assertEqual(results['success'], [])
+        self.assertEqual(results['unchanged'], 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
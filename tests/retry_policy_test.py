@@ -0,0 +1,223 @@
+import errno
+import os
+import retry_policy
+import shutil
+import sort_image_files
+import unittest
+
+
+class FlakyOperation:
+    """
+    An operation which fails with the provided error a fixed number of times, before succeeding.
+    """
+
+    def __init__(self, failures, error_number=errno.ESTALE):
+        self.failures = failures
+        self.error_number = error_number
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError(self.error_number, os.strerror(self.error_number))
+        return "done"
+
+
+class TestClassifyError(unittest.TestCase):
+
+    def test_transient_errors(self):
+        """
+        In this test case, the error numbers raised by a flaky NFS mount are classified.
+
+        We expect each of them to be classified as transient.
+
+        :return:
+        """
+
+        for error_number in (errno.EIO, errno.ESTALE, errno.EAGAIN):
+            self.assertEqual(retry_policy.classify_error(OSError(error_number, "")), retry_policy.TRANSIENT)
+
+    def test_permanent_errors(self):
+        """
+        In this test case, a missing file, a missing tag, and a parsing error are classified.
+
+        We expect none of them to be classified as transient.
+
+        :return:
+        """
+
+        self.assertEqual(retry_policy.classify_error(FileNotFoundError(errno.ENOENT, "")), retry_policy.IO_ERROR)
+        self.assertEqual(retry_policy.classify_error(KeyError(36867)), retry_policy.MISSING_METADATA)
+        self.assertEqual(retry_policy.classify_error(ValueError("bad data")), retry_policy.CORRUPT)
+
+    def test_sort_failure_compares_as_message(self):
+        """
+        In this test case, a SortFailure is compared with its plain message.
+
+        We expect them to be equal, with the kind still available on the failure.
+
+        :return:
+        """
+
+        failure = retry_policy.SortFailure("Error moving file: x", retry_policy.TRANSIENT)
+
+        self.assertEqual(failure, "Error moving file: x")
+        self.assertTrue(failure.transient)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.delays = []
+        self.now = [0.0]
+        self.policy = retry_policy.RetryPolicy(max_attempts=3, minimum_calls=4, window=4, cooldown=10,
+                                               sleep=self.delays.append, clock=lambda: self.now[0])
+
+    def test_transient_failure_is_retried(self):
+        """
+        In this test case, an operation fails transiently twice, and then succeeds.
+
+        We expect it to be retried (with bounded delays), and its result returned.
+
+        :return:
+        """
+
+        operation = FlakyOperation(2)
+
+        self.assertEqual(self.policy.call(__file__, operation), "done")
+        self.assertEqual(operation.calls, 3)
+        self.assertEqual(len(self.delays), 2)
+        self.assertTrue(all(0 <= delay <= self.policy.max_delay for delay in self.delays))
+
+    def test_retries_are_bounded(self):
+        """
+        In this test case, an operation keeps failing transiently.
+
+        We expect it to be attempted max_attempts times, and then for the error to be raised.
+
+        :return:
+        """
+
+        operation = FlakyOperation(10)
+
+        with self.assertRaises(OSError):
+            self.policy.call(__file__, operation)
+        self.assertEqual(operation.calls, 3)
+
+    def test_permanent_failure_is_not_retried(self):
+        """
+        In this test case, an operation fails with an error which is not transient.
+
+        We expect it to be raised immediately.
+
+        :return:
+        """
+
+        operation = FlakyOperation(1, errno.ENOENT)
+
+        with self.assertRaises(FileNotFoundError):
+            self.policy.call(__file__, operation)
+        self.assertEqual(operation.calls, 1)
+
+    def test_circuit_opens_and_recovers(self):
+        """
+        In this test case, operations on the same mount keep failing transiently, until the breaker opens (on the
+        fourth failure, part way through the second operation); the mount then recovers, once the cooldown has passed.
+
+        We expect operations to fail fast while the breaker is open, and to succeed after the cooldown.
+
+        :return:
+        """
+
+        with self.assertRaises(OSError):
+            self.policy.call(__file__, FlakyOperation(10))
+        with self.assertRaises(retry_policy.CircuitOpenError):
+            self.policy.call(__file__, FlakyOperation(10))
+
+        operation = FlakyOperation(0)
+        with self.assertRaises(retry_policy.CircuitOpenError):
+            self.policy.call(__file__, operation)
+        self.assertEqual(operation.calls, 0)
+
+        self.now[0] = 11
+        self.assertEqual(self.policy.call(__file__, operation), "done")
+
+
+class TestSortHierarchicalByDateFailureKinds(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_failure_kinds(self):
+        """
+        In this test case, a file without metadata, a corrupt file, and a file which does not exist are sorted.
+
+        We expect each failure to be recorded with the corresponding kind.
+
+        :return:
+        """
+
+        no_metadata = os.path.join(self.test_folder_path, "IMG_0839_no_metadata.JPG")
+        corrupt = os.path.join(self.test_folder_path, "IMG_0000_invalid.JPG")
+        missing = os.path.join(self.test_folder_path, "IMG_9999.JPG")
+
+        results = sort_image_files.sort_hierarchical_by_date([no_metadata, corrupt, missing], self.test_folder_path,
+                                                             retry_policy=retry_policy.RetryPolicy())
+
+        self.assertEqual(results['failure'][no_metadata].kind, retry_policy.MISSING_METADATA)
+        self.assertEqual(results['failure'][corrupt].kind, retry_policy.CORRUPT)
+        self.assertEqual(results['failure'][missing].kind, retry_policy.IO_ERROR)
+
+    def test_retried_rename_already_done(self):
+        """
+        In this test case, the first attempt to rename a file succeeds, but reports a transient error (as an NFS
+        server can, when its reply is lost), so that the retry fails with ENOENT.
+
+        We expect the file to be recorded as sorted, rather than as failed.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, "IMG_0766.jpg")
+        real_rename = os.rename
+        calls = []
+
+        def lossy_rename(source_path, destination_path):
+            calls.append(source_path)
+            real_rename(source_path, destination_path)
+            if len(calls) == 1:
+                raise OSError(errno.EIO, os.strerror(errno.EIO))
+
+        os.rename = lossy_rename
+        self.addCleanup(setattr, os, 'rename', real_rename)
+
+        results = sort_image_files.sort_hierarchical_by_date(
+            [file_path], self.test_folder_path, retry_policy=retry_policy.RetryPolicy(sleep=lambda delay: None))
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(results['success'], [file_path])
+        self.assertEqual(results['failure'], {})
+        self.assertTrue(os.path.exists(os.path.join(self.test_folder_path, "2020", "01 - January", "15",
+                                                    "IMG_0766.jpg")))
+
+
+if __name__ == '__main__':
+    unittest.main()
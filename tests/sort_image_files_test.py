@@ -1,3 +1,4 @@
+import datetime
 import os
 import shutil
 import sort_image_files
@@ -261,6 +262,161 @@ class TestComputeHierarchicalPathComponents(unittest.TestCase):
 
         self.assertEqual(actual_result, expected_result)
 
+    def test_datetime_string_day_beyond_end_of_month(self):
+        """
+        In this test case, a datetime string has been provided, where the day is within 01 and 31, but does not exist
+        in the month (February 31st).
+
+        We expect this to be caught, and for an empty list to be returned.
+
+        :return:
+        """
+
+        datetime_string = '2020:02:31 18:00:41'
+        expected_result = []
+        actual_result = sort_image_files.compute_hierarchical_path_components(datetime_string)
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_datetime_string_dash_separators_and_nul_padding(self):
+        """
+        In this test case, a datetime string written with '-' date separators, and padded with NUL characters (as some
+        cameras do), has been provided.
+
+        We expect that this should be successfully parsed, and the corresponding path components computed.
+
+        :return:
+        """
+
+        datetime_string = '2020-01-15 18:00:41\x00\x00'
+        expected_result = ['2020', '01 - January', '15']
+        actual_result = sort_image_files.compute_hierarchical_path_components(datetime_string)
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_datetime_string_zero_date(self):
+        """
+        In this test case, the all zero placeholder date, written by cameras whose clock has not been set, has been
+        provided.
+
+        We expect this to be caught, and for an empty list to be returned.
+
+        :return:
+        """
+
+        datetime_string = '0000:00:00 00:00:00'
+        expected_result = []
+        actual_result = sort_image_files.compute_hierarchical_path_components(datetime_string)
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_datetime_string_converted_to_target_timezone(self):
+        """
+        In this test case, a datetime string shortly after midnight in UTC+09:00 has been provided, along with UTC as
+        the target timezone.
+
+        We expect the path components for the previous day (in UTC) to be computed.
+
+        :return:
+        """
+
+        datetime_string = '2020:01:15 01:00:00'
+        expected_result = ['2020', '01 - January', '14']
+        actual_result = sort_image_files.compute_hierarchical_path_components(datetime_string, '+09:00',
+                                                                              datetime.timezone.utc)
+
+        self.assertEqual(actual_result, expected_result)
+
+
+class TestParseExifDatetime(unittest.TestCase):
+
+    def test_datetime_with_offset_and_subseconds(self):
+        """
+        In this test case, a well formed datetime string has been provided, along with offset and sub-second strings.
+
+        We expect a timezone aware datetime, including the sub-seconds, to be returned.
+
+        :return:
+        """
+
+        offset = datetime.timezone(datetime.timedelta(hours=9))
+        expected_result = datetime.datetime(2020, 1, 15, 18, 0, 41, 250000, tzinfo=offset)
+        actual_result = sort_image_files.parse_exif_datetime('2020:01:15 18:00:41', '+09:00', '25')
+
+        self.assertEqual(actual_result, expected_result)
+        self.assertEqual(actual_result.utcoffset(), datetime.timedelta(hours=9))
+
+    def test_datetime_without_offset(self):
+        """
+        In this test case, a well formed datetime string has been provided, without an offset.
+
+        We expect a naive datetime (the local capture time) to be returned.
+
+        :return:
+        """
+
+        expected_result = datetime.datetime(2020, 1, 15, 18, 0, 41)
+        actual_result = sort_image_files.parse_exif_datetime('2020:01:15 18:00:41')
+
+        self.assertEqual(actual_result, expected_result)
+        self.assertIsNone(actual_result.tzinfo)
+
+    def test_datetime_with_invalid_time(self):
+        """
+        In this test case, a datetime string with a valid date, but an out of range time, has been provided.
+
+        We expect the date to be kept, with a time of midnight.
+
+        :return:
+        """
+
+        expected_result = datetime.datetime(2020, 1, 15)
+        actual_result = sort_image_files.parse_exif_datetime('2020:01:15 25:61:00')
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_datetime_with_invalid_date(self):
+        """
+        In this test case, a datetime string with a day that does not exist in the month has been provided.
+
+        We expect None to be returned.
+
+        :return:
+        """
+
+        actual_result = sort_image_files.parse_exif_datetime('2021:02:29 10:00:00')
+
+        self.assertIsNone(actual_result)
+
+
+class TestIsDateValid(unittest.TestCase):
+
+    def test_leap_day(self):
+        """
+        In this test case, February 29th is checked in leap and non-leap years.
+
+        We expect it to be valid only in the leap years.
+
+        :return:
+        """
+
+        self.assertTrue(sort_image_files.is_date_valid(2020, 2, 29))
+        self.assertTrue(sort_image_files.is_date_valid(2000, 2, 29))
+        self.assertFalse(sort_image_files.is_date_valid(1900, 2, 29))
+        self.assertFalse(sort_image_files.is_date_valid(2019, 2, 29))
+
+    def test_end_of_month(self):
+        """
+        In this test case, the 31st is checked in a 31 day month, and in a 30 day month.
+
+        We expect it to be valid only in the 31 day month.
+
+        :return:
+        """
+
+        self.assertTrue(sort_image_files.is_date_valid(2020, 12, 31))
+        self.assertFalse(sort_image_files.is_date_valid(2020, 4, 31))
+
 
 class TestIsYearValid(unittest.TestCase):
 
@@ -813,5 +969,85 @@ class TestSortHierarchicalByDate(unittest.TestCase):
         self.assertEqual(actual_result, expected_result)
 
 
+
+class TestComputeEventBoundaries(unittest.TestCase):
+
+    def test_gaps_split_events(self):
+        """
+        In this test case, a sorted list of timestamps with two gaps longer than the threshold is provided.
+
+        We expect three events, beginning at the first timestamp, and after each of the long gaps.
+
+        :return:
+        """
+
+        timestamps = [0, 60, 7200, 7260, 30000]
+        expected_result = [0, 2, 4]
+        actual_result = sort_image_files.compute_event_boundaries(timestamps, 3600)
+
+        self.assertEqual(actual_result, expected_result)
+
+    def test_no_timestamps(self):
+        """
+        In this test case, an empty list of timestamps is provided.
+
+        We expect no events.
+
+        :return:
+        """
+
+        self.assertEqual(sort_image_files.compute_event_boundaries([], 3600), [])
+
+
+class TestSortByEvent(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_sort_all_test_files_by_event(self):
+        """
+        In this test case, the test files are sorted into events, with the default two hour gap. One photo was taken
+        in the early evening of January 15th, a burst of photos late that night, and one on January 17th.
+
+        We expect three event folders, with the photos of each event moved into them.
+
+        :return:
+        """
+
+        file_list = sort_image_files.build_file_list(self.test_folder_path, "*.*")
+        results = sort_image_files.sort_by_event(file_list, self.test_folder_path)
+
+        month_path = os.path.join(self.test_folder_path, '2020', '01 - January')
+        expected_result = {
+            '15 - event 1': ['IMG_0766.jpg'],
+            '15 - event 2': ['IMG_0797.JPG', 'IMG_0801.JPG', 'IMG_0802.JPG', 'IMG_0803.JPG', 'IMG_0812.JPG',
+                             'IMG_0813.JPG', 'IMG_0814.JPG'],
+            '17 - event 1': ['IMG_0839.JPG'],
+        }
+        actual_result = {folder: sorted(os.listdir(os.path.join(month_path, folder)))
+                         for folder in os.listdir(month_path)}
+
+        self.assertEqual(actual_result, expected_result)
+        self.assertEqual(len(results['success']), 9)
+        self.assertEqual(len(results['failure']), 2)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+import os
+import shutil
+import socket
+import sort_server
+import threading
+import unittest
+
+
+class TestSortServer(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, and starts a sorting server in a background thread.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        self.socket_path = os.path.join(self.test_folder_path, 'sort.sock')
+        self.server = sort_server.create_sort_server(self.socket_path)
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+    def tearDown(self):
+        """
+        Stops the server, and cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_sort_single_file(self):
+        """
+        In this test case, a request naming a single file is sent to the server.
+
+        We expect the file to be sorted into its dated folder, and the results to be returned.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+        request = {"files": [file_path], "destination": self.test_folder_path}
+
+        expected_result = {"success": [file_path], "failure": {}}
+        actual_result = sort_server.send_sort_request(self.socket_path, request)
+
+        self.assertEqual(actual_result, expected_result)
+        self.assertTrue(os.path.exists(os.path.join(self.test_folder_path, '2020', '01 - January', '15',
+                                                    'IMG_0766.jpg')))
+
+    def test_malformed_request(self):
+        """
+        In this test case, a request with neither files nor a source folder is sent to the server.
+
+        We expect an error to be returned, rather than the server failing.
+
+        :return:
+        """
+
+        actual_result = sort_server.send_sort_request(self.socket_path, {"destination": self.test_folder_path})
+
+        self.assertIn("error", actual_result)
+
+    def test_stalled_client(self):
+        """
+        In this test case, a client connects to a server with a short request timeout, and never sends its request.
+
+        We expect the server to give up on the stalled client, and to go on to handle the next request.
+
+        :return:
+        """
+
+        socket_path = os.path.join(self.test_folder_path, 'stalled.sock')
+        server = sort_server.create_sort_server(socket_path, request_timeout=0.1)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        self.addCleanup(server_thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stalled_client:
+            stalled_client.connect(socket_path)
+            actual_result = sort_server.send_sort_request(socket_path, {"destination": self.test_folder_path})
+
+        self.assertIn("error", actual_result)
+
+    def test_refuse_to_replace_regular_file(self):
+        """
+        In this test case, a server is created at a path where a regular file exists.
+
+        We expect an error to be raised, and the file to be left in place.
+
+        :return:
+        """
+
+        file_path = os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+
+        with self.assertRaises(FileExistsError):
+            sort_server.create_sort_server(file_path)
+
+        self.assertTrue(os.path.isfile(file_path))
+
+    def test_replace_stale_socket(self):
+        """
+        In this test case, a server is created at a path where a socket, left behind by an earlier server, exists.
+
+        We expect the stale socket to be replaced.
+
+        :return:
+        """
+
+        socket_path = os.path.join(self.test_folder_path, 'stale.sock')
+        stale_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale_socket.bind(socket_path)
+        stale_socket.close()
+
+        server = sort_server.create_sort_server(socket_path)
+        server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
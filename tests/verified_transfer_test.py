@@ -0,0 +1,216 @@
+import file_groups
+import group_commit
+import io_throttle
+import library_index
+import os
+import shutil
+import sort_image_files
+import unittest
+import verified_transfer
+
+
+class CorruptingTransfer(verified_transfer.VerifiedTransfer):
+    """
+    A transfer whose copies always read back differently, as if they had been corrupted on the way to the disk.
+    """
+
+    def verify_copy(self, file_path, throttle=None):
+        return "0" * 64
+
+
+class RecordingThrottle(io_throttle.IoThrottle):
+    """
+    An unlimited throttle, which records the bytes charged to it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.charged = 0
+
+    def read_bytes(self, amount):
+        self.charged += amount
+        super().read_bytes(amount)
+
+
+class TestVerifiedTransfer(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+        self.source_path = os.path.join(self.test_folder_path, 'IMG_0766.jpg')
+        self.destination_path = os.path.join(self.test_folder_path, 'copy', 'IMG_0766.jpg')
+        os.mkdir(os.path.dirname(self.destination_path))
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_move(self):
+        """
+        In this test case, a file is moved with a verified transfer, read back with O_DIRECT where the file system
+        supports it.
+
+        We expect the copy to be identical (with the same modification time), the source to be removed, and the digest
+        of the file to be returned.
+
+        :return:
+        """
+
+        expected_digest = library_index.compute_file_hash(self.source_path)
+        mtime = os.stat(self.source_path).st_mtime
+
+        digest = verified_transfer.VerifiedTransfer(chunk_size=64 * 1024, direct_io=True).move(self.source_path,
+                                                                                               self.destination_path)
+
+        self.assertEqual(digest, expected_digest)
+        self.assertEqual(library_index.compute_file_hash(self.destination_path), expected_digest)
+        self.assertEqual(os.stat(self.destination_path).st_mtime, mtime)
+        self.assertFalse(os.path.exists(self.source_path))
+
+    def test_move_is_throttled(self):
+        """
+        In this test case, a file is moved with a verified transfer, through a throttle.
+
+        We expect both the bytes copied and the bytes read back to verify the copy to be charged to the throttle.
+
+        :return:
+        """
+
+        size = os.path.getsize(self.source_path)
+        throttle = RecordingThrottle()
+
+        verified_transfer.VerifiedTransfer(chunk_size=64 * 1024).move(self.source_path, self.destination_path,
+                                                                      throttle)
+
+        self.assertEqual(throttle.charged, 2 * size)
+
+    def test_destination_flushed_before_source_removed(self):
+        """
+        In this test case, a file is moved with a verified transfer, recording each folder flushed.
+
+        We expect the destination folder to be flushed after the copy is in place, while the source still exists.
+
+        :return:
+        """
+
+        fsync_folder = group_commit.fsync_folder
+        flushed = []
+
+        def record_fsync(folder_path):
+            flushed.append((folder_path, os.path.exists(self.destination_path), os.path.exists(self.source_path)))
+            fsync_folder(folder_path)
+
+        group_commit.fsync_folder = record_fsync
+        self.addCleanup(setattr, group_commit, 'fsync_folder', fsync_folder)
+
+        verified_transfer.VerifiedTransfer().move(self.source_path, self.destination_path)
+
+        self.assertEqual(flushed, [(os.path.dirname(self.destination_path), True, True)])
+        self.assertFalse(os.path.exists(self.source_path))
+
+    def test_verification_failure(self):
+        """
+        In this test case, a file is moved with a transfer whose copy does not match the source.
+
+        We expect a VerificationError, the source to be kept, and neither the copy nor its temporary file to be left
+        behind.
+
+        :return:
+        """
+
+        with self.assertRaises(verified_transfer.VerificationError):
+            CorruptingTransfer().move(self.source_path, self.destination_path)
+
+        self.assertTrue(os.path.exists(self.source_path))
+        self.assertEqual(os.listdir(os.path.dirname(self.destination_path)), [])
+
+    def test_sort_with_transfer(self):
+        """
+        In this test case, the test files are sorted with verified transfers, and recorded in an index.
+
+        We expect every file to be sorted, with its digest recorded in the results, and in the index.
+
+        :return:
+        """
+
+        index = library_index.open_library_index(os.path.join(self.test_folder_path, 'index.sqlite'))
+        file_list = sort_image_files.build_file_list(self.test_folder_path, "*.*")
+        expected_digests = {file_path: library_index.compute_file_hash(file_path) for file_path in file_list}
+
+        try:
+            results = sort_image_files.sort_hierarchical_by_date(file_list, self.test_folder_path, index=index,
+                                                                 transfer=verified_transfer.VerifiedTransfer())
+            indexed_digests = dict(index.execute("SELECT source_path, sha256 FROM files").fetchall())
+
+        finally:
+            index.close()
+
+        self.assertEqual(len(results['success']), 9)
+        self.assertEqual(results['digests'], {file_path: expected_digests[file_path]
+                                              for file_path in results['success']})
+        self.assertEqual(indexed_digests, results['digests'])
+
+    def test_sort_with_throttled_transfer(self):
+        """
+        In this test case, the test files are sorted with verified transfers, through a throttle.
+
+        We expect the bytes copied and verified, for every file sorted, to be charged to the throttle (on top of the
+        bytes read to extract the EXIF metadata).
+
+        :return:
+        """
+
+        file_list = sort_image_files.build_file_list(self.test_folder_path, "*.*")
+        sizes = {file_path: os.path.getsize(file_path) for file_path in file_list}
+        throttle = RecordingThrottle()
+
+        results = sort_image_files.sort_hierarchical_by_date(file_list, self.test_folder_path, throttle=throttle,
+                                                             transfer=verified_transfer.VerifiedTransfer())
+
+        self.assertEqual(len(results['success']), 9)
+        self.assertGreaterEqual(throttle.charged, sum(2 * sizes[file_path] for file_path in results['success']))
+
+    def test_sort_files_with_transfer(self):
+        """
+        In this test case, the test files are sorted through sort_files with verified transfers, using the event and
+        grouped sorting schemes.
+
+        We expect every file with a capture date to be sorted by each scheme, with its digest recorded.
+
+        :return:
+        """
+
+        for scheme in (sort_image_files.sort_by_event, file_groups.sort_grouped_by_date):
+            destination_path = os.path.join(self.test_folder_path, scheme.__name__)
+            os.mkdir(destination_path)
+
+            results = sort_image_files.sort_files(self.test_folder_path, destination_path, "*.*", scheme,
+                                                  transfer=verified_transfer.VerifiedTransfer())
+
+            self.assertEqual(len(results['success']), 9)
+            self.assertEqual(sorted(results['digests']), sorted(results['success']))
+
+            # Puts the files back, for the next scheme.
+            for file_path in results['success']:
+                destination_file_path = next(os.path.join(folder_path, os.path.basename(file_path))
+                                             for folder_path, _, file_names in os.walk(destination_path)
+                                             if os.path.basename(file_path) in file_names)
+                os.rename(destination_file_path, file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
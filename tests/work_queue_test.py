@@ -0,0 +1,251 @@
+import os
+import shutil
+import time
+import unittest
+import work_queue
+
+
+class TestWorkQueueLeases(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Creates a clean 'test_folder' folder, holding a queue of three work units.
+
+        :return:
+        """
+
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        os.mkdir(self.test_folder_path)
+
+        self.queue_path = os.path.join(self.test_folder_path, 'queue.sqlite')
+        file_list = ['a.jpg', 'b.jpg', 'c.jpg', 'd.jpg', 'e.jpg']
+        self.unit_count = work_queue.create_work_units(self.queue_path, file_list, '/library', unit_size=2)
+        self.connection = work_queue.open_work_queue(self.queue_path)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        self.connection.close()
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_create_work_units(self):
+        """
+        In this test case, five files were sharded into units of (at most) two files.
+
+        We expect three pending units.
+
+        :return:
+        """
+
+        self.assertEqual(self.unit_count, 3)
+        self.assertEqual(work_queue.get_queue_status(self.connection), {'pending': 3, 'claimed': 0, 'done': 0,
+                                                                         'failed': 0})
+
+    def test_claims_are_exclusive(self):
+        """
+        In this test case, two workers claim units from the queue.
+
+        We expect each worker to receive a different unit.
+
+        :return:
+        """
+
+        first = work_queue.claim_work_unit(self.connection, 'worker-1')
+        second = work_queue.claim_work_unit(self.connection, 'worker-2')
+
+        self.assertEqual(first, (1, '/library', ['a.jpg', 'b.jpg']))
+        self.assertEqual(second, (2, '/library', ['c.jpg', 'd.jpg']))
+
+    def test_expired_lease_is_reclaimed(self):
+        """
+        In this test case, a worker claims a unit with a lease which has already expired, and a second worker then
+        claims a unit.
+
+        We expect the second worker to take over the expired unit, and the first worker's results to be discarded.
+
+        :return:
+        """
+
+        work_queue.claim_work_unit(self.connection, 'worker-1', lease_seconds=-1)
+        claim = work_queue.claim_work_unit(self.connection, 'worker-2')
+
+        self.assertEqual(claim[0], 1)
+        self.assertFalse(work_queue.renew_lease(self.connection, 1, 'worker-1'))
+        self.assertFalse(work_queue.complete_work_unit(self.connection, 1, 'worker-1', {'success': [], 'failure': {}}))
+        self.assertTrue(work_queue.complete_work_unit(self.connection, 1, 'worker-2', {'success': [], 'failure': {}}))
+
+    def test_max_attempts(self):
+        """
+        In this test case, a unit's lease expires every time it is claimed (as if it crashed every worker), with a limit
+        of two attempts.
+
+        We expect the unit to be claimed twice, and then to be marked as failed, rather than claimed a third time.
+
+        :return:
+        """
+
+        first = work_queue.claim_work_unit(self.connection, 'worker-1', lease_seconds=-1, max_attempts=2)
+        second = work_queue.claim_work_unit(self.connection, 'worker-2', lease_seconds=-1, max_attempts=2)
+        third = work_queue.claim_work_unit(self.connection, 'worker-3', max_attempts=2)
+
+        self.assertEqual((first[0], second[0], third[0]), (1, 1, 2))
+        self.assertEqual(work_queue.get_queue_status(self.connection), {'pending': 1, 'claimed': 1, 'done': 0,
+                                                                         'failed': 1})
+
+
+class TestRunWorker(unittest.TestCase):
+
+    def setUp(self):
+        """
+        Copies the test data into a clean 'test_folder' folder, where the files can be sorted.
+
+        :return:
+        """
+
+        self.test_data_folder_path = os.path.join(os.getcwd(), 'test_data')
+        self.test_folder_path = os.path.join(os.getcwd(), 'test_folder')
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+        shutil.copytree(self.test_data_folder_path, self.test_folder_path)
+
+    def tearDown(self):
+        """
+        Cleans up the workspace, after tests have completed.
+
+        :return:
+        """
+
+        shutil.rmtree(self.test_folder_path, ignore_errors=True)
+
+    def test_workers_sort_all_units(self):
+        """
+        In this test case, the test files are distributed into units of three files, and two workers run in turn.
+
+        We expect every unit to be completed, and the merged results to account for every file.
+
+        :return:
+        """
+
+        queue_path = os.path.join(os.getcwd(), 'test_queue.sqlite')
+        self.addCleanup(os.remove, queue_path)
+
+        unit_count = work_queue.distribute_files(self.test_folder_path, self.test_folder_path, "*.*", queue_path,
+                                                 unit_size=3)
+        completed = work_queue.run_worker(queue_path, 'worker-1') + work_queue.run_worker(queue_path, 'worker-2')
+        results = work_queue.merge_results(queue_path)
+
+        self.assertEqual(completed, unit_count)
+        self.assertEqual(len(results['success']), 9)
+        self.assertEqual(sorted(results['failure']), [
+            os.path.join(self.test_folder_path, "IMG_0000_invalid.JPG"),
+            os.path.join(self.test_folder_path, "IMG_0839_no_metadata.JPG"),
+        ])
+
+    def test_lost_lease_stops_unit(self):
+        """
+        In this test case, the lease on the first unit is taken over by another worker, while the first file of the
+        unit is being sorted.
+
+        We expect the worker to be given no more of that unit's files, and not to complete it; once the other worker's
+        lease expires, the unit is claimed again and completed.
+
+        :return:
+        """
+
+        queue_path = os.path.join(self.test_folder_path, 'queue.sqlite')
+        file_list = [os.path.join(self.test_folder_path, filename) for filename in ['a.jpg', 'b.jpg', 'c.jpg']]
+        for file_path in file_list:
+            open(file_path, 'wb').close()
+        work_queue.create_work_units(queue_path, file_list, '/library', unit_size=2)
+        batches = []
+
+        def scheme(file_list, destination_path):
+            batch = []
+            for file_path in file_list:
+                batch.append(file_path)
+                if not batches and len(batch) == 1:
+                    connection = work_queue.open_work_queue(queue_path)
+                    connection.execute("UPDATE units SET worker_id = 'other', lease_expires = ? WHERE unit_id = 1",
+                                       (time.time() + 0.3,))
+                    connection.close()
+                    time.sleep(0.3)
+            batches.append(batch)
+            return {"success": batch, "failure": {}}
+
+        completed = work_queue.run_worker(queue_path, 'worker-1', scheme, lease_seconds=0.15, poll_interval=0.05)
+
+        self.assertEqual(batches[0], file_list[:1])
+        self.assertEqual(completed, 2)
+        self.assertEqual(sorted(work_queue.merge_results(queue_path)['success']), file_list)
+
+    def test_reclaimed_unit_skips_moved_files(self):
+        """
+        In this test case, a worker dies part way through a unit (after moving its first file), and the unit is then
+        claimed by another worker.
+
+        We expect the file which was already moved to be skipped (and listed under 'skipped'), rather than reported as
+        a failure, and the rest of the unit to be sorted.
+
+        :return:
+        """
+
+        queue_path = os.path.join(self.test_folder_path, 'queue.sqlite')
+        file_list = [os.path.join(self.test_folder_path, filename) for filename in ['a.jpg', 'b.jpg']]
+        for file_path in file_list:
+            open(file_path, 'wb').close()
+        work_queue.create_work_units(queue_path, file_list, '/library')
+
+        connection = work_queue.open_work_queue(queue_path)
+        work_queue.claim_work_unit(connection, 'worker-1', lease_seconds=-1)
+        connection.close()
+        os.remove(file_list[0])
+
+        def scheme(file_list, destination_path):
+            return {"success": list(file_list), "failure": {}}
+
+        work_queue.run_worker(queue_path, 'worker-2', scheme)
+        results = work_queue.merge_results(queue_path)
+
+        self.assertEqual(results['success'], file_list[1:])
+        self.assertEqual(results['failure'], {})
+        self.assertEqual(results['skipped'], file_list[:1])
+
+
+class TestMergeResults(unittest.TestCase):
+
+    def test_merge_every_key(self):
+        """
+        In this test case, two completed units have results with extra keys (lists, dictionaries and counts).
+
+        We expect every key to be merged, rather than only the successes and failures.
+
+        :return:
+        """
+
+        queue_path = os.path.join(os.getcwd(), 'test_queue.sqlite')
+        self.addCleanup(os.remove, queue_path)
+        work_queue.create_work_units(queue_path, ['a.jpg', 'b.jpg'], '/library', unit_size=1)
+
+        connection = work_queue.open_work_queue(queue_path)
+        for unit_id, file_path in [(1, 'a.jpg'), (2, 'b.jpg')]:
+            work_queue.claim_work_unit(connection, 'worker-1')
+            work_queue.complete_work_unit(connection, unit_id, 'worker-1', {
+                "success": [file_path], "failure": {}, "bookkeeping_failures": {file_path: "index is locked"},
+                "digests": {file_path: "0" * 64}, "near_duplicates": {file_path: ["earlier.jpg"]}, "unchanged": 1})
+        connection.close()
+
+        results = work_queue.merge_results(queue_path)
+
+        self.assertEqual(results['success'], ['a.jpg', 'b.jpg'])
+        self.assertEqual(sorted(results['bookkeeping_failures']), ['a.jpg', 'b.jpg'])
+        self.assertEqual(sorted(results['digests']), ['a.jpg', 'b.jpg'])
+        self.assertEqual(results['near_duplicates']['b.jpg'], ['earlier.jpg'])
+        self.assertEqual(results['unchanged'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
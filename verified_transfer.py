@@ -0,0 +1,196 @@
+import errno
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+
+import group_commit
+
+
+# Large chunks keep the number of system calls (and hash updates) per file low.
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class VerificationError(OSError):
+    """
+    Raised when the data written to the destination does not match the data read from the source. As with EIO, it is
+    treated as a transient failure (see retry_policy), so the transfer may be retried.
+    """
+
+    def __init__(self, path, expected_digest, actual_digest):
+        super().__init__(errno.EIO, "Digest mismatch after copy ({} != {})".format(actual_digest, expected_digest),
+                         path)
+
+
+def copy_with_digest(source_path, destination_file, chunk_size=DEFAULT_CHUNK_SIZE, throttle=None):
+    """
+    Copies the provided file into the (open) destination file, hashing the data as it is copied, so that the source is
+    only read once.
+
+    :param source_path: string
+    :param destination_file: binary file object
+    :param chunk_size: int
+    :param throttle: optional io_throttle.IoThrottle, to which the bytes read are charged
+    :return: SHA-256 hex digest of the data
+    """
+
+    digest = hashlib.sha256()
+
+    with open(source_path, "rb") as source_file:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(source_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        while True:
+            size = source_file.readinto(buffer)
+            if not size:
+                break
+            if throttle is not None:
+                throttle.read_bytes(size)
+            digest.update(view[:size])
+            destination_file.write(view[:size])
+
+    return digest.hexdigest()
+
+
+def hash_file_direct(file_path, chunk_size=DEFAULT_CHUNK_SIZE, throttle=None):
+    """
+    Hashes the provided file, reading it with O_DIRECT (bypassing the page cache, so that what is on the disk is
+    read), into a page aligned buffer, as O_DIRECT requires.
+
+    :param file_path: string
+    :param chunk_size: int (a multiple of the page size)
+    :param throttle: optional io_throttle.IoThrottle, to which the bytes read are charged
+    :return: SHA-256 hex digest
+    """
+
+    digest = hashlib.sha256()
+    buffer = mmap.mmap(-1, chunk_size)
+    descriptor = os.open(file_path, os.O_RDONLY | os.O_DIRECT)
+
+    try:
+        while True:
+            size = os.readv(descriptor, [buffer])
+            if not size:
+                break
+            if throttle is not None:
+                throttle.read_bytes(size)
+            digest.update(memoryview(buffer)[:size])
+
+    finally:
+        os.close(descriptor)
+        buffer.close()
+
+    return digest.hexdigest()
+
+
+def hash_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE, drop_cache=True, throttle=None):
+    """
+    Hashes the provided file, first dropping its pages from the page cache (if drop_cache is set, and the platform
+    supports it), so that the data is read back from the disk, rather than from memory. The file must already have
+    been flushed to disk.
+
+    :param file_path: string
+    :param chunk_size: int
+    :param drop_cache: bool
+    :param throttle: optional io_throttle.IoThrottle, to which the bytes read are charged
+    :return: SHA-256 hex digest
+    """
+
+    digest = hashlib.sha256()
+
+    with open(file_path, "rb") as file:
+        if drop_cache and hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        while True:
+            size = file.readinto(buffer)
+            if not size:
+                break
+            if throttle is not None:
+                throttle.read_bytes(size)
+            digest.update(view[:size])
+
+    return digest.hexdigest()
+
+
+class VerifiedTransfer:
+    """
+    Moves files by copying them, rather than renaming them (e.g. across devices, or onto archive storage), with proof
+    of their integrity:
+
+    1) The source is copied in large chunks into a temporary file beside the destination, and hashed as it is copied.
+    2) The copy is flushed to disk, and then read back (by default, after dropping it from the page cache, or, if
+       direct_io is set, with O_DIRECT), and its digest checked against the source's.
+    3) Only then is the copy renamed into place, and the destination folder flushed to disk (so that, across devices,
+       the new entry is durable before the source's removal can be), and the source removed.
+
+    If verify is not set, step 2 is skipped (the digest is still that of the data read from the source). If a throttle
+    is provided, the bytes read in steps 1 and 2 are charged to its byte rate.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, verify=True, drop_cache=True, direct_io=False):
+        self.chunk_size = chunk_size
+        self.verify = verify
+        self.drop_cache = drop_cache
+        self.direct_io = direct_io
+
+    def verify_copy(self, file_path, throttle=None):
+        """
+        Hashes the provided copy, from the disk.
+
+        :param file_path: string
+        :param throttle: optional io_throttle.IoThrottle
+        :return: SHA-256 hex digest
+        """
+
+        if self.direct_io and hasattr(os, "O_DIRECT"):
+            try:
+                return hash_file_direct(file_path, self.chunk_size, throttle)
+
+            # Some file systems (e.g. tmpfs) do not support O_DIRECT.
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+
+        return hash_file(file_path, self.chunk_size, self.drop_cache, throttle)
+
+    def move(self, source_path, destination_path, throttle=None):
+        """
+        Moves the provided file, by a verified copy (see the steps above).
+
+        :param source_path: string
+        :param destination_path: string
+        :param throttle: optional io_throttle.IoThrottle
+        :return: SHA-256 hex digest of the file
+        """
+
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(destination_path), prefix=".transfer-")
+
+        try:
+            with os.fdopen(descriptor, "wb") as destination_file:
+                digest = copy_with_digest(source_path, destination_file, self.chunk_size, throttle)
+                destination_file.flush()
+                os.fsync(destination_file.fileno())
+            shutil.copystat(source_path, temporary_path)
+
+            if self.verify:
+                copied_digest = self.verify_copy(temporary_path, throttle)
+                if copied_digest != digest:
+                    raise VerificationError(destination_path, digest, copied_digest)
+
+            os.rename(temporary_path, destination_path)
+
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+        group_commit.fsync_folder(os.path.dirname(os.path.abspath(destination_path)))
+
+        os.remove(source_path)
+
+        return digest
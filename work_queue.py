@@ -0,0 +1,383 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import sort_image_files
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    unit_id INTEGER PRIMARY KEY,
+    destination_path TEXT NOT NULL,
+    files TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    results TEXT
+);
+CREATE INDEX IF NOT EXISTS units_state ON units (state, lease_expires);
+"""
+
+DEFAULT_UNIT_SIZE = 1000
+DEFAULT_LEASE_SECONDS = 60
+DEFAULT_POLL_INTERVAL = 5
+
+# The number of times a unit may be claimed, before it is given up on (e.g. because it crashes every worker).
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def open_work_queue(queue_path):
+    """
+    Opens (creating it, if necessary) the SQLite work queue at the provided path. The queue is intended to live on
+    storage that is shared between every participating host, so that no external service is needed.
+
+    Transactions are managed explicitly, so that claiming a unit can take the database write lock up front.
+
+    :param queue_path: string
+    :return: sqlite3.Connection
+    """
+
+    connection = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+    connection.executescript(SCHEMA)
+
+    return connection
+
+
+def default_worker_id():
+    """
+    Builds a worker identifier which is unique across the participating hosts, in the format 'hostname:pid'.
+
+    :return: string
+    """
+
+    return "{}:{}".format(socket.gethostname(), os.getpid())
+
+
+def create_work_units(queue_path, file_list, destination_folder_path, unit_size=DEFAULT_UNIT_SIZE):
+    """
+    Shards the provided list of files into work units, of at most unit_size files each, and adds them to the queue.
+
+    :param queue_path: string
+    :param file_list: list of file paths
+    :param destination_folder_path: string
+    :param unit_size: int
+    :return: number of work units created
+    """
+
+    connection = open_work_queue(queue_path)
+
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        unit_count = 0
+        for start in range(0, len(file_list), unit_size):
+            connection.execute(
+                "INSERT INTO units (destination_path, files) VALUES (?, ?)",
+                (destination_folder_path, json.dumps(file_list[start:start + unit_size])))
+            unit_count += 1
+        connection.execute("COMMIT")
+
+    finally:
+        connection.close()
+
+    return unit_count
+
+
+def distribute_files(source_folder_path, destination_folder_path, file_match_pattern, queue_path,
+                     unit_size=DEFAULT_UNIT_SIZE):
+    """
+    Coordinator entry point: builds the list of files to sort (in the same way as sort_files), and shards it into work
+    units in the shared queue, for workers to claim.
+
+    :param source_folder_path:
+    :param destination_folder_path:
+    :param file_match_pattern:
+    :param queue_path:
+    :param unit_size:
+    :return: number of work units created
+    """
+
+    file_list = sort_image_files.build_file_list(source_folder_path, file_match_pattern)
+
+    return create_work_units(queue_path, file_list, destination_folder_path, unit_size)
+
+
+def claim_work_unit(connection, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Claims the next available work unit, for the provided worker. A unit is available if it is pending, or if it was
+    claimed by a worker whose lease has since expired (e.g. because that worker, or its host, has died).
+
+    A unit whose lease has expired, after it has already been claimed max_attempts times, is marked as failed instead
+    of being claimed again, so that a unit which crashes every worker is not retried forever.
+
+    :param connection: sqlite3.Connection
+    :param worker_id: string
+    :param lease_seconds: number of seconds the claim is valid for, unless renewed
+    :param max_attempts: int
+    :return: (unit_id, destination_path, file_list) tuple, or None if no unit is currently available
+    """
+
+    now = time.time()
+
+    # Takes the write lock before selecting, so that two workers cannot claim the same unit.
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute(
+            "UPDATE units SET state = 'failed', lease_expires = NULL "
+            "WHERE state = 'claimed' AND lease_expires < ? AND attempts >= ?",
+            (now, max_attempts))
+
+        row = connection.execute(
+            "SELECT unit_id, destination_path, files FROM units "
+            "WHERE state = 'pending' OR (state = 'claimed' AND lease_expires < ?) "
+            "ORDER BY unit_id LIMIT 1",
+            (now,)).fetchone()
+
+        if row is not None:
+            connection.execute(
+                "UPDATE units SET state = 'claimed', worker_id = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE unit_id = ?",
+                (worker_id, now + lease_seconds, row[0]))
+
+        connection.execute("COMMIT")
+
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+    if row is None:
+        return None
+
+    return row[0], row[1], json.loads(row[2])
+
+
+def renew_lease(connection, unit_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """
+    Extends the lease, on a claimed work unit (the worker's heartbeat).
+
+    :param connection: sqlite3.Connection
+    :param unit_id: int
+    :param worker_id: string
+    :param lease_seconds: int
+    :return: True if the worker still holds the unit, otherwise False
+    """
+
+    cursor = connection.execute(
+        "UPDATE units SET lease_expires = ? WHERE unit_id = ? AND worker_id = ? AND state = 'claimed'",
+        (time.time() + lease_seconds, unit_id, worker_id))
+
+    return cursor.rowcount == 1
+
+
+def complete_work_unit(connection, unit_id, worker_id, results):
+    """
+    Marks a claimed work unit as done, and stores the results of sorting it. If the worker has lost its lease in the
+    meantime (and the unit has been claimed by another worker), the results are discarded.
+
+    :param connection: sqlite3.Connection
+    :param unit_id: int
+    :param worker_id: string
+    :param results: results dictionary, as returned by the sorting scheme
+    :return: True if the results were stored, otherwise False
+    """
+
+    cursor = connection.execute(
+        "UPDATE units SET state = 'done', lease_expires = NULL, results = ? "
+        "WHERE unit_id = ? AND worker_id = ? AND state = 'claimed'",
+        (json.dumps(results), unit_id, worker_id))
+
+    return cursor.rowcount == 1
+
+
+def get_queue_status(connection):
+    """
+    Counts the work units in each state.
+
+    Example:
+
+    {'pending': 10, 'claimed': 2, 'done': 37, 'failed': 1}
+
+    :param connection: sqlite3.Connection
+    :return: dictionary of state to unit count
+    """
+
+    status = {"pending": 0, "claimed": 0, "done": 0, "failed": 0}
+    status.update(connection.execute("SELECT state, COUNT(*) FROM units GROUP BY state").fetchall())
+
+    return status
+
+
+def heartbeat(queue_path, unit_id, worker_id, lease_seconds, stop_event, lease_lost=None):
+    """
+    Renews the lease on a work unit, at a third of the lease period, until the provided event is set. Runs on its own
+    connection, so that it can be used from a background thread.
+
+    If the lease is lost (e.g. because the worker stalled for longer than the lease, and another worker has taken over
+    the unit), the lease_lost event is set, so that the worker stops working on the unit.
+
+    :param queue_path: string
+    :param unit_id: int
+    :param worker_id: string
+    :param lease_seconds: int
+    :param stop_event: threading.Event
+    :param lease_lost: optional threading.Event
+    :return:
+    """
+
+    connection = open_work_queue(queue_path)
+
+    try:
+        while not stop_event.wait(lease_seconds / 3.0):
+            if not renew_lease(connection, unit_id, worker_id, lease_seconds):
+                print("Lost lease on work unit {}".format(unit_id))
+                if lease_lost is not None:
+                    lease_lost.set()
+                break
+
+    finally:
+        connection.close()
+
+
+def get_unit_attempts(connection, unit_id):
+    """
+    Counts the times the provided work unit has been claimed (including by the current worker).
+
+    :param connection: sqlite3.Connection
+    :param unit_id: int
+    :return: int
+    """
+
+    return connection.execute("SELECT attempts FROM units WHERE unit_id = ?", (unit_id,)).fetchone()[0]
+
+
+def iterate_while_leased(file_list, lease_lost, skipped=None):
+    """
+    Yields the files of a work unit, until its lease is lost, so that the sorting scheme stops moving files which
+    another worker now owns.
+
+    If a list is provided as skipped, files which no longer exist are added to it instead of being yielded: when a unit
+    is claimed again, after an earlier worker died part way through it, the files that worker already moved would
+    otherwise be reported as failures.
+
+    :param file_list: list of file paths
+    :param lease_lost: threading.Event
+    :param skipped: optional list, of the files skipped
+    :return: generator of file paths
+    """
+
+    for file_path in file_list:
+        if lease_lost.is_set():
+            return
+        if skipped is not None and not os.path.lexists(file_path):
+            skipped.append(file_path)
+            continue
+        yield file_path
+
+
+def run_worker(queue_path, worker_id=None, sorting_scheme=sort_image_files.sort_hierarchical_by_date,
+               lease_seconds=DEFAULT_LEASE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL,
+               max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Worker entry point: repeatedly claims a work unit, and runs the extraction and move stages over its files using the
+    provided sorting scheme, while a background heartbeat keeps the lease alive. Returns once every unit in the queue
+    is done (or has failed).
+
+    If the lease on a unit is lost, the scheme is given no more of its files (see iterate_while_leased), and the unit
+    is left to the worker which has taken it over. When a unit is claimed again, its files which no longer exist (as
+    an earlier worker already moved them) are skipped, and listed in the unit's results under 'skipped'.
+
+    While units are still claimed by other workers, this worker waits (polling every poll_interval seconds), so that it
+    can take over any unit whose lease expires.
+
+    :param queue_path: string
+    :param worker_id: string (defaults to 'hostname:pid')
+    :param sorting_scheme:
+    :param lease_seconds: int
+    :param poll_interval: int
+    :param max_attempts: int (see claim_work_unit)
+    :return: number of work units completed by this worker
+    """
+
+    worker_id = worker_id or default_worker_id()
+    connection = open_work_queue(queue_path)
+    completed = 0
+
+    try:
+        while True:
+            claim = claim_work_unit(connection, worker_id, lease_seconds, max_attempts)
+
+            if claim is None:
+
+                # Finishes once there is nothing left to claim, or wait for another worker's lease to run out.
+                if get_queue_status(connection)["claimed"] == 0:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            unit_id, destination_path, file_list = claim
+            print("Worker {} claimed work unit {} ({} files)".format(worker_id, unit_id, len(file_list)))
+
+            stop_event = threading.Event()
+            lease_lost = threading.Event()
+            heartbeat_thread = threading.Thread(
+                target=heartbeat, args=(queue_path, unit_id, worker_id, lease_seconds, stop_event, lease_lost),
+                daemon=True)
+            heartbeat_thread.start()
+
+            skipped = [] if get_unit_attempts(connection, unit_id) > 1 else None
+
+            try:
+                results = sorting_scheme(iterate_while_leased(file_list, lease_lost, skipped), destination_path)
+
+            finally:
+                stop_event.set()
+                heartbeat_thread.join()
+
+            if lease_lost.is_set():
+                print("Worker {} stopped work unit {}".format(worker_id, unit_id))
+                continue
+
+            if skipped:
+                results['skipped'] = skipped
+
+            if complete_work_unit(connection, unit_id, worker_id, results):
+                completed += 1
+
+    finally:
+        connection.close()
+
+    return completed
+
+
+def merge_results(queue_path):
+    """
+    Merges the results of every completed work unit into a single results dictionary, in the same format as is
+    returned by the sorting schemes. Every key is merged: lists are concatenated, dictionaries are combined, and counts
+    are added up.
+
+    :param queue_path: string
+    :return: results dictionary
+    """
+
+    merged = {"success": [], "failure": {}}
+    connection = open_work_queue(queue_path)
+
+    try:
+        rows = connection.execute("SELECT results FROM units WHERE state = 'done' ORDER BY unit_id").fetchall()
+
+    finally:
+        connection.close()
+
+    for (results,) in rows:
+        for key, value in json.loads(results).items():
+            if isinstance(value, list):
+                merged.setdefault(key, []).extend(value)
+            elif isinstance(value, dict):
+                merged.setdefault(key, {}).update(value)
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+    return merged